@@ -0,0 +1,61 @@
+from collections_po import List
+from expressions import NumberRange
+from limits import current_budget
+
+# arrays are optional, everything else runs without numpy installed
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def require_numpy():
+    if numpy is None:
+        raise RuntimeError("arrays need numpy, install it with `pip install numpy`")
+
+
+def is_array(value) -> bool:
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+def checked(value):
+    # a new array counts against the memory budget like a long string
+    budget = current_budget()
+    if budget is not None:
+        budget.check_size(value)
+    return value
+
+
+def to_array(value):
+    if is_array(value):
+        return value
+    if isinstance(value, NumberRange):
+        return numpy.arange(value.start, value.start + len(value), dtype=float)
+    if value.__class__ is List:
+        return numpy.array(value.items, dtype=float)
+    return numpy.array(value, dtype=float)
+
+
+def make_array(*values):
+    # `@[1, 2, 3]` and `array(1, 2, 3)` hold their values, `array(x)` of a
+    # single array, range or list converts it
+    require_numpy()
+    if len(values) == 1 and (is_array(values[0]) or values[0].__class__ in (NumberRange, List)):
+        return checked(to_array(values[0]).copy())
+    return checked(numpy.array(values, dtype=float))
+
+
+def zeros(size):
+    require_numpy()
+    if size < 0 or not float(size).is_integer():
+        raise ValueError(f"zeros expects a whole number of elements, got {size}")
+    return checked(numpy.zeros(int(size)))
+
+
+def mean(value) -> float:
+    require_numpy()
+    values = to_array(value)
+    if not values.size:
+        raise ValueError("mean of an empty array")
+    return float(values.mean())
+
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import TokenStream  # noqa: E402
+from parser import Parser  # noqa: E402
+from bench_engines import ENGINES  # noqa: E402
+
+# each workload as a scalar loop and as array operations, both leave the
+# same value in x
+WORKLOADS = {
+    "sum of squares": ("""x = 0;
+for (i in 1..{count})
+    x += i * i;
+end;
+""", """v = array(1..{count});
+x = sum(v * v);
+"""),
+    "scaled mean": ("""x = 0;
+for (i in 1..{count})
+    x += i * 0.5 + 1;
+end;
+x = x / {count};
+""", """v = array(1..{count});
+x = mean(v * 0.5 + 1);
+"""),
+    "count above": ("""x = 0;
+for (i in 1..{count})
+    if (i * 3 > {count}) x += 1; end;
+end;
+""", """v = array(1..{count});
+x = sum(v * 3 > {count});
+"""),
+}
+
+
+def bench(engine, source: str, repeat: int) -> tuple[float, float]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        functions = {}
+        ast = Parser(TokenStream(source), functions).parse({})
+        context = {}
+        start = time.perf_counter()
+        engine(ast, functions, context)
+        best = min(best, time.perf_counter() - start)
+        result = context["x"]
+    return best, result
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_arrays")
+    parse.add_argument("--count", type=int, default=1_000_000, help="elements per workload")
+    parse.add_argument("--repeat", type=int, default=3,
+                       help="runs of each workload, the best time is kept")
+    parse.add_argument("--engine", action="append", choices=ENGINES,
+                       help="engines to run, all of them by default")
+    args = parse.parse_args()
+    for workload, (scalar, vector) in WORKLOADS.items():
+        print(f"{workload} ({args.count:,} elements):")
+        for name in args.engine or ENGINES:
+            scalar_time, expected = bench(ENGINES[name], scalar.format(count=args.count),
+                                          args.repeat)
+            vector_time, result = bench(ENGINES[name], vector.format(count=args.count),
+                                        args.repeat)
+            if abs(result - expected) > 1e-9 * max(1.0, abs(expected)):
+                raise SystemExit(f"{name} computed {result} with arrays, {expected} with loops")
+            print(f"{name:>8}: loop {scalar_time:8.3f}s  array {vector_time:8.4f}s  "
+                  f"{scalar_time / vector_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+JOB = """func work(n)
+    total = 0;
+    i = 0;
+    while (i < n)
+        total += i * {index};
+        i += 1;
+    end;
+    return total;
+end;
+puts(work({size}));
+"""
+
+
+def run(files: list[str], jobs: int) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, MAIN, "--isolated", "--no-cache", "--jobs", str(jobs),
+                    *files], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_batch")
+    parse.add_argument("--scripts", type=int, default=200,
+                       help="independent scripts in the batch")
+    parse.add_argument("--size", type=int, default=20000,
+                       help="loop iterations in each script")
+    parse.add_argument("--jobs", type=int, nargs="+",
+                       default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parse.parse_args()
+    directory = tempfile.mkdtemp(prefix="pos-batch-")
+    try:
+        files = []
+        for index in range(args.scripts):
+            file_name = os.path.join(directory, f"job{index}.pos")
+            with open(file_name, "w") as file:
+                file.write(JOB.format(index=index, size=args.size))
+            files.append(file_name)
+        print(f"{args.scripts} scripts, {os.cpu_count()} cores")
+        base = None
+        for jobs in args.jobs:
+            elapsed = run(files, jobs)
+            base = base or elapsed
+            print(f"jobs {jobs:>3}: {elapsed:7.3f}s {args.scripts / elapsed:8.1f} scripts/sec "
+                  f"speedup {base / elapsed:5.2f}x")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import TokenStream  # noqa: E402
+from parser import Parser  # noqa: E402
+from bench_engines import ENGINES  # noqa: E402
+
+FIB = """func fib(n)
+    if (n < 2)
+        return n;
+    end;
+    return fib(n - 1) + fib(n - 2);
+end;
+
+result = fib({n});
+"""
+
+
+def call_count(n: int) -> int:
+    # fib(n) calls itself for n - 1 and n - 2, plus the call itself
+    previous, current = 1, 1
+    for _ in range(n - 1):
+        previous, current = current, previous + current + 1
+    return current
+
+
+def fib(n: int) -> float:
+    previous, current = 0, 1
+    for _ in range(n):
+        previous, current = current, previous + current
+    return float(previous)
+
+
+def bench(name: str, engine, n: int):
+    functions = {}
+    ast = Parser(TokenStream(FIB.format(n=n)), functions).parse({})
+    context = {}
+    start = time.perf_counter()
+    engine(ast, functions, context)
+    elapsed = time.perf_counter() - start
+    if context["result"] != fib(n):
+        raise SystemExit(f"{name} computed fib({n}) = {context['result']}")
+    calls = call_count(n)
+    print(f"{name:>8}: {calls:>9} calls in {elapsed:8.3f}s {calls / elapsed:>12,.0f} calls/sec")
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_calls")
+    parse.add_argument("-n", type=int, default=25, help="compute fib(n)")
+    parse.add_argument("--engine", action="append", choices=ENGINES,
+                       help="engines to run, all of them by default")
+    args = parse.parse_args()
+    print(f"fib({args.n}):")
+    for name in args.engine or ENGINES:
+        bench(name, ENGINES[name], args.n)
+
+
+if __name__ == "__main__":
+    main()
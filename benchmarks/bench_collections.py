@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import TokenStream  # noqa: E402
+from parser import Parser  # noqa: E402
+from bench_engines import ENGINES  # noqa: E402
+
+# a list of numbers is kept in an array('d'); starting it with a string
+# keeps every number boxed in a python list instead
+BUILD = """xs = [{first}];
+for (i in 1..{count})
+    xs.push(i);
+end;
+"""
+
+WORKLOADS = {
+    "push": BUILD,
+    "index": BUILD + """t = 0;
+for (i in 1..{count})
+    t += xs[i];
+end;
+""",
+    "iterate": BUILD + """t = 0;
+for (v in xs)
+    if (v != "x") t += v; end;
+end;
+""",
+    "map": """m = {{}};
+for (i in 1..{count})
+    m[i] = i * 2;
+end;
+t = 0;
+for (k in m)
+    t += m[k];
+end;
+""",
+}
+
+LAYOUTS = {
+    "numbers": "0",
+    "boxed": '"x"',
+}
+
+
+def run(engine, source: str) -> float:
+    functions = {}
+    ast = Parser(TokenStream(source), functions).parse({})
+    start = time.perf_counter()
+    engine(ast, functions, {})
+    return time.perf_counter() - start
+
+
+def list_memory(source: str) -> int:
+    # what the finished list holds on to, the loop's own garbage is gone
+    functions = {}
+    ast = Parser(TokenStream(source), functions).parse({})
+    context = {}
+    tracemalloc.start()
+    ENGINES["closure"](ast, functions, context)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+def numbered_globals_memory(count: int) -> int:
+    # the workaround the list replaces: one global variable per element
+    tracemalloc.start()
+    context = {f"xs{index}": float(index) for index in range(count + 1)}
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del context
+    return size
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_collections")
+    parse.add_argument("--count", type=int, default=200_000, help="elements per collection")
+    parse.add_argument("--engine", action="append", choices=ENGINES,
+                       help="engines to run, all of them by default")
+    args = parse.parse_args()
+
+    print(f"memory for {args.count:,} numbers:")
+    for layout, first in LAYOUTS.items():
+        size = list_memory(BUILD.format(first=first, count=args.count))
+        print(f"{layout + ' list':>16}: {size / 1024:10.0f}KB {size / (args.count + 1):6.1f}B/item")
+    size = numbered_globals_memory(args.count)
+    print(f"{'numbered vars':>16}: {size / 1024:10.0f}KB {size / (args.count + 1):6.1f}B/item")
+
+    for workload, template in WORKLOADS.items():
+        print(f"{workload} ({args.count:,} elements):")
+        for name in args.engine or ENGINES:
+            # maps have no compact layout, they run once
+            layouts = LAYOUTS if "{first}" in template else {"map": None}
+            times = {layout: run(ENGINES[name], template.format(first=first, count=args.count))
+                     for layout, first in layouts.items()}
+            print(f"{name:>8}: " + "  ".join(f"{layout} {elapsed:7.3f}s"
+                                            for layout, elapsed in times.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interpreter import ENGINES, Interpreter  # noqa: E402
+
+# a small rule, the kind of script a host evaluates for every request
+RULE = """func score(amount, limit)
+    if (amount > limit)
+        return (amount - limit) * 2;
+    end;
+    return 0;
+end;
+risk = score(amount, limit) + clamp(amount / 100);
+allowed = risk < 50 and country != "XX";
+"""
+
+
+def clamp(value):
+    return min(max(value, 0.0), 10.0)
+
+
+def bench(interpreter: Interpreter, runs: int, recompile: bool) -> float:
+    program = interpreter.compile(RULE)
+    start = time.perf_counter()
+    for index in range(runs):
+        inputs = {"amount": float(index % 500), "limit": 100.0, "country": "ES"}
+        if recompile:
+            interpreter.run(RULE, inputs)
+        else:
+            program.run(inputs)
+    return time.perf_counter() - start
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_embed")
+    parse.add_argument("--runs", type=int, default=20000)
+    parse.add_argument("--engine", choices=list(ENGINES), nargs="*", default=list(ENGINES))
+    args = parse.parse_args()
+    Interpreter().register("clamp", clamp, 1)
+    for engine in args.engine:
+        interpreter = Interpreter(engine)
+        compiled = bench(interpreter, args.runs, False)
+        parsed = bench(interpreter, args.runs // 10, True) * 10
+        print(f"{engine:>8}: {args.runs / compiled:12,.0f} runs/sec compiled once, "
+              f"{args.runs / parsed:10,.0f} runs/sec parsed every run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import TokenStream  # noqa: E402
+from parser import Parser  # noqa: E402
+import closures  # noqa: E402
+import vm  # noqa: E402
+import transpiler  # noqa: E402
+from resolver import resolve_program  # noqa: E402
+
+LOOP = """x = 0;
+i = 0;
+while (i < {count})
+    x += i * 2 - 1;
+    if (x > 1000000) x = 0; end;
+    i += 1;
+end;
+"""
+
+CALLS = """func add(a, b)
+    return a + b;
+end;
+
+func twice(a)
+    return add(a, a);
+end;
+
+x = 0;
+i = 0;
+while (i < {count})
+    x = twice(i) - add(x, 1);
+    i += 1;
+end;
+"""
+
+PROGRAMS = {
+    "loop": (LOOP, ("tree", "closure", "vm", "python")),
+    "calls": (CALLS, ("tree", "closure", "vm", "python")),
+}
+
+
+def run_tree(ast: list, functions: dict, context: dict):
+    for stmt in resolve_program(ast, functions):
+        stmt.evaluate(context)
+
+
+def run_closure(ast: list, functions: dict, context: dict):
+    closures.run_program(closures.compile_program(ast, functions), context)
+
+
+def run_vm(ast: list, functions: dict, context: dict):
+    vm.run_program(vm.compile_program(ast, functions), context)
+
+
+def run_python(ast: list, functions: dict, context: dict):
+    transpiler.run_program(transpiler.compile_program(ast, functions), context)
+
+
+ENGINES = {
+    "tree": run_tree,
+    "closure": run_closure,
+    "vm": run_vm,
+    "python": run_python,
+}
+
+
+def bench(name: str, engine, source: str, count: int):
+    functions = {}
+    ast = Parser(TokenStream(source), functions).parse({})
+    context = {}
+    start = time.perf_counter()
+    engine(ast, functions, context)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {elapsed:8.3f}s {count / elapsed:>12,.0f} iterations/sec")
+    return context
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_engines")
+    parse.add_argument("--count", type=int, default=200_000,
+                       help="iterations of the benchmark loop")
+    parse.add_argument("--engine", action="append", choices=ENGINES,
+                       help="engines to run, all of them by default")
+    parse.add_argument("--program", action="append", choices=PROGRAMS,
+                       help="programs to run, all of them by default")
+    parse.add_argument("--globals", type=int, default=0,
+                       help="extra global variables defined before each program")
+    args = parse.parse_args()
+    padding = "".join(f"g{index} = {index};\n" for index in range(args.globals))
+    for program in args.program or PROGRAMS:
+        template, engines = PROGRAMS[program]
+        source = padding + template.format(count=args.count)
+        print(f"{program}:")
+        results = {name: bench(name, ENGINES[name], source, args.count)
+                   for name in args.engine or ENGINES if name in engines}
+        if len({repr(sorted(context.items())) for context in results.values()}) > 1:
+            raise SystemExit("engines finished with different variables")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import TokenStream  # noqa: E402
+from parser import Parser  # noqa: E402
+from bench_engines import ENGINES  # noqa: E402
+
+# the same sum written with both loops, at the top level and in a function
+WHILE = """x = 0;
+i = 1;
+while (i <= {count})
+    x += i;
+    i += 1;
+end;
+"""
+
+FOR = """x = 0;
+for (i in 1..{count})
+    x += i;
+end;
+"""
+
+WHILE_LOCAL = """func total(n)
+    s = 0;
+    i = 1;
+    while (i <= n)
+        s += i;
+        i += 1;
+    end;
+    return s;
+end;
+x = total({count});
+"""
+
+FOR_LOCAL = """func total(n)
+    s = 0;
+    for (i in 1..n)
+        s += i;
+    end;
+    return s;
+end;
+x = total({count});
+"""
+
+PROGRAMS = {
+    "globals": (WHILE, FOR),
+    "locals": (WHILE_LOCAL, FOR_LOCAL),
+}
+
+
+def bench(engine, source: str, count: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        functions = {}
+        ast = Parser(TokenStream(source), functions).parse({})
+        context = {}
+        start = time.perf_counter()
+        engine(ast, functions, context)
+        best = min(best, time.perf_counter() - start)
+        if context["x"] != count * (count + 1) / 2:
+            raise SystemExit(f"the loop computed {context['x']}")
+    return best
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_for")
+    parse.add_argument("--count", type=int, default=1_000_000,
+                       help="iterations of the benchmark loop")
+    parse.add_argument("--repeat", type=int, default=3,
+                       help="runs of each loop, the best time is kept")
+    parse.add_argument("--engine", action="append", choices=ENGINES,
+                       help="engines to run, all of them by default")
+    args = parse.parse_args()
+    for program, (while_source, for_source) in PROGRAMS.items():
+        print(f"{program}:")
+        for name in args.engine or ENGINES:
+            while_time = bench(ENGINES[name], while_source.format(count=args.count),
+                               args.count, args.repeat)
+            for_time = bench(ENGINES[name], for_source.format(count=args.count),
+                             args.count, args.repeat)
+            print(f"{name:>8}: while {while_time:8.3f}s  for {for_time:8.3f}s  "
+                  f"{while_time / for_time:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+sys.path.insert(0, ROOT)
+
+from interpreter import ModuleLoader, Interpreter  # noqa: E402
+
+# every module imports the same helper module, it is compiled once
+COMMON = """func clamp(x, low, high)
+    if (x < low) return low; end;
+    if (x > high) return high; end;
+    return x;
+end;
+"""
+
+MODULE = """import "common.pos";
+scale = {index};
+"""
+
+FUNCTION = """func f{index}(x)
+    t = 0;
+    for (i in 1..x)
+        t += common.clamp(i * scale, 0, {index});
+    end;
+    return t;
+end;
+"""
+
+
+def write_modules(directory: str, count: int, functions: int) -> str:
+    with open(os.path.join(directory, "common.pos"), "w") as file:
+        file.write(COMMON)
+    for index in range(count):
+        with open(os.path.join(directory, f"m{index}.pos"), "w") as file:
+            file.write(MODULE.format(index=index))
+            file.write("".join(FUNCTION.format(index=number) for number in range(functions)))
+    script = os.path.join(directory, "main.pos")
+    with open(script, "w") as file:
+        file.write("".join(f'import "m{index}.pos";\n' for index in range(count)))
+        file.write("total = " + " + ".join(f"m{index}.f0(3)" for index in range(count)) + ";\n")
+        file.write("puts(total);\n")
+    return script
+
+
+def run_process(script: str, args: list[str]) -> float:
+    with open(os.devnull, "w") as null:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, MAIN, *args, script], stdout=null, check=True)
+        return time.perf_counter() - start
+
+
+def run_in_process(script: str, engine: str) -> list[tuple[float, int]]:
+    # two runs under one loader, as in a REPL session: what the first import
+    # of the sources costs in a running process, and what a second one does
+    compiled = []
+
+    def compile_file(path: str):
+        compiled.append(path)
+        return loader.parse_file(path)
+
+    with open(script) as file:
+        source = file.read()
+    loader = ModuleLoader(engine, compile_file=compile_file)
+    runs = []
+    with open(os.devnull, "w") as null, redirect_stdout(null), loader:
+        for _ in range(2):
+            compiled.clear()
+            start = time.perf_counter()
+            Interpreter(engine).run(source)
+            runs.append((time.perf_counter() - start, len(compiled)))
+    return runs
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_imports")
+    parse.add_argument("--modules", type=int, default=50, help="modules the script imports")
+    parse.add_argument("--functions", type=int, default=20, help="functions per module")
+    parse.add_argument("--engine", default="closure", help="engine the script runs on")
+    args = parse.parse_args()
+    engine = ["-e", args.engine]
+
+    with tempfile.TemporaryDirectory() as directory:
+        script = write_modules(directory, args.modules, args.functions)
+        os.chdir(directory)
+        print(f"a script importing {args.modules} modules of {args.functions} functions:")
+        elapsed = run_process(script, engine + ["--no-cache"])
+        print(f"{'no cache':>18}: {elapsed * 1000:8.1f}ms")
+        run_process(script, engine + ["--cache"])
+        elapsed = run_process(script, engine + ["--cache"])
+        print(f"{'disk cache':>18}: {elapsed * 1000:8.1f}ms")
+        for label, (elapsed, compiled) in zip(("first import", "imported again"),
+                                              run_in_process(script, args.engine)):
+            print(f"{label:>18}: {elapsed * 1000:8.1f}ms, {compiled} modules compiled")
+
+
+if __name__ == "__main__":
+    main()
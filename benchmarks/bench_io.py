@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+
+PUTS = """for (i in 1..{count})
+    puts("line", i, i * 2);
+end;
+"""
+
+BUFFERS = {
+    "unbuffered": ["--unbuffered"],
+    "4KB buffer": ["--output-buffer", "4096"],
+    "64KB buffer": [],
+}
+
+# the same count of stdin lines, one input() at a time and in chunks
+INPUT = """n = 0;
+line = 0;
+while (n < {count})
+    line = input("");
+    n += 1;
+end;
+"""
+
+LINES = """n = 0;
+for (line in lines())
+    n += 1;
+end;
+"""
+
+
+def run(script: str, args: list[str], stdin=None) -> float:
+    # a real process writing to a real file, so every flush is a syscall
+    with tempfile.NamedTemporaryFile("w", suffix=".pos", delete=False) as file:
+        file.write(script)
+    try:
+        with open(os.devnull, "w") as null:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, MAIN, "--no-cache", *args, file.name],
+                           stdin=stdin, stdout=null, check=True)
+            return time.perf_counter() - start
+    finally:
+        os.remove(file.name)
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_io")
+    parse.add_argument("--count", type=int, default=200_000, help="lines written and read")
+    parse.add_argument("--engine", default="closure", help="engine the scripts run on")
+    args = parse.parse_args()
+    engine = ["-e", args.engine]
+
+    print(f"puts {args.count:,} lines:")
+    script = PUTS.format(count=args.count)
+    for label, flags in BUFFERS.items():
+        elapsed = run(script, engine + flags)
+        print(f"{label:>14}: {elapsed:7.3f}s {args.count / elapsed:>12,.0f} lines/sec")
+
+    print(f"read {args.count:,} lines:")
+    with tempfile.TemporaryFile("w+") as data:
+        data.write("".join(f"text {index}\n" for index in range(args.count)))
+        for label, script in (("input()", INPUT), ("lines()", LINES)):
+            data.seek(0)
+            elapsed = run(script.format(count=args.count), engine, stdin=data)
+            print(f"{label:>14}: {elapsed:7.3f}s {args.count / elapsed:>12,.0f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
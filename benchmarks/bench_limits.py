@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interpreter import BUDGETED_ENGINES, Interpreter  # noqa: E402
+from limits import Budget  # noqa: E402
+from bench_engines import PROGRAMS  # noqa: E402
+
+
+def run_once(program, budget: Budget | None) -> float:
+    start = time.perf_counter()
+    program.run({}, budget)
+    return time.perf_counter() - start
+
+
+def best_times(program, budget_args: dict, repeat: int) -> tuple[float, float]:
+    # plain and budgeted runs alternate so both see the same machine noise;
+    # the limits are far above what the program uses, only the checks cost
+    plain = budgeted = float("inf")
+    for _ in range(repeat):
+        plain = min(plain, run_once(program, None))
+        budgeted = min(budgeted, run_once(program, Budget(**budget_args)))
+    return plain, budgeted
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_limits")
+    parse.add_argument("--count", type=int, default=100_000,
+                       help="iterations of the benchmark loop")
+    parse.add_argument("--repeat", type=int, default=7)
+    parse.add_argument("--max-overhead", type=float, default=0.10,
+                       help="fail when a budgeted run is this much slower")
+    args = parse.parse_args()
+    budget_args = {"max_steps": 10**12, "timeout": 3600.0, "max_memory": 2**40}
+    failed = False
+    for name, (template, _) in PROGRAMS.items():
+        print(f"{name}:")
+        for engine in BUDGETED_ENGINES:
+            program = Interpreter(engine).compile(template.format(count=args.count))
+            plain, budgeted = best_times(program, budget_args, args.repeat)
+            overhead = budgeted / plain - 1
+            failed = failed or overhead > args.max_overhead
+            print(f"{engine:>8}: {plain:7.3f}s unlimited {budgeted:7.3f}s budgeted "
+                  f"{overhead:+7.1%}")
+    if failed:
+        raise SystemExit(f"a budget costs more than {args.max_overhead:.0%}")
+
+
+if __name__ == "__main__":
+    main()
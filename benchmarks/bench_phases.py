@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import Tokenizer  # noqa: E402
+from parser import Parser  # noqa: E402
+from interpreter import ENGINES, compile_ast, run_compiled  # noqa: E402
+
+PROGRAMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+PHASES = ("tokenize", "parse", "evaluate")
+
+# repeated to make the "large" program, parsing it is what gets measured
+LARGE_CHUNK = """func step{index}(a, b)
+    if (a > b) return a - b; elif (a == b) return 0; else return b - a; end;
+end;
+v{index} = step{index}({index}, {index} * 2) + 3 * (4 - 1) / 2;
+"""
+
+
+def make_large(functions: int) -> str:
+    return "".join(LARGE_CHUNK.format(index=index) for index in range(functions))
+
+
+def load_programs(large: int) -> dict[str, str]:
+    programs = {}
+    for file_name in sorted(os.listdir(PROGRAMS_DIR)):
+        if file_name.endswith(".pos"):
+            with open(os.path.join(PROGRAMS_DIR, file_name)) as file:
+                programs[file_name[:-4]] = file.read()
+    if large:
+        programs["large"] = make_large(large)
+    return programs
+
+
+def best_of(repeat: int, phase) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = phase()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_program(source: str, engine: str, repeat: int) -> dict:
+    tokenize_time, tokens = best_of(repeat, lambda: Tokenizer(source).tokenize())
+
+    def parse():
+        functions = {}
+        return Parser(tokens, functions).parse({}), functions
+    parse_time, (ast, functions) = best_of(repeat, parse)
+
+    def evaluate():
+        # output is part of the cost but not of the report
+        with redirect_stdout(io.StringIO()):
+            run_compiled(compile_ast(ast, functions, engine), {}, engine)
+    evaluate_time, _ = best_of(repeat, evaluate)
+    return {"bytes": len(source), "tokens": len(tokens), "tokenize": tokenize_time,
+            "parse": parse_time, "evaluate": evaluate_time}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=PROGRAMS_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    # phases faster than min_time are too noisy to compare
+    regressions = []
+    for name, phases in results["programs"].items():
+        old = baseline["programs"].get(name, None)
+        if old is None:
+            continue
+        for phase in PHASES:
+            if old[phase] <= 0 or max(old[phase], phases[phase]) < results["min_time"]:
+                continue
+            change = phases[phase] / old[phase] - 1
+            if change > threshold:
+                regressions.append(f"{name} {phase}: {old[phase] * 1000:.2f}ms -> "
+                                   f"{phases[phase] * 1000:.2f}ms ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_phases")
+    parse.add_argument("--engine", choices=list(ENGINES), default="tree")
+    parse.add_argument("--repeat", type=int, default=3,
+                       help="each phase is run this many times, the best time is kept")
+    parse.add_argument("--large", type=int, default=2000,
+                       help="functions in the generated large program, 0 to skip it")
+    parse.add_argument("--program", action="append",
+                       help="programs to run, all of them by default")
+    parse.add_argument("--output", default=None, help="write the results to this JSON file")
+    parse.add_argument("--baseline", default=None,
+                       help="JSON results of an earlier run to compare against")
+    parse.add_argument("--threshold", type=float, default=0.15,
+                       help="a phase this much slower than the baseline is a regression")
+    parse.add_argument("--min-time", type=float, default=0.001,
+                       help="phases faster than this many seconds are not compared")
+    args = parse.parse_args()
+
+    programs = load_programs(args.large)
+    results = {"commit": git_commit(), "python": platform.python_version(),
+               "engine": args.engine, "repeat": args.repeat, "min_time": args.min_time,
+               "programs": {}}
+    print(f"{'program':<16} {'bytes':>9} {'tokens':>8} "
+          + " ".join(f"{phase:>10}" for phase in PHASES))
+    for name in args.program or programs:
+        phases = bench_program(programs[name], args.engine, args.repeat)
+        results["programs"][name] = phases
+        print(f"{name:<16} {phases['bytes']:>9} {phases['tokens']:>8} "
+              + " ".join(f"{phases[phase] * 1000:>8.2f}ms" for phase in PHASES))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("engine") != args.engine:
+            raise SystemExit(f"the baseline was run on the {baseline.get('engine')} engine")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"regressions against {args.baseline} ({baseline.get('commit')}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            raise SystemExit(1)
+        print(f"no phase regressed more than {args.threshold:.0%} "
+              f"against {args.baseline} ({baseline.get('commit')})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+
+# -n scripts, from one that only counts to one that reads a field, and one
+# that filters, which is the kind -j can split
+SCRIPTS = {
+    "count": """END
+    puts(nr);
+end;
+""",
+    "sum field": """BEGIN
+    total = 0;
+end;
+total += number(fields[2]);
+END
+    puts(total);
+end;
+""",
+    "filter": """if (number(fields[4]) == 200)
+    puts(fields[3]);
+end;
+""",
+}
+
+# the scripts that use neither BEGIN, END nor nr
+SPLITTABLE = ("filter",)
+
+# the same count written as a plain script, reading stdin itself
+LINES = """n = 0;
+for (line in lines())
+    n += 1;
+end;
+puts(n);
+"""
+
+MODES = {
+    "chunked": [],
+    "mmap": ["--mmap"],
+}
+
+
+def make_log(path: str, size: int):
+    # web server style lines until the file has size bytes
+    with open(path, "w") as file:
+        written, index = 0, 0
+        while written < size:
+            line = f"10.0.{index % 256}.{index % 97} GET {index % 500} /page/{index} 200\n"
+            file.write(line)
+            written += len(line)
+            index += 1
+
+
+def run(script: str, args: list[str], log: str, as_stdin: bool = True) -> float:
+    with tempfile.NamedTemporaryFile("w", suffix=".pos", delete=False) as file:
+        file.write(script)
+    try:
+        with open(log, "rb") as data, open(os.devnull, "w") as null:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, MAIN, "--no-cache", *args, file.name,
+                            *([] if as_stdin else [log])],
+                           stdin=data if as_stdin else None, stdout=null, check=True)
+            return time.perf_counter() - start
+    finally:
+        os.remove(file.name)
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_records")
+    parse.add_argument("--size", type=float, default=20, help="MB of log lines to read")
+    parse.add_argument("--engine", default="closure", help="engine the scripts run on")
+    parse.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                       help="processes for the parallel run")
+    args = parse.parse_args()
+    engine = ["-e", args.engine]
+
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, "access.log")
+        make_log(log, int(args.size * 1024 * 1024))
+        megabytes = os.path.getsize(log) / (1024 * 1024)
+        print(f"{megabytes:.1f}MB of log, {args.engine} engine:")
+        elapsed = run(LINES, engine, log)
+        print(f"{'lines() loop':>22}: {elapsed:7.3f}s {megabytes / elapsed:8.1f}MB/s")
+        for name, script in SCRIPTS.items():
+            for mode, flags in MODES.items():
+                elapsed = run(script, engine + ["-n"] + flags, log)
+                print(f"{name + ' ' + mode:>22}: {elapsed:7.3f}s {megabytes / elapsed:8.1f}MB/s")
+            if args.jobs > 1 and name in SPLITTABLE:
+                elapsed = run(script, engine + ["-n", "-j", str(args.jobs)], log, as_stdin=False)
+                label = f"{name} -j {args.jobs}"
+                print(f"{label:>22}: {elapsed:7.3f}s {megabytes / elapsed:8.1f}MB/s")
+
+
+if __name__ == "__main__":
+    main()
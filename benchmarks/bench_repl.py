@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interpreter import ENGINES  # noqa: E402
+from repl import Session  # noqa: E402
+
+# what is typed between two measurements: a multi-line function and a global
+DEFINITION = ["func f{index}(x)", "    return x + {index};", "end;", "v{index} = f{index}(1);"]
+
+# the lines timed as the session grows, a call into an old definition and
+# one into the newest
+PROBES = ["y = f0(2) + 1;", "y = f{index}(2) * 2;"]
+
+
+def measure(session: Session, index: int, repeat: int) -> float:
+    lines = [probe.format(index=index) for probe in PROBES]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            session.feed(line)
+    return (time.perf_counter() - start) / (repeat * len(lines))
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_repl")
+    parse.add_argument("--definitions", type=int, default=4000,
+                       help="functions defined over the session")
+    parse.add_argument("--every", type=int, default=1000, help="definitions between measurements")
+    parse.add_argument("--repeat", type=int, default=200, help="times each probe line is fed")
+    parse.add_argument("--engine", action="append", choices=ENGINES,
+                       help="engines to run, all of them by default")
+    args = parse.parse_args()
+
+    for name in args.engine or ENGINES:
+        session = Session(name)
+        print(f"{name}:")
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            for index in range(args.definitions + 1):
+                for line in DEFINITION:
+                    session.feed(line.format(index=index))
+                if index % args.every == 0:
+                    latency = measure(session, index, args.repeat)
+                    print(f"{index:>8} definitions: {latency * 1e6:8.1f}us/line", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
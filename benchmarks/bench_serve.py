@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+CLIENT = os.path.join(ROOT, "client.py")
+sys.path.insert(0, ROOT)
+
+from client import request  # noqa: E402
+
+# a short cron-style script, startup is most of its run
+SCRIPT = """total = 0;
+for (i in 1..200)
+    total += i;
+end;
+puts("total", total);
+"""
+
+
+def timed(function, runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def report(label: str, times: list[float]):
+    print(f"{label:>24}: {statistics.mean(times) * 1000:7.2f}ms mean "
+          f"{statistics.median(times) * 1000:7.2f}ms median")
+
+
+def wait_for(socket_path: str, server: subprocess.Popen):
+    deadline = time.perf_counter() + 30
+    while not os.path.exists(socket_path):
+        if server.poll() is not None or time.perf_counter() > deadline:
+            raise RuntimeError("the server did not start")
+        time.sleep(0.05)
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_serve")
+    parse.add_argument("--runs", type=int, default=30, help="runs per way of starting")
+    parse.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                       help="workers of the server")
+    parse.add_argument("--concurrency", type=int, default=8,
+                       help="requests in flight for the throughput run")
+    parse.add_argument("--engine", default="closure", help="engine the script runs on")
+    args = parse.parse_args()
+    flags = ["-e", args.engine]
+
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, "job.pos")
+        with open(script, "w") as file:
+            file.write(SCRIPT)
+        socket_path = os.path.join(directory, "pos.sock")
+        server = subprocess.Popen([sys.executable, MAIN, "--serve", socket_path,
+                                   "--workers", str(args.workers)], stderr=subprocess.DEVNULL)
+        try:
+            wait_for(socket_path, server)
+
+            # the client sends all of its stdin, it must not be left open
+            def cold():
+                subprocess.run([sys.executable, MAIN, *flags, script],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, check=True)
+
+            def thin_client():
+                subprocess.run([sys.executable, CLIENT, socket_path, *flags, script],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, check=True)
+
+            def in_process():
+                # the floor: what a client costs once python itself is running
+                output = io.BytesIO()
+                if request(socket_path, [*flags, script], stdout=output, stderr=output) != 0:
+                    raise RuntimeError(output.getvalue().decode())
+
+            print(f"per run, {args.engine} engine, {args.workers} workers:")
+            report("cold main.py", timed(cold, args.runs))
+            report("client.py", timed(thin_client, args.runs))
+            report("request in process", timed(in_process, args.runs))
+
+            runs = args.runs * args.concurrency
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                list(pool.map(lambda _: in_process(), range(runs)))
+            elapsed = time.perf_counter() - start
+            print(f"{runs} requests, {args.concurrency} at a time: "
+                  f"{runs / elapsed:.0f} runs/sec")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+FUNCTION = """func f{index}(a, b)
+    if (a > b)
+        return a * {index} - b;
+    end;
+    return b / (a + {index} + 1);
+end;
+x{index} = f{index}({index}, 2) + 3 * (4 - 1);
+"""
+
+
+def make_source(functions: int) -> str:
+    return "".join(FUNCTION.format(index=index) for index in range(functions))
+
+
+def run(file_name: str, args: list[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, MAIN, *args, file_name], check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_startup")
+    parse.add_argument("--functions", type=int, default=2000,
+                       help="functions in the generated script")
+    parse.add_argument("--runs", type=int, default=5)
+    parse.add_argument("-O", "--optimize", default=False,
+                       action=argparse.BooleanOptionalAction)
+    args = parse.parse_args()
+    flags = ["-O"] if args.optimize else []
+    directory = tempfile.mkdtemp(prefix="pos-startup-")
+    try:
+        file_name = os.path.join(directory, "script.pos")
+        with open(file_name, "w") as file:
+            file.write(make_source(args.functions))
+        print(f"source: {os.path.getsize(file_name) / 2**10:.0f} KB, "
+              f"{args.functions} functions")
+        cache_dir = os.path.join(directory, "__poscache__")
+        results = {"no cache": [], "cold": [], "warm": []}
+        for _ in range(args.runs):
+            results["no cache"].append(run(file_name, [*flags, "--no-cache"]))
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            results["cold"].append(run(file_name, [*flags, "--cache"]))
+            results["warm"].append(run(file_name, [*flags, "--cache"]))
+        for name, times in results.items():
+            print(f"{name:>9}: best {min(times):7.3f}s mean {sum(times) / len(times):7.3f}s")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import Tokenizer, TokenStream  # noqa: E402
+from bench_tokenizer import make_source  # noqa: E402
+
+
+def measure(name: str, build, code: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    tokens = build(code)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(tokens)
+    print(f"{name:>12}: {count:>9} tokens {size / 2**20:9.2f} MB "
+          f"{size / count:7.1f} bytes/token {elapsed:7.3f}s")
+    return count
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_token_memory")
+    parse.add_argument("--size", type=float, default=2.0,
+                       help="size of the generated source in MB")
+    args = parse.parse_args()
+    code = make_source(int(args.size * 2**20))
+    print(f"source: {len(code) / 2**20:.2f} MB (not counted below)")
+    measure("Token list", lambda source: Tokenizer(source).tokenize(), code)
+    measure("TokenStream", TokenStream, code)
+
+
+if __name__ == "__main__":
+    main()
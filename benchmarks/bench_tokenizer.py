@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import TOKEN_REGEX, Token, Tokenizer  # noqa: E402
+
+SNIPPET = """func add(a, b)
+  return a + b;
+end;
+
+x = 0;
+i = 0;
+while (i < 100)
+    x += add(i, 2.5) * 3 ** 2;
+    i += 1;
+
+
+    if (x >= 1000 and not false) puts("big", x); elif (x != 0) puts('small'); else puts(null); end;
+end;
+"""
+
+
+class LegacyTokenizer:
+    # the previous engine: one re.compile per pattern per token and a
+    # recursive call for every whitespace or newline run
+    __slots__ = ["code", "pos", "line", "column"]
+
+    def __init__(self, code: str):
+        self.code = code
+        self.pos = 0
+        self.line = 1
+        self.column = 1
+
+    def next_token(self):
+        while self.pos < len(self.code):
+            for pattern, token_type in TOKEN_REGEX:
+                regex = re.compile(pattern)
+                match = regex.match(self.code, self.pos)
+                if match:
+                    value = match.group(0)
+                    if token_type == "WHITESPACE":
+                        self.pos += len(value)
+                        self.column += len(value)
+                        return self.next_token()
+                    elif token_type == "NEWLINE":
+                        self.pos += len(value)
+                        self.line += 1
+                        self.column = 1
+                        return self.next_token()
+                    else:
+                        start_column: int = self.column
+                        self.column += len(value)
+                        self.pos += len(value)
+                        return Token(token_type, value, self.line, start_column)
+            else:
+                raise SyntaxError(f"Invalid token at line {
+                    self.line}, column {self.column}")
+        return Token("EOF", "", self.line, self.column)
+
+    def tokenize(self):
+        tokens = []
+        while (token := self.next_token()).kind != "EOF":
+            tokens.append(token)
+        return tokens
+
+
+def make_source(size: int) -> str:
+    return SNIPPET * (size // len(SNIPPET) + 1)
+
+
+def bench(name: str, engine, code: str) -> int:
+    start = time.perf_counter()
+    tokens = engine(code).tokenize()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {len(tokens):>9} tokens in {elapsed:8.3f}s "
+          f"{len(tokens) / elapsed:>12,.0f} tokens/sec "
+          f"{len(code) / elapsed / 2**20:8.2f} MB/s")
+    return len(tokens)
+
+
+def main():
+    parse = argparse.ArgumentParser(prog="bench_tokenizer")
+    parse.add_argument("--size", type=float, default=2.0,
+                       help="size of the generated source in MB")
+    parse.add_argument("--skip-legacy", default=False,
+                       action=argparse.BooleanOptionalAction)
+    args = parse.parse_args()
+    code = make_source(int(args.size * 2**20))
+    print(f"source: {len(code) / 2**20:.2f} MB")
+    count = bench("current", Tokenizer, code)
+    if not args.skip_legacy:
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10_000))
+        if bench("legacy", LegacyTokenizer, code) != count:
+            raise SystemExit("token count mismatch between engines")
+
+
+if __name__ == "__main__":
+    main()
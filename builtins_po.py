@@ -1,41 +1,81 @@
-from expressions import BuiltinFunction
+from arrays import is_array, make_array, mean, zeros
+from collections_po import List, format_value, is_number, make_list, make_map, pop, push
+from expressions import BuiltinFunction, NumberRange
+from io_po import flush_output, read_prompted, stdin_reader, write
+from modules import call_member, import_module
 from typing import Callable
 import re
 builtin_func = {}
 
+NUMBER_INPUT = re.compile(r"\d+(\.\d*)?")
+NAME_INPUT = re.compile(r"\w+")
+
 
 def make_builtin_func(name: str, function: Callable, args_count: int | None = None):
     builtin_func[name] = BuiltinFunction(name, function, args_count)
 
 
 def read_input(message: str):
-    message = input(message)
-    search = [(r"\d+(\.\d*)?", "number"), (r"\w+", "name")]
-    for pattern, name in search:
-        if re.match(pattern, message):
-            if name == "name":
-                return message
-            elif name == "number":
-                return float(message)
+    message = read_prompted(message)
+    if NUMBER_INPUT.match(message):
+        return float(message)
+    if NAME_INPUT.match(message):
+        return message
+
 
 def print_it(*args):
-    for arg in args:
-        if arg is None:
-            print("null", end=" ")
-        if arg is True:
-            print("true", end=" ")
-        if arg is False:
-            print("false", end=" ")
-        if isinstance(arg, str):
-            print(arg, end=" ")
-        if isinstance(arg, float):
-            print(arg, end=" ")
-    print()
+    # the whole line is one write to the output buffer
+    if not args:
+        write("\n")
+        return
+    write(" ".join([arg if arg.__class__ is str else format_value(arg, False)
+                    for arg in args]) + " \n")
+
+
+def flush():
+    flush_output()
+
+
+def read_line():
+    # the next line of stdin without its newline, null at the end
+    return stdin_reader().read_line()
+
+
+def read_all():
+    return stdin_reader().read_all()
+
+
+def lines():
+    # every remaining line of stdin, read in large chunks, for a for loop
+    return iter(stdin_reader())
+
+
+def length(value) -> float:
+    if isinstance(value, (str, NumberRange, List, dict)) or is_array(value):
+        return float(len(value))
+    raise TypeError(f"len expects a string, range, list, map or array, got {format_value(value)}")
+
+
+def to_number(value) -> float:
+    # record fields are strings, `number(fields[2])` makes one a number
+    if is_number(value):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    raise ValueError(f"number expects a number or a numeric string, got {format_value(value)}")
 
 
 def my_sum(*args):
     total = 0
     for n in args:
+        if is_array(n):
+            # summed in one vectorized call
+            n = n.sum()
+        elif n.__class__ is List:
+            n = sum(n.items)
         total += n
     return float(total)
 
@@ -44,6 +84,21 @@ def make_builtin_funcs():
     make_builtin_func("puts", print_it, None)
     make_builtin_func("input", read_input, 1)
     make_builtin_func("sum", my_sum, None)
+    make_builtin_func("array", make_array, None)
+    make_builtin_func("zeros", zeros, 1)
+    make_builtin_func("len", length, 1)
+    make_builtin_func("mean", mean, 1)
+    make_builtin_func("list", make_list, None)
+    make_builtin_func("map", make_map, None)
+    make_builtin_func("push", push, 2)
+    make_builtin_func("pop", pop, None)
+    make_builtin_func("flush", flush, 0)
+    make_builtin_func("read_line", read_line, 0)
+    make_builtin_func("read_all", read_all, 0)
+    make_builtin_func("lines", lines, 0)
+    make_builtin_func("number", to_number, 1)
+    make_builtin_func("import", import_module, 1)
+    make_builtin_func("call", call_member, None)
 
 
 make_builtin_funcs()
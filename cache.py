@@ -0,0 +1,226 @@
+import hashlib
+import marshal
+import os
+import sys
+from typing import Any, Callable
+
+from builtins_po import builtin_func
+from expressions import BinOp, BuiltinFunction, ListArguments, Number, Assignment, \
+    Variable, Expr, String, Boolean, UnaryOp, Function, FunctionCall, \
+    Return, Null, If, While, For, Range, Index, IndexAssignment, Block
+from statements import ExpressionStmt
+
+# bump whenever the ast classes or their encoding change; the python cache
+# tag is part of the key too, as marshal may change between versions
+FORMAT_VERSION = 7
+MAGIC = b"POSC"
+CACHE_TAG = f"pos{FORMAT_VERSION}-{sys.implementation.cache_tag}"
+CACHE_DIR = "__poscache__"
+
+# the tag of an encoded node is the index of its class here
+NODE_TYPES = [Number, String, Boolean, Null, Variable, ListArguments, Function,
+              FunctionCall, Return, BuiltinFunction, If, While, Assignment,
+              UnaryOp, BinOp, ExpressionStmt, For, Range, Index, IndexAssignment, Block]
+NODE_TAGS = {node_type: tag for tag, node_type in enumerate(NODE_TYPES)}
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class Encoder:
+    # turns the ast into nested tuples of marshal-able values
+    __slots__ = ["encoders"]
+
+    def __init__(self):
+        self.encoders: dict[type, Callable[[Any], tuple]] = {
+            Number: lambda node: (node.value,),
+            String: lambda node: (node.value,),
+            Boolean: lambda node: (node.value,),
+            Null: lambda node: (),
+            Variable: lambda node: (node.name,),
+            ListArguments: lambda node: (self.encode_block(node.args),),
+            Function: lambda node: (node.name, tuple(arg.name for arg in node.args),
+                                    self.encode_block(node.body)),
+            FunctionCall: lambda node: (node.name, self.encode_block(node.args),
+                                        node.line, node.column),
+            Return: lambda node: (self.encode(node.value), node.line, node.column),
+            BuiltinFunction: lambda node: (node.value, node.args_count,
+                                           self.encode_block(node.args),
+                                           node.line, node.column),
+            If: lambda node: (self.encode_block(node.conditions),
+                              tuple(self.encode_block(body) for body in node.body),
+                              self.encode_block(node.else_body),
+                              node.line, node.column),
+            While: lambda node: (self.encode(node.condition), self.encode_block(node.body),
+                                 node.line, node.column),
+            Assignment: lambda node: (node.name, node.op, self.encode(node.value),
+                                      node.line, node.column),
+            UnaryOp: lambda node: (node.op, self.encode(node.expr)),
+            BinOp: lambda node: (self.encode(node.left), node.op, self.encode(node.right)),
+            ExpressionStmt: lambda node: (self.encode(node.expression),),
+            For: lambda node: (node.name, self.encode(node.iterable),
+                               self.encode_block(node.body), node.line, node.column),
+            Range: lambda node: (self.encode(node.start), self.encode(node.stop)),
+            Index: lambda node: (self.encode(node.target), self.encode(node.index)),
+            IndexAssignment: lambda node: (self.encode(node.target), self.encode(node.index),
+                                           node.op, self.encode(node.value),
+                                           node.line, node.column),
+            Block: lambda node: (node.name, self.encode_block(node.body), node.line,
+                                 node.column),
+        }
+
+    def encode(self, node: Expr) -> tuple:
+        encoder = self.encoders.get(type(node), None)
+        if encoder is None:
+            raise ValueError(f"can not encode {node}")
+        return (NODE_TAGS[type(node)], *encoder(node))
+
+    def encode_block(self, body) -> tuple:
+        return tuple(self.encode(stmt) for stmt in body)
+
+
+class Decoder:
+    # rebuilds the ast and registers the functions it defines, as parsing
+    # the source would have
+    __slots__ = ["functions", "decoders"]
+
+    def __init__(self, functions: dict[str, Function]):
+        self.functions = functions
+        self.decoders: list[Callable[..., Expr]] = [
+            Number,
+            String,
+            Boolean,
+            lambda: Null(),
+            Variable,
+            lambda args: ListArguments(self.decode_block(args)),
+            self.decode_function,
+            lambda name, args, line, column: FunctionCall(
+                name, ListArguments(self.decode_block(args)), line, column),
+            lambda value, line, column: Return(self.decode(value), line, column),
+            self.decode_builtin,
+            lambda conditions, bodies, else_body, line, column: If(
+                self.decode_block(conditions),
+                [self.decode_block(body) for body in bodies],
+                self.decode_block(else_body), line, column),
+            lambda condition, body, line, column: While(
+                self.decode(condition), self.decode_block(body), line, column),
+            lambda name, op, value, line, column: Assignment(
+                name, op, self.decode(value), line, column),
+            lambda op, expr: UnaryOp(op, self.decode(expr)),
+            lambda left, op, right: BinOp(self.decode(left), op, self.decode(right)),
+            lambda expression: ExpressionStmt(self.decode(expression)),
+            lambda name, iterable, body, line, column: For(
+                name, self.decode(iterable), self.decode_block(body), line, column),
+            lambda start, stop: Range(self.decode(start), self.decode(stop)),
+            lambda target, index: Index(self.decode(target), self.decode(index)),
+            lambda target, index, op, value, line, column: IndexAssignment(
+                self.decode(target), self.decode(index), op, self.decode(value), line, column),
+            lambda name, body, line, column: Block(name, self.decode_block(body), line, column),
+        ]
+
+    def decode(self, encoded: tuple) -> Expr:
+        return self.decoders[encoded[0]](*encoded[1:])
+
+    def decode_block(self, encoded: tuple) -> list[Expr]:
+        return [self.decode(stmt) for stmt in encoded]
+
+    def decode_function(self, name: str, args: tuple, body: tuple):
+        function = Function(name, ListArguments([Variable(arg) for arg in args]), [])
+        # registered before the body, a recursive call is looked up by name
+        self.functions[name] = function
+        function.body = self.decode_block(body)
+        return function
+
+    def decode_builtin(self, name: str, args_count: int | None, args: tuple, line: int,
+                       column: int):
+        builtin = builtin_func.get(name, None)
+        if builtin is None:
+            raise CacheMiss(f"builtin {name} is gone")
+        function = BuiltinFunction(name, builtin.function, args_count, line, column)
+        function.args = ListArguments(self.decode_block(args))
+        return function
+
+
+def source_hash(source: str) -> str:
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def builtins_key() -> str:
+    # the parser decides which calls are builtins, a program parsed while
+    # other builtins were registered is compiled differently
+    table = ",".join(f"{name}/{builtin.args_count}"
+                     for name, builtin in sorted(builtin_func.items()))
+    return hashlib.sha256(table.encode()).hexdigest()
+
+
+def cache_path(file_path: str, cache_dir: str | None = None, optimized: bool = False) -> str:
+    directory = cache_dir or os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR)
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    if cache_dir is not None:
+        # one shared directory for every source, keep their entries apart
+        name = f"{name}-{hashlib.sha256(os.path.abspath(file_path).encode()).hexdigest()[:16]}"
+    # optimized programs get their own file, switching -O does not thrash
+    suffix = ".opt" if optimized else ""
+    return os.path.join(directory, f"{name}.{CACHE_TAG}{suffix}.posc")
+
+
+def encode_program(ast: list[Expr]) -> tuple:
+    return Encoder().encode_block(ast)
+
+
+def decode_program(program: tuple, functions: dict[str, Function]) -> list[Expr]:
+    # functions are only registered once the whole program decoded
+    decoded: dict[str, Function] = {}
+    ast = Decoder(decoded).decode_block(program)
+    functions.update(decoded)
+    return ast
+
+
+def load_encoded(path: str, digest: str, optimized: bool) -> tuple:
+    # the key is a small header read before the program, a stale or foreign
+    # file is a miss and gets rewritten
+    try:
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise CacheMiss("not a posc file")
+            if marshal.load(file) != (CACHE_TAG, digest, optimized, builtins_key()):
+                raise CacheMiss("stale")
+            return marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError) as error:
+        raise CacheMiss(str(error)) from None
+
+
+def load_program(path: str, digest: str, optimized: bool,
+                 functions: dict[str, Function]) -> list[Expr]:
+    return decode_program(load_encoded(path, digest, optimized), functions)
+
+
+def store_encoded(path: str, digest: str, optimized: bool, program: tuple) -> bool:
+    try:
+        data = marshal.dumps(program)
+    except ValueError:
+        # too deeply nested for marshal, the file is just parsed every time
+        return False
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, "wb") as file:
+            file.write(MAGIC)
+            file.write(marshal.dumps((CACHE_TAG, digest, optimized, builtins_key())))
+            file.write(data)
+        # readers see the old file or the new one, never half of it
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    return True
+
+
+def store_program(path: str, digest: str, optimized: bool, ast: list[Expr]) -> bool:
+    try:
+        program = encode_program(ast)
+    except RecursionError:
+        return False
+    return store_encoded(path, digest, optimized, program)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# the thin client of `pos --serve`: it only needs the standard library, so a
+# run costs python startup and a round trip instead of loading the interpreter.
+#
+#   python client.py /path/sock [pos options] script.pos < input
+import json
+import os
+import socket
+import struct
+import sys
+
+# every reply is a series of frames: a kind byte, a 4 byte length, the data
+STDOUT = b"1"
+STDERR = b"2"
+STATUS = b"x"
+FRAME_HEADER = struct.Struct(">cI")
+
+
+def send_frame(conn: socket.socket, kind: bytes, data: bytes):
+    conn.sendall(FRAME_HEADER.pack(kind, len(data)) + data)
+
+
+def read_exactly(reader, size: int) -> bytes:
+    data = reader.read(size)
+    if len(data) != size:
+        raise ConnectionError("the server closed the connection")
+    return data
+
+
+def read_frames(reader):
+    while True:
+        kind, size = FRAME_HEADER.unpack(read_exactly(reader, FRAME_HEADER.size))
+        yield kind, read_exactly(reader, size)
+
+
+def request(socket_path: str, args: list[str], stdin: bytes = b"", cwd: str | None = None,
+            stdout=None, stderr=None) -> int:
+    # sends one run, writes its output as it comes and gives its exit status
+    stdout = stdout or sys.stdout.buffer
+    stderr = stderr or sys.stderr.buffer
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        header = json.dumps({"args": args, "cwd": cwd or os.getcwd()})
+        conn.sendall(header.encode() + b"\n" + stdin)
+        # the end of stdin is the end of the request
+        conn.shutdown(socket.SHUT_WR)
+        with conn.makefile("rb") as reader:
+            for kind, data in read_frames(reader):
+                if kind == STATUS:
+                    return int(data)
+                target = stdout if kind == STDOUT else stderr
+                target.write(data)
+                target.flush()
+    return 1
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("usage: client.py SOCKET [pos options] script.pos", file=sys.stderr)
+        sys.exit(2)
+    # stdin is sent whole with the request, so an open pipe is read to its
+    # end first; a terminal is not read at all
+    stdin = b"" if sys.stdin.isatty() else sys.stdin.buffer.read()
+    try:
+        sys.exit(request(sys.argv[1], sys.argv[2:], stdin))
+    except (ConnectionError, FileNotFoundError) as error:
+        print(f"pos client: {error}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
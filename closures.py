@@ -0,0 +1,402 @@
+import operator
+from typing import Any, Callable
+
+from expressions import BinOp, BuiltinFunction, ListArguments, Number, Assignment, \
+    Variable, Expr, String, Boolean, UnaryOp, Function, FunctionCall, \
+    Return, Null, If, While, For, Range, Index, IndexAssignment, Frame, FunctionReturn, UNSET, \
+    NumberRange
+from collections_po import UPDATE_OPS, List, get_item, set_item, update_item
+from limits import LARGE_STRING, ResourceLimitExceeded, check_string, current_budget
+from resolver import resolve_program
+from statements import ExpressionStmt
+
+Compiled = Callable[[dict], Any]
+
+BINARY_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "**": operator.pow,
+    "*": operator.mul,
+    "/": operator.truediv,
+    # both sides are always evaluated, as in BinOp.evaluate
+    "and": lambda left, right: left and right,
+    "or": lambda left, right: left or right,
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+UNARY_OPS = {
+    "-": operator.neg,
+    "not": operator.not_,
+}
+
+# never in place, `b = a; a += 1` leaves b alone as in Assignment.evaluate
+ASSIGNMENT_OPS = {
+    "+=": operator.add,
+    "-=": operator.sub,
+    "*=": operator.mul,
+    "/=": operator.truediv,
+}
+
+
+class ClosureCompiler:
+    # turns the resolved ast into nested python closures, every operator,
+    # variable name and frame slot is bound when compiling so evaluation does
+    # no string dispatch; top level closures get the globals dict, function
+    # bodies a Frame
+    __slots__ = ["functions", "bodies", "compilers"]
+
+    def __init__(self, functions: dict[str, Function]):
+        self.functions = functions
+        self.bodies: dict[str, Compiled] = {}
+        self.compilers: dict[type, Callable[[Any], Compiled]] = {
+            Number: self.compile_constant,
+            String: self.compile_constant,
+            Boolean: self.compile_constant,
+            Null: self.compile_constant,
+            Variable: self.compile_variable,
+            ListArguments: self.compile_list_arguments,
+            Function: self.compile_function,
+            FunctionCall: self.compile_function_call,
+            Return: self.compile_return,
+            BuiltinFunction: self.compile_builtin,
+            If: self.compile_if,
+            While: self.compile_while,
+            For: self.compile_for,
+            Range: self.compile_range,
+            Index: self.compile_index,
+            IndexAssignment: self.compile_index_assignment,
+            Assignment: self.compile_assignment,
+            UnaryOp: self.compile_unary,
+            BinOp: self.compile_binary,
+            ExpressionStmt: self.compile_expression_stmt,
+        }
+
+    def compile(self, node: Expr) -> Compiled:
+        compiler = self.compilers.get(type(node), None)
+        if compiler is None:
+            raise SyntaxError(f"can not compile {node}")
+        return compiler(node)
+
+    def compile_program(self, ast: list[Expr]) -> list[Compiled]:
+        return [self.compile(stmt) for stmt in resolve_program(ast, self.functions)]
+
+    def compile_block(self, body: list[Expr]) -> Compiled:
+        # like If and FunctionCall, a block stops at its first Return and
+        # gives back its value
+        stmts = []
+        result = None
+        for stmt in body:
+            if isinstance(stmt, Return):
+                result = self.compile(stmt)
+                break
+            stmts.append(self.compile(stmt))
+        stmts = tuple(stmts)
+
+        if result is None:
+            def block(context):
+                for stmt in stmts:
+                    stmt(context)
+            return block
+
+        def block_with_return(context):
+            for stmt in stmts:
+                stmt(context)
+            return result(context)
+        return block_with_return
+
+    def compile_constant(self, node: Number | String | Boolean | Null):
+        value = node.value
+        return lambda context: value
+
+    def compile_variable(self, node: Variable):
+        name = node.name
+        slot = node.slot
+
+        def global_variable(context):
+            try:
+                return context[name]
+            except KeyError:
+                raise NameError(f"Var {name} not found") from None
+
+        if slot is None:
+            if node.depth:
+                return lambda frame: global_variable(frame.globals)
+            return global_variable
+
+        def local_variable(frame):
+            value = frame.values[slot]
+            if value is UNSET:
+                # a function starts out seeing the global of the same name
+                return global_variable(frame.globals)
+            return value
+        return local_variable
+
+    def compile_list_arguments(self, node: ListArguments):
+        args = tuple(self.compile(arg) for arg in node)
+        return lambda context: [arg(context) for arg in args]
+
+    def compile_function(self, node: Function):
+        # functions are registered while parsing, defining one does nothing
+        return lambda context: None
+
+    def compile_function_call(self, node: FunctionCall):
+        name = node.name
+        function = node.function
+        if name not in self.bodies:
+            # each body is compiled once, a recursive call finds it in bodies
+            # by the time it runs
+            self.bodies[name] = None
+            self.bodies[name] = self.compile_block(function.body)
+        if len(function.args) != len(node.args):
+            raise SyntaxError(
+                f"Function {name} expected {len(function.args)} args, got {len(node.args)}")
+        args = tuple(self.compile(arg) for arg in node.args)
+        unset = (UNSET,) * (function.frame_size - len(args))
+        nested = node.depth
+        bodies = self.bodies
+        line, column = node.line, node.column
+
+        def call(context):
+            budget = current_budget()
+            if budget is not None:
+                try:
+                    budget.steps += 1
+                    if budget.steps >= budget.next_check:
+                        budget.check()
+                except ResourceLimitExceeded as error:
+                    raise error.locate(line, column) from None
+            values = [arg(context) for arg in args]
+            values.extend(unset)
+            frame = Frame(values, context.globals if nested else context)
+            try:
+                return bodies[name](frame)
+            except FunctionReturn as returned:
+                return returned.value
+        return call
+
+    def compile_return(self, node: Return):
+        value = self.compile(node.value)
+        if not node.nested:
+            return value
+
+        def nested_return(context):
+            raise FunctionReturn(value(context))
+        return nested_return
+
+    def compile_builtin(self, node: BuiltinFunction):
+        function = node.function
+        args_count = node.args_count
+        args = tuple(self.compile(arg) for arg in node.args)
+        if args_count is not None and len(args) != args_count:
+            def invalid(context):
+                raise ValueError("invalid number of arguments")
+            return invalid
+        return lambda context: function(*[arg(context) for arg in args])
+
+    def compile_if(self, node: If):
+        branches = tuple((self.compile(condition), self.compile_block(body))
+                         for condition, body in zip(node.conditions, node.body))
+        else_body = self.compile_block(node.else_body)
+
+        def if_stmt(context):
+            for condition, body in branches:
+                if condition(context):
+                    return body(context)
+            return else_body(context)
+        return if_stmt
+
+    def compile_while(self, node: While):
+        condition = self.compile(node.condition)
+        # at the top level Return does not leave a while loop, its value is
+        # just evaluated
+        body = tuple(self.compile(stmt) for stmt in node.body)
+        line, column = node.line, node.column
+
+        def while_loop(context):
+            budget = current_budget()
+            if budget is None:
+                while condition(context):
+                    for stmt in body:
+                        stmt(context)
+                return
+            try:
+                while condition(context):
+                    for stmt in body:
+                        stmt(context)
+                    budget.steps += 1
+                    if budget.steps >= budget.next_check:
+                        budget.check()
+            except ResourceLimitExceeded as error:
+                raise error.locate(line, column) from None
+        return while_loop
+
+    def compile_for(self, node: For):
+        iterable = self.compile(node.iterable)
+        body = tuple(self.compile(stmt) for stmt in node.body)
+        name, slot = node.name, node.slot
+        line, column = node.line, node.column
+        # one statement bodies, the usual shape, skip the inner loop
+        single = body[0] if len(body) == 1 else None
+
+        def for_loop(context):
+            values = iter(iterable(context))
+            # the loop stores straight into the frame list or the globals
+            if slot is not None:
+                target, key = context.values, slot
+            else:
+                target, key = context, name
+            budget = current_budget()
+            if budget is None:
+                if single is not None:
+                    for target[key] in values:
+                        single(context)
+                    return
+                for target[key] in values:
+                    for stmt in body:
+                        stmt(context)
+                return
+            try:
+                for target[key] in values:
+                    for stmt in body:
+                        stmt(context)
+                    budget.steps += 1
+                    if budget.steps >= budget.next_check:
+                        budget.check()
+            except ResourceLimitExceeded as error:
+                raise error.locate(line, column) from None
+        return for_loop
+
+    def compile_range(self, node: Range):
+        start = self.compile(node.start)
+        stop = self.compile(node.stop)
+        return lambda context: NumberRange(start(context), stop(context))
+
+    def compile_index(self, node: Index):
+        target = self.compile(node.target)
+        if isinstance(node.index, (Number, String, Boolean, Null)):
+            key = node.index.value
+            if isinstance(node.index, Number) and float(key).is_integer():
+                # `xs[0]`: the index is checked once, here, for lists
+                position = int(key)
+
+                def constant_index(context):
+                    container = target(context)
+                    if container.__class__ is List:
+                        try:
+                            return container.items[position]
+                        except IndexError:
+                            pass
+                    return get_item(container, key)
+                return constant_index
+            return lambda context: get_item(target(context), key)
+        index = self.compile(node.index)
+        return lambda context: get_item(target(context), index(context))
+
+    def compile_index_assignment(self, node: IndexAssignment):
+        target = self.compile(node.target)
+        index = self.compile(node.index)
+        value = self.compile(node.value)
+        if node.op == "=":
+            def assign_item(context):
+                set_item(target(context), index(context), value(context))
+            return assign_item
+        op = UPDATE_OPS.get(node.op, None)
+        if op is None:
+            raise SyntaxError("dont know the assignment operator")
+
+        def update(context):
+            update_item(target(context), index(context), op, value(context))
+        return update
+
+    def compile_assignment(self, node: Assignment):
+        name = node.name
+        slot = node.slot
+        value = self.compile(node.value)
+        op = ASSIGNMENT_OPS.get(node.op, None)
+        if node.op != "=" and op is None:
+            if slot is not None:
+                return lambda frame: frame.values[slot]
+            return lambda context: context[name]
+
+        line, column = node.line, node.column
+
+        if slot is None:
+            if op is None:
+                def assign(context):
+                    result = value(context)
+                    if result.__class__ is str and len(result) > LARGE_STRING:
+                        check_string(result, line, column)
+                    context[name] = result
+                return assign
+
+            def assign_op(context):
+                result = op(context[name], value(context))
+                if result.__class__ is str and len(result) > LARGE_STRING:
+                    check_string(result, line, column)
+                context[name] = result
+            return assign_op
+
+        if op is None:
+            def assign_local(frame):
+                result = value(frame)
+                if result.__class__ is str and len(result) > LARGE_STRING:
+                    check_string(result, line, column)
+                frame.values[slot] = result
+            return assign_local
+
+        def assign_local_op(frame):
+            current = frame.values[slot]
+            if current is UNSET:
+                current = frame.globals[name]
+            result = op(current, value(frame))
+            if result.__class__ is str and len(result) > LARGE_STRING:
+                check_string(result, line, column)
+            frame.values[slot] = result
+        return assign_local_op
+
+    def compile_unary(self, node: UnaryOp):
+        op = UNARY_OPS.get(node.op, None)
+        if op is None:
+            raise SyntaxError("dont know the unary operator")
+        expr = self.compile(node.expr)
+        return lambda context: op(expr(context))
+
+    def compile_binary(self, node: BinOp):
+        # a long chain like a + b + c nests on its left, it is compiled in a
+        # loop from its innermost node out
+        chain = []
+        while isinstance(node, BinOp):
+            chain.append(node)
+            node = node.left
+        left = self.compile(node)
+        for node in reversed(chain):
+            left = self.compile_binary_node(node, left)
+        return left
+
+    def compile_binary_node(self, node: BinOp, left: Compiled) -> Compiled:
+        op = BINARY_OPS.get(node.op, None)
+        if op is None:
+            raise SyntaxError("dont know the operator")
+        if isinstance(node.right, (Number, String, Boolean, Null)):
+            # the common `i < 10` and `x * 2` shapes skip one closure call
+            constant = node.right.value
+            return lambda context: op(left(context), constant)
+        right = self.compile(node.right)
+        return lambda context: op(left(context), right(context))
+
+    def compile_expression_stmt(self, node: ExpressionStmt):
+        return self.compile(node.expression)
+
+
+def compile_program(ast: list[Expr], functions: dict[str, Function]) -> list[Compiled]:
+    return ClosureCompiler(functions).compile_program(ast)
+
+
+def run_program(program: list[Compiled], context: dict):
+    for stmt in program:
+        stmt(context)
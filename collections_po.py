@@ -0,0 +1,175 @@
+import operator
+from array import array
+from typing import Iterator
+
+from limits import LARGE_STRING, current_budget
+from modules import Module
+
+# the functions of the compound index assignments, `xs[i] += 1`
+UPDATE_OPS = {
+    "+=": operator.add,
+    "-=": operator.sub,
+    "*=": operator.mul,
+    "/=": operator.truediv,
+}
+
+
+def is_number(value) -> bool:
+    return value.__class__ is float or (isinstance(value, (int, float))
+                                        and not isinstance(value, bool))
+
+
+class List:
+    # a growable pos list; while it only holds numbers they are kept unboxed
+    # in an array('d'), the first other value moves them to a python list.
+    # Lists compare by identity, so changing one never changes an ==
+    __slots__ = ["items"]
+
+    def __init__(self, values=()):
+        values = list(values)
+        if all(is_number(value) for value in values):
+            self.items: array | list = array("d", values)
+        else:
+            self.items = values
+
+    def unpack(self):
+        # the array can not hold the value about to be stored
+        self.items = self.items.tolist()
+
+    def get(self, key):
+        try:
+            return self.items[to_index(key)]
+        except IndexError:
+            raise IndexError(f"list index {key} out of range") from None
+
+    def set(self, key, value):
+        index = to_index(key)
+        if self.items.__class__ is array and not is_number(value):
+            self.unpack()
+        try:
+            self.items[index] = value
+        except IndexError:
+            raise IndexError(f"list index {key} out of range") from None
+
+    def push(self, value):
+        items = self.items
+        if items.__class__ is array and not is_number(value):
+            self.unpack()
+            items = self.items
+        items.append(value)
+        if len(items) > LARGE_STRING:
+            budget = current_budget()
+            if budget is not None:
+                budget.check_size(items)
+
+    def pop(self):
+        if not self.items:
+            raise IndexError("pop from an empty list")
+        return self.items.pop()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator:
+        return iter(self.items)
+
+    def __repr__(self) -> str:
+        return f"List({list(self.items)})"
+
+
+def to_index(key) -> int:
+    if key.__class__ is not float or not key.is_integer():
+        if not is_number(key) or not float(key).is_integer():
+            raise TypeError(f"index must be a whole number, got {key!r}")
+    return int(key)
+
+
+def get_item(container, key):
+    if container.__class__ is List:
+        return container.get(key)
+    if container.__class__ is dict:
+        try:
+            return container[key]
+        except KeyError:
+            raise KeyError(f"key {format_value(key)} not found") from None
+        except TypeError:
+            raise TypeError(f"{format_value(key)} can not be a map key") from None
+    if container.__class__ is Module:
+        # `lib.name` reads a global of an imported module
+        return container.get(key)
+    if isinstance(container, str) or hasattr(container, "__array__"):
+        # strings give one character strings, arrays their elements
+        try:
+            return container[to_index(key)]
+        except IndexError:
+            raise IndexError(f"index {key} out of range") from None
+    raise TypeError(f"{format_value(container)} can not be indexed")
+
+
+def set_item(container, key, value):
+    if container.__class__ is List:
+        container.set(key, value)
+    elif container.__class__ is dict:
+        try:
+            container[key] = value
+        except TypeError:
+            raise TypeError(f"{format_value(key)} can not be a map key") from None
+    else:
+        raise TypeError(f"{format_value(container)} can not be changed, only lists and maps can")
+
+
+def update_item(container, key, op, value):
+    set_item(container, key, op(get_item(container, key), value))
+
+
+def make_list(*values) -> List:
+    return List(values)
+
+
+def make_map(*pairs) -> dict:
+    # `{k: v, ...}` passes its keys and values alternately
+    values = {}
+    for index in range(0, len(pairs), 2):
+        set_item(values, pairs[index], pairs[index + 1])
+    return values
+
+
+def push(target, value):
+    if target.__class__ is not List:
+        raise TypeError(f"push expects a list, got {format_value(target)}")
+    target.push(value)
+
+
+def pop(target, *key):
+    # pop(list) removes the last item, pop(map, key) the entry of key
+    if target.__class__ is List and not key:
+        return target.pop()
+    if target.__class__ is dict and len(key) == 1:
+        value = get_item(target, key[0])
+        del target[key[0]]
+        return value
+    raise TypeError("pop expects a list, or a map and a key")
+
+
+def format_value(value, nested: bool = True) -> str:
+    # how puts shows a value; strings are quoted inside collections only
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, str):
+        return f'"{value}"' if nested else value
+    if value.__class__ is List:
+        return f"[{', '.join(format_value(item) for item in value.items)}]"
+    if value.__class__ is dict:
+        return "{" + ", ".join(f"{format_value(key)}: {format_value(item)}"
+                               for key, item in value.items()) + "}"
+    if is_number(value):
+        return repr(float(value))
+    if value.__class__ is Module:
+        return f"<module {value.name}>"
+    if hasattr(value, "__array__"):
+        return f"@[{', '.join(repr(float(item)) for item in value.ravel())}]"
+    return repr(value)
@@ -1,6 +1,11 @@
+from itertools import count, islice
+from math import floor
 from typing import Any, Self, Callable
 from ast import Expr
 
+from collections_po import UPDATE_OPS, get_item, set_item, update_item, is_number
+from limits import LARGE_STRING, ResourceLimitExceeded, check_string, current_budget
+
 
 class Number(Expr):
     __slots__ = ["value"]
@@ -28,12 +33,42 @@ class String(Expr):
         return f"String({self.value})"
 
 
+UNSET = object()
+
+
+class Frame:
+    # one activation of a user function: locals live in values at the slot the
+    # resolver gave them, anything else is looked up in the globals dict
+    __slots__ = ["values", "globals"]
+
+    def __init__(self, values: list, globals: dict):
+        self.values = values
+        self.globals = globals
+
+    def __repr__(self):
+        return f"Frame({self.values})"
+
+
 class Variable(Expr):
+    # depth 0 reads the current scope, depth 1 the globals from inside a
+    # function; slot is the frame index of a function local
+    __slots__ = ["name", "depth", "slot"]
+
     def __init__(self, name: str):
         self.name = name
+        self.depth = 0
+        self.slot = None
 
     def evaluate(self, context):
         # from pdb import set_trace; set_trace()
+        slot = self.slot
+        if slot is not None:
+            value = context.values[slot]
+            if value is not UNSET:
+                return value
+            context = context.globals
+        elif self.depth:
+            context = context.globals
         if self.name in context:
             return context[self.name]
         raise NameError(f"Var {self.name} not found")
@@ -91,13 +126,14 @@ class ListArguments(Expr):
 
 
 class Function(Expr):
-    __slots__ = ["name", "args", "body", "local_context"]
+    __slots__ = ["name", "args", "body", "frame_size"]
 
     def __init__(self, name: str, args: ListArguments, body: list[Expr]):
         self.name: str = name
         self.args: ListArguments = args
         self.body = body
-        self.local_context = {x.name: None for x in args}
+        # set by the resolver: parameters first, then the assigned locals
+        self.frame_size: int | None = None
 
     def evaluate(self, context):
         pass
@@ -106,37 +142,68 @@ class Function(Expr):
         return f"Function(name={self.name}, args={self.args}, body={self.body})"
 
 
+class FunctionReturn(Exception):
+    # raised by a Return nested in an If or While of a function body, the
+    # FunctionCall running that body catches it
+    __slots__ = ["value"]
+
+    def __init__(self, value):
+        self.value = value
+
+
 class FunctionCall(Expr):
-    __slots__ = ["name", "args", "body", "local_context"]
+    __slots__ = ["name", "args", "function", "depth", "line", "column"]
 
-    def __init__(self, name: str, args: ListArguments, body: list[Expr], local_context):
+    def __init__(self, name: str, args: ListArguments, line: int = 0, column: int = 0):
         self.name: str = name
         self.args: ListArguments = args
-        self.body: list[Expr] = body
-        self.local_context = local_context
+        # linked by the resolver, depth 1 when called from inside a function
+        self.function: Function | None = None
+        self.depth = 0
+        self.line = line
+        self.column = column
 
     def evaluate(self, context):
-        self.local_context = {k: v.evaluate(
-            context) for k, v in self.local_context.items()}
-        self.local_context = {**self.local_context, **context}
-        for expr in self.body:
-            if isinstance(expr, Return):
-                # from pdb import set_trace; set_trace()
-                return expr.evaluate(self.local_context)
-            expr.evaluate(self.local_context)
-        # need to return the value of the function
+        budget = current_budget()
+        if budget is not None:
+            try:
+                budget.steps += 1
+                if budget.steps >= budget.next_check:
+                    budget.check()
+            except ResourceLimitExceeded as error:
+                raise error.locate(self.line, self.column) from None
+        function = self.function
+        values = [UNSET] * function.frame_size
+        for slot, arg in enumerate(self.args):
+            values[slot] = arg.evaluate(context)
+        # every activation gets its own frame, the node itself keeps no state
+        frame = Frame(values, context.globals if self.depth else context)
+        try:
+            for expr in function.body:
+                if isinstance(expr, Return):
+                    return expr.evaluate(frame)
+                expr.evaluate(frame)
+        except FunctionReturn as returned:
+            return returned.value
 
     def __repr__(self) -> str:
-        return f"FunctionCall(name={self.name},{self.local_context} ,args={self.args}, body={self.body})"
+        return f"FunctionCall(name={self.name}, args={self.args})"
 
 
 class Return(Expr):
-    __slots__ = ["value"]
+    __slots__ = ["value", "nested", "line", "column"]
 
-    def __init__(self, value: Expr):
+    def __init__(self, value: Expr, line: int = 0, column: int = 0):
         self.value: Expr = value
+        # set by the resolver when the Return sits in an If or While of a
+        # function body and has to leave the whole function
+        self.nested = False
+        self.line = line
+        self.column = column
 
     def evaluate(self, context):
+        if self.nested:
+            raise FunctionReturn(self.value.evaluate(context))
         return self.value.evaluate(context)
 
     def __repr__(self) -> str:
@@ -144,13 +211,16 @@ class Return(Expr):
 
 
 class BuiltinFunction(Expr):
-    __slots__ = ["value", "function", "args_count", "args"]
+    __slots__ = ["value", "function", "args_count", "args", "line", "column"]
 
-    def __init__(self, value: str, function: Callable, args_count: int | None = None):
+    def __init__(self, value: str, function: Callable, args_count: int | None = None,
+                 line: int = 0, column: int = 0):
         self.value: str = value
         self.function = function
         self.args_count = args_count
         self.args = []
+        self.line = line
+        self.column = column
 
     def evaluate(self, context):
         copy_args = self.args.evaluate(context)
@@ -163,12 +233,15 @@ class BuiltinFunction(Expr):
 
 
 class If(Expr):
-    __slots__ = ["condition", "body", "else_body"]
+    __slots__ = ["conditions", "body", "else_body", "line", "column"]
 
-    def __init__(self, conditions: list[Expr], body: list[list[Expr]], else_body: list[Expr]):
+    def __init__(self, conditions: list[Expr], body: list[list[Expr]], else_body: list[Expr],
+                 line: int = 0, column: int = 0):
         self.conditions: list[Expr] = conditions
         self.body: list[list[Expr]] = body
         self.else_body: list[Expr] = else_body
+        self.line = line
+        self.column = column
 
     def evaluate(self, context):
         # from pdb import set_trace; set_trace()
@@ -193,45 +266,235 @@ class If(Expr):
 
 
 class While(Expr):
-    __slots__ = ["condition", "body"]
+    __slots__ = ["condition", "body", "line", "column"]
 
-    def __init__(self, condition: Expr, body: list[Expr]):
+    def __init__(self, condition: Expr, body: list[Expr], line: int = 0, column: int = 0):
         self.condition = condition
         self.body = body
+        self.line = line
+        self.column = column
 
     def evaluate(self, context):
-        while self.condition.evaluate(context):
-            for expr in self.body:
-                expr.evaluate(context)
+        budget = current_budget()
+        if budget is None:
+            while self.condition.evaluate(context):
+                for expr in self.body:
+                    expr.evaluate(context)
+            return
+        try:
+            while self.condition.evaluate(context):
+                for expr in self.body:
+                    expr.evaluate(context)
+                budget.steps += 1
+                if budget.steps >= budget.next_check:
+                    budget.check()
+        except ResourceLimitExceeded as error:
+            raise error.locate(self.line, self.column) from None
 
     def __repr__(self):
         return f"While(condition={self.condition}, body={self.body})"
 
 
+class NumberRange:
+    # the value of `start..stop`: every number from start up to and including
+    # stop, in steps of 1; it is never materialized, iterating counts lazily
+    __slots__ = ["start", "stop"]
+
+    def __init__(self, start: float, stop: float):
+        if not is_number(start) or not is_number(stop):
+            raise TypeError(f"range bounds must be numbers, got {start!r}..{stop!r}")
+        self.start = float(start)
+        self.stop = float(stop)
+
+    def __len__(self) -> int:
+        return max(0, floor(self.stop - self.start) + 1)
+
+    def __iter__(self):
+        return islice(count(self.start), len(self))
+
+    def __contains__(self, value) -> bool:
+        return isinstance(value, (int, float)) and self.start <= value <= self.stop \
+            and (value - self.start).is_integer()
+
+    def __repr__(self) -> str:
+        return f"{self.start}..{self.stop}"
+
+
+class Range(Expr):
+    __slots__ = ["start", "stop"]
+
+    def __init__(self, start: Expr, stop: Expr):
+        self.start = start
+        self.stop = stop
+
+    def evaluate(self, context):
+        return NumberRange(self.start.evaluate(context), self.stop.evaluate(context))
+
+    def __repr__(self):
+        return f"Range(start={self.start}, stop={self.stop})"
+
+
+class For(Expr):
+    # `for (name in iterable) body end`; the name is bound like an Assignment,
+    # to a frame slot inside a function and in the globals dict otherwise
+    __slots__ = ["name", "iterable", "body", "slot", "line", "column"]
+
+    def __init__(self, name: str, iterable: Expr, body: list[Expr], line: int = 0,
+                 column: int = 0):
+        self.name = name
+        self.iterable = iterable
+        self.body = body
+        self.slot = None
+        self.line = line
+        self.column = column
+
+    def evaluate(self, context):
+        values = iter(self.iterable.evaluate(context))
+        body = self.body
+        # the loop variable goes straight into the frame list or the dict
+        if self.slot is not None:
+            target, key = context.values, self.slot
+        else:
+            target, key = context, self.name
+        budget = current_budget()
+        if budget is None:
+            for target[key] in values:
+                for expr in body:
+                    expr.evaluate(context)
+            return
+        try:
+            for target[key] in values:
+                for expr in body:
+                    expr.evaluate(context)
+                budget.steps += 1
+                if budget.steps >= budget.next_check:
+                    budget.check()
+        except ResourceLimitExceeded as error:
+            raise error.locate(self.line, self.column) from None
+
+    def __repr__(self):
+        return f"For(name={self.name}, iterable={self.iterable}, body={self.body})"
+
+
+class Block(Expr):
+    # `BEGIN ... end` and `END ... end` of a record script: they are taken out
+    # of the program and run before the first and after the last record
+    __slots__ = ["name", "body", "line", "column"]
+
+    def __init__(self, name: str, body: list[Expr], line: int = 0, column: int = 0):
+        self.name = name
+        self.body = body
+        self.line = line
+        self.column = column
+
+    def evaluate(self, context):
+        raise SyntaxError(f"{self.name} blocks only run in record mode (-n)")
+
+    def __repr__(self):
+        return f"Block(name={self.name}, body={self.body})"
+
+
 class Assignment(Expr):
-    def __init__(self, name: str, op: str, value: Expr):
+    __slots__ = ["name", "op", "value", "slot", "line", "column"]
+
+    def __init__(self, name: str, op: str, value: Expr, line: int = 0, column: int = 0):
         self.name = name
         self.op = op
         self.value: Expr = value
+        # frame index when assigned inside a function, see Variable
+        self.slot = None
+        self.line = line
+        self.column = column
 
     def evaluate(self, context):
+        if self.slot is not None:
+            return self.evaluate_local(context)
         if self.op == "=":
-            context[self.name]: Any = self.value.evaluate(context)
+            value = self.value.evaluate(context)
         elif self.op == "+=":
-            context[self.name] += self.value.evaluate(context)
+            value = context[self.name] + self.value.evaluate(context)
         elif self.op == "-=":
-            context[self.name] -= self.value.evaluate(context)
+            value = context[self.name] - self.value.evaluate(context)
         elif self.op == "*=":
-            context[self.name] *= self.value.evaluate(context)
+            value = context[self.name] * self.value.evaluate(context)
         elif self.op == "/=":
-            context[self.name] /= self.value.evaluate(context)
+            value = context[self.name] / self.value.evaluate(context)
         else:
             return context[self.name]
+        if value.__class__ is str and len(value) > LARGE_STRING:
+            check_string(value, self.line, self.column)
+        context[self.name] = value
+
+    def evaluate_local(self, frame: Frame):
+        values = frame.values
+        if self.op == "=":
+            value = self.value.evaluate(frame)
+        else:
+            current = values[self.slot]
+            if current is UNSET:
+                # a function starts out seeing the global of the same name
+                current = frame.globals[self.name]
+            value = self.value.evaluate(frame)
+            if self.op == "+=":
+                value = current + value
+            elif self.op == "-=":
+                value = current - value
+            elif self.op == "*=":
+                value = current * value
+            elif self.op == "/=":
+                value = current / value
+            else:
+                return current
+        if value.__class__ is str and len(value) > LARGE_STRING:
+            check_string(value, self.line, self.column)
+        values[self.slot] = value
 
     def __repr__(self) -> str:
         return f"Assignment('{self.name}',op='{self.op}', {repr(self.value)})"
 
 
+class Index(Expr):
+    # `target[index]`, and `target.name` with the name as a String index
+    __slots__ = ["target", "index"]
+
+    def __init__(self, target: Expr, index: Expr):
+        self.target = target
+        self.index = index
+
+    def evaluate(self, context):
+        return get_item(self.target.evaluate(context), self.index.evaluate(context))
+
+    def __repr__(self) -> str:
+        return f"Index(target={self.target}, index={self.index})"
+
+
+class IndexAssignment(Expr):
+    # stores into a list or map in place, the target itself is only read
+    __slots__ = ["target", "index", "op", "value", "line", "column"]
+
+    def __init__(self, target: Expr, index: Expr, op: str, value: Expr, line: int = 0,
+                 column: int = 0):
+        self.target = target
+        self.index = index
+        self.op = op
+        self.value = value
+        self.line = line
+        self.column = column
+
+    def evaluate(self, context):
+        target = self.target.evaluate(context)
+        index = self.index.evaluate(context)
+        value = self.value.evaluate(context)
+        if self.op == "=":
+            set_item(target, index, value)
+        else:
+            update_item(target, index, UPDATE_OPS[self.op], value)
+
+    def __repr__(self) -> str:
+        return (f"IndexAssignment(target={self.target}, index={self.index}, "
+                f"op='{self.op}', {repr(self.value)})")
+
+
 class UnaryOp(Expr):
     __slots__ = ["op", "expr"]
 
@@ -0,0 +1,233 @@
+import os
+from contextlib import nullcontext
+from typing import Any, Callable
+
+import cache
+import closures
+import transpiler
+import vm
+from builtins_po import make_builtin_func
+from expressions import Assignment, Block, Expr, Function, FunctionCall, ListArguments, Variable
+from limits import Budget
+from modules import CURRENT_LOADER, Module, current_loader
+from optimizer import drop_temps, optimize_program, temp_names
+from parser import Parser
+from resolver import resolve_program
+from tokenizer import TokenStream, read_file
+
+
+def run_tree(program: list[Expr], context: dict):
+    for stmt in program:
+        stmt.evaluate(context)
+
+
+# how each engine turns a parsed program into something it runs, and runs it
+ENGINES: dict[str, tuple[Callable[[list[Expr], dict[str, Function]], Any],
+                         Callable[[Any, dict], None]]] = {
+    "tree": (resolve_program, run_tree),
+    "closure": (closures.compile_program, closures.run_program),
+    "vm": (vm.compile_program, vm.run_program),
+    "python": (transpiler.compile_program, transpiler.run_program),
+}
+
+
+def compile_ast(ast: list[Expr], functions: dict[str, Function], engine: str = "tree"):
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine}")
+    for stmt in ast:
+        if isinstance(stmt, Block):
+            # RecordProgram takes them out before compiling
+            stmt.evaluate({})
+    try:
+        return ENGINES[engine][0](ast, functions)
+    except RecursionError:
+        # the passes recurse on nesting that is not a plain chain
+        raise SyntaxError(f"the program nests too deeply for the {engine} engine") from None
+
+
+# the python engine runs generated python code, it has no place to count
+# steps in, so budgets are not available there
+BUDGETED_ENGINES = ("tree", "closure", "vm")
+
+
+def run_compiled(program, context: dict, engine: str = "tree", budget: Budget | None = None):
+    if budget is None:
+        ENGINES[engine][1](program, context)
+        return
+    if engine not in BUDGETED_ENGINES:
+        raise ValueError(f"budgets are not supported by the {engine} engine")
+    with budget:
+        ENGINES[engine][1](program, context)
+
+
+class CompiledProgram:
+    # a parsed and linked program; it is never changed by running it, so one
+    # object can be run any number of times, from any thread. temps are the
+    # globals the optimizer hoisted values into, taken out after a run
+    __slots__ = ["engine", "functions", "program", "temps"]
+
+    def __init__(self, engine: str, functions: dict[str, Function], program,
+                 temps: list[str] = ()):
+        object.__setattr__(self, "engine", engine)
+        object.__setattr__(self, "functions", functions)
+        object.__setattr__(self, "program", program)
+        object.__setattr__(self, "temps", tuple(temps))
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError("a CompiledProgram can not be changed")
+
+    def __repr__(self) -> str:
+        return f"CompiledProgram(engine={self.engine}, functions={list(self.functions)})"
+
+    def run(self, inputs: dict | None = None, budget: Budget | None = None) -> dict:
+        # inputs are the starting globals, the globals at the end come back;
+        # a budget raises ResourceLimitExceeded when the run goes over it
+        context = {} if inputs is None else dict(inputs)
+        with nullcontext() if current_loader() is not None else ModuleLoader(self.engine):
+            run_compiled(self.program, context, self.engine, budget)
+        drop_temps(context, self.temps)
+        return context
+
+
+class Interpreter:
+    # compiles sources for one engine; builtins registered here are shared
+    # by every program compiled afterwards, as for make_builtin_func
+    __slots__ = ["engine", "optimize"]
+
+    def __init__(self, engine: str = "tree", optimize: bool = False):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine}")
+        self.engine = engine
+        self.optimize = optimize
+
+    def register(self, name: str, function: Callable, args_count: int | None = None):
+        make_builtin_func(name, function, args_count)
+
+    def compile(self, source: str) -> CompiledProgram:
+        functions: dict[str, Function] = {}
+        ast = Parser(TokenStream(source), functions).parse({})
+        if not self.optimize:
+            return CompiledProgram(self.engine, functions, compile_ast(ast, functions, self.engine))
+        ast = optimize_program(ast, functions)
+        return CompiledProgram(self.engine, functions, compile_ast(ast, functions, self.engine),
+                               temp_names(ast))
+
+    def run(self, source: str, inputs: dict | None = None,
+            budget: Budget | None = None) -> dict:
+        return self.compile(source).run(inputs, budget)
+
+
+# the hidden globals a call into a module passes its arguments and result in
+RESULT = ".result"
+
+# gives the ast and the functions of a source file
+FileCompiler = Callable[[str], tuple[list[Expr], dict[str, Function]]]
+
+
+class ModuleLoader:
+    # finds, compiles and runs the files of `import` for one engine while it
+    # is entered. Relative paths are looked up next to the importing module,
+    # then in the search path, then in POS_PATH and the working directory
+    __slots__ = ["engine", "optimize", "search_path", "compile_file", "modules", "loading",
+                 "token"]
+
+    def __init__(self, engine: str = "tree", optimize: bool = False,
+                 search_path: list[str] | tuple[str, ...] = (),
+                 compile_file: FileCompiler | None = None):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine}")
+        self.engine = engine
+        self.optimize = optimize
+        env_path = os.environ.get("POS_PATH", "")
+        self.search_path = [*search_path, *(path for path in env_path.split(os.pathsep) if path)]
+        # compile_file(path) gives the ast and functions of a file, main
+        # passes one that goes through the disk cache
+        self.compile_file = compile_file or self.parse_file
+        # the modules imported while this loader was entered, by path and
+        # source hash; a loader is one run, a module's top level runs once
+        # in it and no state outlives it
+        self.modules: dict[tuple[str, str], Module] = {}
+        # the modules whose top level is running, the last one is importing
+        self.loading: list[str] = []
+        self.token = None
+
+    def __enter__(self) -> "ModuleLoader":
+        self.token = CURRENT_LOADER.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        CURRENT_LOADER.reset(self.token)
+        self.token = None
+
+    def parse_file(self, path: str) -> tuple[list[Expr], dict[str, Function]]:
+        functions: dict[str, Function] = {}
+        ast = Parser(TokenStream(read_file(path)), functions).parse({})
+        if self.optimize:
+            ast = optimize_program(ast, functions)
+        return ast, functions
+
+    def find(self, path: str) -> str:
+        if os.path.isabs(path):
+            directories = [""]
+        else:
+            importing = [os.path.dirname(self.loading[-1])] if self.loading else []
+            directories = list(dict.fromkeys([*importing, *self.search_path, os.getcwd()]))
+        for directory in directories:
+            candidate = os.path.join(directory, path)
+            if os.path.isfile(candidate):
+                return os.path.realpath(candidate)
+        raise ImportError(f"module {path} not found in {', '.join(directories)}")
+
+    def load(self, path: str) -> Module:
+        real_path = self.find(path)
+        if real_path in self.loading:
+            cycle = self.loading[self.loading.index(real_path):] + [real_path]
+            raise ImportError("circular import: " + " -> ".join(
+                os.path.basename(name) for name in cycle))
+        digest = cache.source_hash(read_file(real_path))
+        key = (real_path, digest)
+        module = self.modules.get(key, None)
+        if module is not None:
+            return module
+        ast, functions = self.compile_file(real_path)
+        namespace: dict = {}
+        name = os.path.splitext(os.path.basename(real_path))[0]
+        module = Module(name, real_path, digest, namespace,
+                        lambda function_name: self.make_call(module, functions, function_name))
+        # the top level runs once, in the module's own globals; a module
+        # that fails is not kept, the next import runs it again
+        self.loading.append(real_path)
+        try:
+            run_compiled(compile_ast(ast, functions, self.engine), namespace, self.engine)
+        finally:
+            self.loading.pop()
+        drop_temps(namespace, temp_names(ast))
+        self.modules[key] = module
+        return module
+
+    def make_call(self, module: Module, functions: dict[str, Function], name: str):
+        # a call is a one statement program, `.result = name(.arg0, ...)`,
+        # run in the module globals with the arguments stored next to them
+        function = functions.get(name, None)
+        if function is None:
+            return None
+        params = [f".arg{index}" for index in range(len(function.args))]
+        call = Assignment(RESULT, "=", FunctionCall(name, ListArguments(
+            [Variable(param) for param in params])))
+        engine = self.engine
+        program = compile_ast([call], functions, engine)
+        run = ENGINES[engine][1]
+        namespace = module.namespace
+
+        def call_function(args: tuple):
+            if len(args) != len(params):
+                raise TypeError(f"{module.name}.{name} expects {len(params)} args, "
+                                f"got {len(args)}")
+            namespace.update(zip(params, args))
+            try:
+                run(program, namespace)
+            finally:
+                for param in params:
+                    namespace.pop(param, None)
+            return namespace.pop(RESULT)
+        return call_function
@@ -0,0 +1,149 @@
+import sys
+from contextvars import ContextVar
+from typing import Iterator, TextIO
+
+# output is written once this much is pending; input is read this much at once
+BUFFER_SIZE = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class OutputBuffer:
+    # collects what puts writes and hands it to the stream in large writes;
+    # it binds sys.stdout when entered, so a redirect around it is honoured.
+    # A size of 0 writes and flushes every piece as it comes
+    __slots__ = ["size", "stream", "parts", "pending", "token"]
+
+    def __init__(self, size: int = BUFFER_SIZE):
+        self.size = size
+        self.stream: TextIO | None = None
+        self.parts: list[str] = []
+        self.pending = 0
+        self.token = None
+
+    def __enter__(self) -> "OutputBuffer":
+        self.stream = sys.stdout
+        self.token = CURRENT_OUTPUT.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        # also on errors, so the output before the failing statement is kept
+        CURRENT_OUTPUT.reset(self.token)
+        self.token = None
+        self.flush()
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.pending += len(text)
+        if self.pending >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.stream.write("".join(self.parts))
+            self.parts.clear()
+            self.pending = 0
+        if self.stream is not None:
+            self.stream.flush()
+
+
+CURRENT_OUTPUT: ContextVar[OutputBuffer | None] = ContextVar("pos_output", default=None)
+
+# the active output buffer or None
+current_output = CURRENT_OUTPUT.get
+
+
+def write(text: str):
+    # without a buffer, as when embedded, every write goes straight out
+    output = current_output()
+    if output is None:
+        sys.stdout.write(text)
+    else:
+        output.write(text)
+
+
+def flush_output():
+    output = current_output()
+    if output is None:
+        sys.stdout.flush()
+    else:
+        output.flush()
+
+
+class LineReader:
+    # splits a text stream into lines, a chunk at a time; a terminal is read
+    # a line at a time instead, waiting for a whole chunk would block
+    __slots__ = ["stream", "chunk_size", "lines", "position", "rest", "done"]
+
+    def __init__(self, stream: TextIO, chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.lines: list[str] = []
+        self.position = 0
+        self.rest = ""
+        self.done = False
+
+    def fill(self):
+        if self.stream.isatty():
+            chunk = self.stream.readline()
+        else:
+            chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.done = True
+            # the last line has no newline
+            self.lines = [self.rest] if self.rest else []
+            self.rest = ""
+        else:
+            self.lines = (self.rest + chunk).split("\n")
+            self.rest = self.lines.pop()
+        self.position = 0
+
+    def read_line(self) -> str | None:
+        while self.position >= len(self.lines):
+            if self.done:
+                return None
+            self.fill()
+        line = self.lines[self.position]
+        self.position += 1
+        return line
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            if self.position < len(self.lines):
+                lines = self.lines[self.position:]
+                self.position = len(self.lines)
+                yield from lines
+            if self.done:
+                return
+            self.fill()
+
+    def read_all(self) -> str:
+        lines = self.lines[self.position:]
+        self.lines, self.position = [], 0
+        text = "".join(f"{line}\n" for line in lines) if not self.done else "\n".join(lines)
+        text += self.rest + self.stream.read()
+        self.rest = ""
+        self.done = True
+        return text
+
+
+STDIN_READER: LineReader | None = None
+
+
+def stdin_reader() -> LineReader:
+    # one reader per stdin, input, read_line and lines share what it buffered
+    global STDIN_READER
+    if STDIN_READER is None or STDIN_READER.stream is not sys.stdin:
+        STDIN_READER = LineReader(sys.stdin)
+    return STDIN_READER
+
+
+def read_prompted(prompt: str) -> str:
+    # what input() does, through the shared reader: the REPL and the script
+    # it runs read the same stdin, a line buffered by one is not lost to the
+    # other. The prompt has to be out before waiting for the answer
+    write(prompt)
+    flush_output()
+    line = stdin_reader().read_line()
+    if line is None:
+        raise EOFError("input reached the end of stdin")
+    return line
@@ -0,0 +1,115 @@
+import sys
+import time
+from contextvars import ContextVar
+
+# the deadline is only looked at every this many steps, reading the clock
+# on every loop iteration would cost more than the iteration itself
+CHECK_INTERVAL = 1024
+# shorter strings are never measured, so assigning them costs one type check;
+# the same goes for lists and their pushes
+LARGE_STRING = 1024
+# a memory limit must be above the size of anything too short to be
+# measured, a lower one would be silently ignored for such values
+MIN_MEMORY = 16 * LARGE_STRING
+
+
+class ResourceLimitExceeded(Exception):
+    __slots__ = ["limit", "message", "line", "column"]
+
+    def __init__(self, limit: str, message: str, line: int = 0, column: int = 0):
+        super().__init__(message)
+        self.limit = limit
+        self.message = message
+        self.line = line
+        self.column = column
+
+    def locate(self, line: int, column: int) -> "ResourceLimitExceeded":
+        # the innermost loop, call or assignment that knows where it is wins
+        if not self.line and line:
+            self.line = line
+            self.column = column
+        return self
+
+    def __str__(self) -> str:
+        if not self.line:
+            return self.message
+        return f"{self.message} at line {self.line}, column {self.column}"
+
+
+class Budget:
+    # what one run may use: steps are loop iterations plus function calls,
+    # memory is the size of the largest string the script assigns, or of the
+    # largest array or list it builds, the limit being at least MIN_MEMORY;
+    # maps are not measured. Engines count steps at loop back-edges and call
+    # sites, only while the budget is active
+    __slots__ = ["max_steps", "timeout", "max_memory", "steps", "deadline", "next_check",
+                 "token"]
+
+    def __init__(self, max_steps: int | None = None, timeout: float | None = None,
+                 max_memory: int | None = None):
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.steps = 0
+        self.deadline: float | None = None
+        self.next_check = CHECK_INTERVAL
+        self.token = None
+
+    def __repr__(self) -> str:
+        return (f"Budget(max_steps={self.max_steps}, timeout={self.timeout}, "
+                f"max_memory={self.max_memory})")
+
+    def __enter__(self) -> "Budget":
+        self.start()
+        self.token = CURRENT_BUDGET.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        CURRENT_BUDGET.reset(self.token)
+        self.token = None
+
+    def start(self):
+        self.steps = 0
+        self.deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        self.next_check = self.check_at()
+
+    def check_at(self) -> int:
+        next_check = self.steps + CHECK_INTERVAL
+        if self.max_steps is not None:
+            next_check = min(next_check, self.max_steps + 1)
+        return next_check
+
+    def step(self):
+        # loops inline these two lines, keep them in sync
+        self.steps += 1
+        if self.steps >= self.next_check:
+            self.check()
+
+    def check(self):
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise ResourceLimitExceeded("steps", f"step limit of {self.max_steps} exceeded")
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise ResourceLimitExceeded("timeout", f"time limit of {self.timeout}s exceeded")
+        self.next_check = self.check_at()
+
+    def check_size(self, value):
+        if self.max_memory is not None and sys.getsizeof(value) > self.max_memory:
+            raise ResourceLimitExceeded(
+                "memory", f"memory limit of {self.max_memory} bytes exceeded")
+
+
+CURRENT_BUDGET: ContextVar[Budget | None] = ContextVar("pos_budget", default=None)
+
+
+# the active budget or None, bound directly as it is read on every call
+current_budget = CURRENT_BUDGET.get
+
+
+def check_string(value: str, line: int = 0, column: int = 0):
+    # called for strings longer than LARGE_STRING
+    budget = CURRENT_BUDGET.get()
+    if budget is not None:
+        try:
+            budget.check_size(value)
+        except ResourceLimitExceeded as error:
+            raise error.locate(line, column) from None
@@ -1,73 +1,582 @@
 #!/usr/bin/env python
+import io
+import os
 import sys
-from tokenizer import Tokenizer, read_file
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from contextlib import ExitStack, nullcontext, redirect_stdout
+from typing import Iterator
+from tokenizer import TokenStream, read_file, read_lines, tokenize_stream
 from parser import Parser
+from interpreter import BUDGETED_ENGINES, ENGINES, ModuleLoader, compile_ast, run_compiled
+from collections_po import format_value
+from io_po import BUFFER_SIZE, OutputBuffer, flush_output, read_prompted, write
+from limits import MIN_MEMORY, Budget, ResourceLimitExceeded
+from profiler import Profiler, ProfilingCompiler, current_profiler
+from stats import FileStats, count_node_types, new_functions
+from optimizer import OptimizerStats, drop_temps, optimize_program, temp_names
+from records import RecordProgram, check_splittable, read_records, split_ranges
+from repl import Session, assigned_names
+from server import serve
+import cache
 import argparse
 
 # create a parser
 # type of parser recursive descent
 
+# programs compiled or loaded by a --serve worker, by cache path: the source
+# hash they were compiled from and the encoded program
+KEPT: dict[str, tuple[str, tuple]] = {}
+
+
+def prepare(ast: list, functions: dict, options: dict) -> list:
+    if "optimize" in options:
+        stats = OptimizerStats()
+        ast = optimize_program(ast, functions, stats)
+        if "debug" in options:
+            print(stats.report())
+    return ast
+
+
+def nested_too_deeply(file_name: str) -> SyntaxError:
+    # the parser and the encoder recurse on nesting, python's stack is the limit
+    return SyntaxError(f"{file_name} nests too deeply to be compiled")
+
+
+def parse_source(source: str, file_name: str, options: dict) -> tuple[list, dict]:
+    # one file on its own, with its own symbol table, so files can be
+    # compiled in any order or in parallel
+    functions = {}
+    try:
+        ast = Parser(TokenStream(source), functions).parse({})
+        return prepare(ast, functions, options), functions
+    except RecursionError:
+        raise nested_too_deeply(file_name) from None
+
+
+def encode_source(source: str, file_name: str, options: dict) -> tuple:
+    ast, _ = parse_source(source, file_name, options)
+    try:
+        return cache.encode_program(ast)
+    except RecursionError:
+        raise nested_too_deeply(file_name) from None
+
+
+def compile_file(file_name: str, options: dict) -> tuple:
+    # the program comes back encoded, the form the cache stores and a process
+    # pool can send cheaply. parsing is skipped when the cache holds this
+    # exact source, compiled the same way by this interpreter version; a
+    # served run keeps its programs in memory with or without the disk cache
+    source = read_file(file_name)
+    if "cache" not in options and "keep" not in options:
+        return encode_source(source, file_name, options)
+    digest = cache.source_hash(source)
+    optimized = "optimize" in options
+    path = cache.cache_path(file_name, options.get("cache_dir"), optimized)
+    kept = KEPT.get(path, None) if "keep" in options else None
+    if kept is not None and kept[0] == digest:
+        return kept[1]
+    if "cache" not in options:
+        program = encode_source(source, file_name, options)
+    else:
+        try:
+            program = cache.load_encoded(path, digest, optimized)
+        except cache.CacheMiss:
+            program = encode_source(source, file_name, options)
+            cache.store_encoded(path, digest, optimized, program)
+    if "keep" in options:
+        KEPT[path] = (digest, program)
+    return program
+
+
+def load_file(file_name: str, functions: dict, options: dict) -> list:
+    # the ast of a file run by this process, its functions are added to
+    # functions; it is only encoded to go through the cache
+    if "cache" in options or "keep" in options:
+        return cache.decode_program(compile_file(file_name, options), functions)
+    ast, defined = parse_source(read_file(file_name), file_name, options)
+    functions.update(defined)
+    return ast
+
+
+def compile_module(file_name: str, options: dict) -> tuple[list, dict]:
+    # imported modules go through the same disk cache as the scripts
+    functions = {}
+    return load_file(file_name, functions, options), functions
+
+
+def make_loader(files: list[str], options: dict) -> ModuleLoader:
+    # a script imports from its own directory first, then from the -I paths
+    directories = dict.fromkeys(os.path.dirname(os.path.abspath(file_name))
+                                for file_name in files)
+    return ModuleLoader(options.get("engine", "tree"), "optimize" in options,
+                        [*directories, *options.get("path", ())],
+                        partial(compile_module, options=options))
+
+
+def compile_files(files: list[str], functions: dict, options: dict) -> Iterator[list]:
+    # results come back in file order, the first file can run while the
+    # others are still being parsed; only programs from the pool are encoded
+    jobs = options.get("jobs", 1)
+    if jobs <= 1 or len(files) <= 1:
+        for file_name in files:
+            yield load_file(file_name, functions, options)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as pool:
+        for program in pool.map(compile_file, files, [options] * len(files)):
+            yield cache.decode_program(program, functions)
+
+
+def execute(ast: list, global_context: dict, functions: dict, options: dict,
+            file_name: str = "<input>"):
+    profiler = current_profiler()
+    if profiler is not None:
+        # profiles are always taken on the closure engine
+        program = ProfilingCompiler(functions, profiler, file_name).compile_program(ast)
+        run_compiled(program, global_context, "closure")
+    else:
+        engine = options.get("engine", "tree")
+        run_compiled(compile_ast(ast, functions, engine), global_context, engine)
+    if "optimize" in options:
+        drop_temps(global_context, temp_names(ast))
+
+
+def make_budget(options: dict) -> Budget | None:
+    if not any(limit in options for limit in ("max_steps", "timeout", "max_memory")):
+        return None
+    return Budget(options.get("max_steps"), options.get("timeout"), options.get("max_memory"))
+
 
 def run_file(files: list[str], options=None):
     if options is None:
         options = {}
+    profiler = Profiler() if "profile" in options else None
+    try:
+        # one budget for the whole run, it is shared by every file
+        with make_budget(options) or nullcontext(), profiler or nullcontext(), \
+                OutputBuffer(options.get("buffer_size", BUFFER_SIZE)), \
+                make_loader(files[:1] if "records" in options else files, options):
+            run_files(files, options)
+    finally:
+        if profiler is not None:
+            write_profile(profiler, options["profile"])
+
+
+def write_profile(profiler: Profiler, stacks_path: str):
+    print(profiler.report(), file=sys.stderr)
+    with open(stacks_path, "w") as file:
+        file.write(profiler.collapsed())
+    print(f"collapsed stacks written to {stacks_path}", file=sys.stderr)
+
+
+def run_files(files: list[str], options: dict):
     global_context = {}
-    for file_name in files:
-        tokenizer = Tokenizer(read_file(file_name))
-        tokens = tokenizer.tokenize()
-        parser = Parser(tokens)
-        ast = parser.parse(global_context)
-        for stmt in ast:
-            stmt.evaluate(global_context)
-        if "debug" in options:
-            for token in tokens:
-                print(token)
-            for stmt in ast:
-                print(stmt)
-            print(global_context)
-            print(ast)
+    functions = {}
+    if "records" in options:
+        run_records(files[0], files[1:], options)
+        return
+    if "stream" in options:
+        for file_name in files:
+            run_stream(file_name, global_context, functions, options)
+        return
+    if "debug" in options:
+        for file_name in files:
+            run_debug(file_name, global_context, functions, options)
+        return
+    if "stats" in options:
+        for file_name in files:
+            run_with_stats(file_name, global_context, functions, options)
+        return
+    # every file is compiled before it runs, functions defined by a file are
+    # visible to the files after it
+    for file_name, ast in zip(files, compile_files(files, functions, options)):
+        execute(ast, global_context, functions, options, file_name)
+
+
+class JobResult:
+    # what an isolated script left behind: its output, 0 or 1 and the error
+    __slots__ = ["file_name", "output", "status", "error", "elapsed"]
+
+    def __init__(self, file_name: str, output: str, status: int, error: str | None,
+                 elapsed: float):
+        self.file_name = file_name
+        self.output = output
+        self.status = status
+        self.error = error
+        self.elapsed = elapsed
+
 
-            print("this is the vars of my program")
-            for name, value in global_context.items():
-                print(f"{name} = {value}")
+def run_job(file_name: str, options: dict) -> JobResult:
+    # one script with its own globals and functions, nothing is shared with
+    # the other jobs so they can run on any process in any order
+    output = io.StringIO()
+    start = time.perf_counter()
+    status, error = 0, None
+    try:
+        with redirect_stdout(output), make_budget(options) or nullcontext(), \
+                OutputBuffer(options.get("buffer_size", BUFFER_SIZE)), \
+                make_loader([file_name], options):
+            functions = {}
+            execute(load_file(file_name, functions, options), {}, functions, options)
+    except Exception as exc:
+        status, error = 1, f"{type(exc).__name__}: {exc}"
+    return JobResult(file_name, output.getvalue(), status, error,
+                     time.perf_counter() - start)
+
+
+def run_batch(files: list[str], options: dict) -> Iterator[JobResult]:
+    jobs = options.get("jobs", 1)
+    if jobs <= 1 or len(files) <= 1:
+        for file_name in files:
+            yield run_job(file_name, options)
+        return
+    # jobs are sent in chunks, hundreds of small scripts would otherwise
+    # spend their time waiting on the pool; results still come in order
+    chunksize = max(1, len(files) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as pool:
+        yield from pool.map(run_job, files, [options] * len(files), chunksize=chunksize)
+
+
+def run_isolated(files: list[str], options: dict) -> int:
+    # the output of every job is written as soon as it and the jobs before
+    # it are done, the summary goes to stderr so stdout only has the output
+    start = time.perf_counter()
+    results = []
+    for result in run_batch(files, options):
+        sys.stdout.write(result.output)
+        sys.stdout.flush()
+        results.append(result)
+    elapsed = time.perf_counter() - start
+    failed = 0
+    for result in results:
+        state = "ok" if result.status == 0 else f"failed ({result.error})"
+        print(f"{result.file_name}: exit {result.status} in {result.elapsed:.3f}s {state}",
+              file=sys.stderr)
+        failed += result.status != 0
+    busy = sum(result.elapsed for result in results)
+    print(f"{len(results)} jobs, {failed} failed, {elapsed:.3f}s wall, "
+          f"{busy:.3f}s in jobs, {len(results) / elapsed if elapsed else 0:.1f} jobs/sec",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+def run_records(script: str, inputs: list[str], options: dict):
+    # the script is compiled once and run for every line of the inputs, or
+    # of stdin; with --jobs the inputs are split in byte ranges instead
+    if options.get("jobs", 1) > 1:
+        program = compile_file(script, options)
+        functions = {}
+        check_splittable(cache.decode_program(program, functions), functions)
+        # the workers import from the script directory like this process
+        script_directory = os.path.dirname(os.path.abspath(script))
+        run_record_ranges(program, inputs,
+                          {**options, "path": [script_directory, *options.get("path", ())]})
+        return
+    functions = {}
+    records = RecordProgram(load_file(script, functions, options), functions,
+                            options.get("engine", "tree"))
+    context = {}
+    use_mmap = "mmap" in options
+    if not inputs:
+        records.run(read_records(sys.stdin.buffer, use_mmap=use_mmap), context,
+                    options.get("separator"))
+        return
+    # BEGIN and END run once, around the lines of all the inputs
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(file_name, "rb")) for file_name in inputs]
+        lines = (line for file in files for line in read_records(file, use_mmap=use_mmap))
+        records.run(lines, context, options.get("separator"))
+
+
+def run_record_range(program: tuple, file_name: str, start: int, end: int,
+                     options: dict) -> str:
+    # one byte range of an input on its own process, with its own globals;
+    # its output comes back whole, so the ranges are written in order
+    output = io.StringIO()
+    with redirect_stdout(output), make_budget(options) or nullcontext(), \
+            OutputBuffer(options.get("buffer_size", BUFFER_SIZE)), make_loader([], options), \
+            open(file_name, "rb") as file:
+        functions = {}
+        records = RecordProgram(cache.decode_program(program, functions), functions,
+                                options.get("engine", "tree"))
+        records.run(read_records(file, start, end, "mmap" in options), {},
+                    options.get("separator"))
+    return output.getvalue()
+
+
+def run_record_ranges(program: tuple, inputs: list[str], options: dict):
+    # the ranges run on their own, with their own globals, and their output
+    # is written in input order; check_splittable keeps out the scripts
+    # that would see the difference
+    jobs = options["jobs"]
+    ranges = [(file_name, start, end) for file_name in inputs
+              for start, end in split_ranges(file_name, jobs)]
+    if not ranges:
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(ranges))) as pool:
+        for output in pool.map(run_record_range, [program] * len(ranges),
+                               *zip(*ranges), [options] * len(ranges)):
+            write(output)
+
+
+def run_with_stats(file_name: str, global_context: dict, functions: dict, options: dict):
+    # the phases run one by one, without the cache, so each can be measured;
+    # the stats are written even when the file fails
+    stats = FileStats(file_name)
+    before = dict(functions)
+    try:
+        with stats.phase("read_file"):
+            source = read_file(file_name)
+        with stats.phase("tokenize"):
+            tokens = TokenStream(source)
+        stats.tokens = len(tokens)
+        with stats.phase("parse"):
+            ast = prepare(Parser(tokens, functions).parse(global_context), functions, options)
+        stats.nodes = count_node_types(ast, new_functions(functions, before))
+        with stats.phase("execute", options.get("stats_memory", False)):
+            execute(ast, global_context, functions, options, file_name)
+    finally:
+        flush_output()
+        stats.globals = len(global_context)
+        stats.functions = len(new_functions(functions, before))
+        if options["stats"] == "json":
+            print(stats.to_json(), file=sys.stderr)
+        else:
+            print(stats.to_text(), file=sys.stderr)
+
+
+def run_debug(file_name: str, global_context: dict, functions: dict, options: dict):
+    tokens = TokenStream(read_file(file_name))
+    parser = Parser(tokens, functions)
+    ast = prepare(parser.parse(global_context), functions, options)
+    execute(ast, global_context, functions, options, file_name)
+    flush_output()
+    for token in tokens:
+        print(token)
+    for stmt in ast:
+        print(stmt)
+    print(global_context)
+    print(ast)
+
+    print("this is the vars of my program")
+    for name, value in global_context.items():
+        print(f"{name} = {value}")
+
+
+def run_stream(file_name: str, global_context: dict, functions: dict, options: dict):
+    # statements run as soon as they are parsed, so neither the source, the
+    # tokens nor the top level ast of the file are ever held as a whole
+    lines = read_lines(file_name, "mmap" in options)
+    parser = Parser(tokenize_stream(lines), functions)
+    for stmt in parser.statements(global_context):
+        execute(prepare([stmt], functions, options), global_context, functions, options,
+                file_name)
+    if "debug" in options:
+        flush_output()
+        print("this is the vars of my program")
+        for name, value in global_context.items():
+            print(f"{name} = {value}")
 
 
 def run_interpreter(options=None):
+    # a block typed over several lines runs once its `end` is in; an error
+    # drops the input that caused it and the session goes on
     if options is None:
         options = {}
-    global_context = {}
+    session = Session(options.get("engine", "tree"), "optimize" in options)
     while True:
-        input_text = input("$$ ")
-        tokenizer = Tokenizer(input_text)
-        tokens = tokenizer.tokenize()
-        parser = Parser(tokens)
-        ast = parser.parse(global_context)
-        for stmt in ast:
-            stmt.evaluate(global_context)
-        if "debug" in options:
-            for token in tokens:
-                print(token)
-
-            print(global_context)
-
-            print("this is the vars of my program")
-            for name, value in global_context.items():
-                print(f"{name} = {value}")
+        try:
+            line = read_prompted(".. " if session.pending else "$$ ")
+        except EOFError:
+            print()
+            return
+        except KeyboardInterrupt:
+            print()
+            session.reset()
+            continue
+        try:
+            ast = session.feed(line)
+        except Exception as error:
+            flush_output()
+            print(f"{type(error).__name__}: {error}", file=sys.stderr)
+            continue
+        flush_output()
+        if ast is not None and "debug" in options:
+            # only what this input assigned, the session may hold thousands
+            for name in assigned_names(ast):
+                print(f"{name} = {format_value(session.context.get(name), False)}")
 
 
-def main():
+def make_arg_parser() -> argparse.ArgumentParser:
     parse = argparse.ArgumentParser(prog="pos")
     parse.add_argument("filename", nargs="*")
+    parse.add_argument("-n", "--records", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help="run the script for every line of the files after it, or of stdin")
+    parse.add_argument("-F", "--field-separator", default=None,
+                       help="split records on this string instead of on whitespace")
     parse.add_argument("-d", "--debug", default=False,
                        action=argparse.BooleanOptionalAction)
-    args = parse.parse_args()
-    options = {}
+    parse.add_argument("-s", "--stream", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help="run each statement as soon as it is parsed")
+    parse.add_argument("--mmap", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help="stream the files through mmap (implies --stream), with -n "
+                            "map the inputs")
+    parse.add_argument("-I", "--path", action="append", default=[],
+                       help="look for imported modules in this directory too")
+    parse.add_argument("-O", "--optimize", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help="fold constants, prune dead branches and hoist loop invariants")
+    parse.add_argument("--cache", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help=f"keep compiled programs in {cache.CACHE_DIR} next to the sources")
+    parse.add_argument("--cache-dir", default=None,
+                       help="keep compiled programs in this directory instead, implies --cache")
+    parse.add_argument("-j", "--jobs", type=int, default=1,
+                       help="compile the files on this many processes, with -n split the "
+                            "inputs in this many byte ranges run apart, which scripts using "
+                            "BEGIN, END or nr can not be")
+    parse.add_argument("--isolated", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help="run every file as its own job, with its own globals")
+    parse.add_argument("-e", "--engine", choices=tuple(ENGINES), default="tree",
+                       help="how the parsed program is executed")
+    parse.add_argument("--max-steps", type=int, default=None,
+                       help="stop after this many loop iterations and function calls")
+    parse.add_argument("--timeout", type=float, default=None,
+                       help="stop after this many seconds")
+    parse.add_argument("--max-memory", type=int, default=None,
+                       help=f"stop when a string grows past this many bytes "
+                            f"(at least {MIN_MEMORY})")
+    parse.add_argument("--output-buffer", type=int, default=BUFFER_SIZE,
+                       help="write the output once this many characters are pending")
+    parse.add_argument("-u", "--unbuffered", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help="write the output of every puts as soon as it runs")
+    parse.add_argument("--stats", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help="report time per phase, peak memory up to execution and the program shape")
+    parse.add_argument("--stats-format", choices=("text", "json"), default="text",
+                       help="print --stats as text or as one JSON line per file")
+    parse.add_argument("--stats-memory", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help="with --stats, trace memory while executing too (slow)")
+    parse.add_argument("--profile", default=False,
+                       action=argparse.BooleanOptionalAction,
+                       help="report time per function, builtin and line (closure engine)")
+    parse.add_argument("--profile-stacks", default="pos-profile.collapsed",
+                       help="where --profile writes its collapsed stacks")
+    parse.add_argument("--serve", default=None, metavar="SOCKET",
+                       help="run scripts sent by client.py over this unix socket")
+    parse.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                       help="with --serve, run this many scripts at once")
+    return parse
+
+
+def make_options(args: argparse.Namespace, parse: argparse.ArgumentParser) -> dict:
+    options = {"engine": args.engine}
     if args.debug:
         options["debug"] = True
+    if args.optimize:
+        options["optimize"] = True
+    if args.cache or args.cache_dir is not None:
+        options["cache"] = True
+    if args.path:
+        options["path"] = args.path
+    if args.cache_dir is not None:
+        options["cache_dir"] = args.cache_dir
+    if args.jobs > 1:
+        options["jobs"] = args.jobs
+    if args.records:
+        if args.stream or args.debug or args.isolated or args.stats or args.profile:
+            parse.error("-n can not be used with --stream, --debug, --isolated, --stats "
+                        "or --profile")
+        if not args.filename:
+            parse.error("-n needs a script")
+        if args.jobs > 1 and len(args.filename) < 2:
+            parse.error("-n with --jobs needs the inputs as files, a pipe can not be split")
+        options["records"] = True
+        if args.field_separator is not None:
+            if not args.field_separator:
+                parse.error("the field separator can not be empty")
+            options["separator"] = args.field_separator
+    elif args.stream or args.mmap:
+        options["stream"] = True
+    if args.mmap:
+        options["mmap"] = True
+    if args.output_buffer < 0:
+        parse.error("--output-buffer can not be negative")
+    options["buffer_size"] = 0 if args.unbuffered else args.output_buffer
+    if args.max_memory is not None and args.max_memory < MIN_MEMORY:
+        parse.error(f"--max-memory must be at least {MIN_MEMORY}, shorter values are "
+                    "never measured")
+    for limit in ("max_steps", "timeout", "max_memory"):
+        if getattr(args, limit) is not None:
+            options[limit] = getattr(args, limit)
+    if args.stats:
+        if args.isolated or args.stream or args.mmap:
+            parse.error("--stats can not be used with --isolated or --stream")
+        options["stats"] = args.stats_format
+        if args.stats_memory:
+            options["stats_memory"] = True
+    elif args.stats_memory:
+        parse.error("--stats-memory needs --stats")
+    if args.profile:
+        if args.isolated:
+            parse.error("--profile can not be used with --isolated")
+        options["profile"] = args.profile_stacks
+    if make_budget(options) is not None and args.engine not in BUDGETED_ENGINES:
+        parse.error(f"limits are not supported by the {args.engine} engine")
+    return options
+
+
+def run_command(args: argparse.Namespace, options: dict) -> int:
+    if args.isolated:
+        return run_isolated(args.filename, options)
+    try:
+        run_file(args.filename, options)
+    except ResourceLimitExceeded as error:
+        print(f"pos: {error}", file=sys.stderr)
+        return 1
+    except SyntaxError as error:
+        # from this process or from a compiling worker, a pool would add its
+        # remote traceback
+        print(f"pos: SyntaxError: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_request(parse: argparse.ArgumentParser, argv: list[str]) -> int:
+    # one run for a client of --serve, as `pos argv` would do it; compiled
+    # programs stay in memory between runs, imported modules run again in
+    # the run's own loader so no state is left over from the run before
+    args = parse.parse_args(argv)
+    if args.serve is not None or not args.filename:
+        parse.error("a served run needs a script")
+    options = make_options(args, parse)
+    options["keep"] = True
+    return run_command(args, options)
+
+
+def main():
+    parse = make_arg_parser()
+    args = parse.parse_args()
+    if args.serve is not None:
+        if args.filename:
+            parse.error("--serve takes no scripts, send them with client.py")
+        if args.workers < 1:
+            parse.error("--workers must be at least 1")
+        serve(args.serve, partial(run_request, parse), args.workers)
+        return
+    options = make_options(args, parse)
     if not args.filename:
-        run_interpreter(options)
-        sys.exit(1)
-    run_file(args.filename, options)
+        with make_loader([], options):
+            run_interpreter(options)
+        return
+    sys.exit(run_command(args, options))
 
 
 if __name__ == "__main__":
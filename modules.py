@@ -0,0 +1,57 @@
+from contextvars import ContextVar
+from typing import Callable
+
+
+class Module:
+    # an imported file: the globals its top level left behind and calls into
+    # its functions, which run with those globals. Calls are made the first
+    # time a function is used, a module is mostly imported for a few of them
+    __slots__ = ["name", "path", "digest", "namespace", "calls", "make_call"]
+
+    def __init__(self, name: str, path: str, digest: str, namespace: dict,
+                 make_call: Callable[[str], Callable | None]):
+        self.name = name
+        self.path = path
+        self.digest = digest
+        self.namespace = namespace
+        self.calls: dict[str, Callable] = {}
+        self.make_call = make_call
+
+    def get(self, name: str):
+        try:
+            return self.namespace[name]
+        except KeyError:
+            raise KeyError(f"module {self.name} has no {name}") from None
+
+    def call(self, name: str, args: tuple):
+        call = self.calls.get(name, None)
+        if call is None:
+            call = self.make_call(name)
+            if call is None:
+                raise NameError(f"module {self.name} has no function {name}")
+            self.calls[name] = call
+        return call(args)
+
+    def __repr__(self) -> str:
+        return f"Module(name={self.name}, path={self.path})"
+
+
+CURRENT_LOADER: ContextVar = ContextVar("pos_loader", default=None)
+
+# the active interpreter.ModuleLoader or None
+current_loader = CURRENT_LOADER.get
+
+
+def import_module(path: str) -> Module:
+    # `import "lib.pos";` assigns what this returns to lib
+    loader = current_loader()
+    if loader is None:
+        raise RuntimeError("import needs a module loader, run the program with a ModuleLoader")
+    return loader.load(path)
+
+
+def call_member(module, name: str, *args):
+    # `lib.f(x)` on an imported lib is call(lib, "f", x)
+    if module.__class__ is not Module:
+        raise TypeError(f"{name} is called on {module!r}, which is not a module")
+    return module.call(name, args)
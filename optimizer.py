@@ -0,0 +1,384 @@
+from typing import Any, Callable, Iterator
+
+from closures import BINARY_OPS, UNARY_OPS
+from expressions import BinOp, BuiltinFunction, ListArguments, Number, Assignment, \
+    Variable, Expr, String, Boolean, UnaryOp, Function, FunctionCall, \
+    Return, Null, If, While, For, Range, Index, IndexAssignment, Block
+from statements import ExpressionStmt
+
+CONSTANTS = (Number, String, Boolean, Null)
+# hoisted values are kept in variables named with this prefix
+TEMP_PREFIX = "__opt_"
+# builtins that change their first argument
+MUTATING = frozenset(("push", "pop"))
+
+
+def children(node: Expr) -> Iterator[Expr]:
+    if isinstance(node, BinOp):
+        yield node.left
+        yield node.right
+    elif isinstance(node, UnaryOp):
+        yield node.expr
+    elif isinstance(node, (Assignment, Return)):
+        yield node.value
+    elif isinstance(node, ExpressionStmt):
+        yield node.expression
+    elif isinstance(node, ListArguments):
+        yield from node.args
+    elif isinstance(node, (FunctionCall, BuiltinFunction)):
+        yield from node.args
+    elif isinstance(node, If):
+        yield from node.conditions
+        for body in node.body:
+            yield from body
+        yield from node.else_body
+    elif isinstance(node, While):
+        yield node.condition
+        yield from node.body
+    elif isinstance(node, For):
+        yield node.iterable
+        yield from node.body
+    elif isinstance(node, Block):
+        yield from node.body
+    elif isinstance(node, Range):
+        yield node.start
+        yield node.stop
+    elif isinstance(node, Index):
+        yield node.target
+        yield node.index
+    elif isinstance(node, IndexAssignment):
+        yield node.target
+        yield node.index
+        yield node.value
+
+
+def walk(node: Expr) -> Iterator[Expr]:
+    # in order, with a stack of its own so a deep chain does not recurse
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(list(children(node))))
+
+
+def count_nodes(ast: list[Expr], functions: dict[str, Function]) -> int:
+    total = sum(1 for stmt in ast for _ in walk(stmt))
+    return total + sum(1 for function in functions.values()
+                       for stmt in function.body for _ in walk(stmt))
+
+
+def temp_names(ast: list[Expr]) -> list[str]:
+    # the hoisted values a program keeps in its globals, function bodies
+    # keep theirs in locals
+    return list({node.name: None for stmt in ast for node in walk(stmt)
+                 if isinstance(node, Assignment) and node.name.startswith(TEMP_PREFIX)})
+
+
+def drop_temps(context: dict, names: list[str]):
+    # hoisted values are only needed while their loop runs, they are not
+    # left behind in the globals a run hands back
+    for name in names:
+        context.pop(name, None)
+
+
+def make_constant(value) -> Expr:
+    if value is None:
+        return Null()
+    if isinstance(value, bool):
+        return Boolean(value)
+    if isinstance(value, str):
+        return String(value)
+    return Number(value)
+
+
+def is_pure(node: Expr) -> bool:
+    # no calls, so evaluating it twice or earlier has no visible effect
+    return not any(isinstance(child, (FunctionCall, BuiltinFunction, Assignment, For,
+                                      IndexAssignment))
+                   for child in walk(node))
+
+
+class OptimizerStats:
+    __slots__ = ["before", "after", "folded", "pruned", "loops", "hoisted"]
+
+    def __init__(self):
+        self.before = 0
+        self.after = 0
+        self.folded = 0
+        self.pruned = 0
+        self.loops = 0
+        self.hoisted = 0
+
+    def report(self) -> str:
+        return (f"optimizer: {self.before} -> {self.after} nodes "
+                f"({self.before - self.after} removed), {self.folded} folded, "
+                f"{self.pruned} branches pruned, {self.loops} loops dropped, "
+                f"{self.hoisted} expressions hoisted")
+
+
+class Optimizer:
+    # rewrites the ast between parsing and execution: folds constant
+    # arithmetic, comparisons and `not`, prunes If branches whose condition is
+    # known, drops while(false) loops and hoists invariant pure expressions
+    # out of while loops
+    __slots__ = ["binary", "unary", "stats", "temps", "in_function", "optimizers"]
+
+    def __init__(self, stats: OptimizerStats):
+        self.binary = dict(BINARY_OPS)
+        self.unary = dict(UNARY_OPS)
+        self.stats = stats
+        self.temps = 0
+        self.in_function = False
+        self.optimizers: dict[type, Callable[[Any], Expr]] = {
+            Number: self.optimize_nothing,
+            String: self.optimize_nothing,
+            Boolean: self.optimize_nothing,
+            Null: self.optimize_nothing,
+            Variable: self.optimize_nothing,
+            Function: self.optimize_function,
+            ListArguments: self.optimize_list_arguments,
+            FunctionCall: self.optimize_call,
+            BuiltinFunction: self.optimize_call,
+            Return: self.optimize_value,
+            Assignment: self.optimize_value,
+            If: self.optimize_if,
+            While: self.optimize_while,
+            For: self.optimize_for,
+            Range: self.optimize_range,
+            Index: self.optimize_index,
+            IndexAssignment: self.optimize_index_assignment,
+            Block: self.optimize_block_node,
+            UnaryOp: self.optimize_unary,
+            BinOp: self.optimize_binary,
+            ExpressionStmt: self.optimize_expression_stmt,
+        }
+
+    def optimize(self, node: Expr) -> Expr:
+        optimizer = self.optimizers.get(type(node), None)
+        if optimizer is None:
+            raise SyntaxError(f"can not optimize {node}")
+        return optimizer(node)
+
+    def optimize_block(self, body: list[Expr]) -> list[Expr]:
+        # statements can disappear or be replaced by several, only here
+        stmts = []
+        for stmt in body:
+            stmt = self.optimize(stmt)
+            if isinstance(stmt, If) and not stmt.conditions and self.can_inline(stmt.else_body):
+                stmts.extend(stmt.else_body)
+            elif isinstance(stmt, While):
+                if isinstance(stmt.condition, CONSTANTS) and not stmt.condition.value:
+                    self.stats.loops += 1
+                    continue
+                stmts.extend(self.hoist(stmt))
+            else:
+                stmts.append(stmt)
+        return stmts
+
+    def can_inline(self, body: list[Expr]) -> bool:
+        # at the top level a Return only stops its own If body, in a function
+        # it leaves the function wherever it is
+        return self.in_function or not any(isinstance(stmt, Return) for stmt in body)
+
+    def optimize_nothing(self, node: Expr):
+        return node
+
+    def optimize_function(self, node: Function):
+        in_function, self.in_function = self.in_function, True
+        node.body[:] = self.optimize_block(node.body)
+        self.in_function = in_function
+        return node
+
+    def optimize_list_arguments(self, node: ListArguments):
+        node.args = [self.optimize(arg) for arg in node.args]
+        return node
+
+    def optimize_call(self, node: FunctionCall | BuiltinFunction):
+        self.optimize_list_arguments(node.args)
+        return node
+
+    def optimize_value(self, node: Return | Assignment):
+        node.value = self.optimize(node.value)
+        return node
+
+    def optimize_if(self, node: If):
+        conditions, bodies = [], []
+        else_body = node.else_body
+        for index, (condition, body) in enumerate(zip(node.conditions, node.body)):
+            condition = self.optimize(condition)
+            if not isinstance(condition, CONSTANTS):
+                conditions.append(condition)
+                bodies.append(self.optimize_block(body))
+                continue
+            if not condition.value:
+                self.stats.pruned += 1
+                continue
+            # always taken: it becomes the else and nothing after it can run
+            self.stats.pruned += len(node.conditions) - index - 1 + bool(node.else_body)
+            else_body = body
+            break
+        node.conditions = conditions
+        node.body = bodies
+        node.else_body = self.optimize_block(else_body)
+        return node
+
+    def optimize_while(self, node: While):
+        node.condition = self.optimize(node.condition)
+        node.body = self.optimize_block(node.body)
+        return node
+
+    def optimize_for(self, node: For):
+        node.iterable = self.optimize(node.iterable)
+        node.body = self.optimize_block(node.body)
+        return node
+
+    def optimize_range(self, node: Range):
+        node.start = self.optimize(node.start)
+        node.stop = self.optimize(node.stop)
+        return node
+
+    def optimize_index(self, node: Index):
+        node.target = self.optimize(node.target)
+        node.index = self.optimize(node.index)
+        return node
+
+    def optimize_index_assignment(self, node: IndexAssignment):
+        self.optimize_index(node)
+        node.value = self.optimize(node.value)
+        return node
+
+    def optimize_block_node(self, node: Block):
+        node.body = self.optimize_block(node.body)
+        return node
+
+    def optimize_unary(self, node: UnaryOp):
+        node.expr = self.optimize(node.expr)
+        op = self.unary.get(node.op, None)
+        if op is None or not isinstance(node.expr, CONSTANTS):
+            return node
+        return self.fold(node, op, node.expr.value)
+
+    def optimize_binary(self, node: BinOp):
+        # a long chain like a + b + c nests on its left, it is walked in a
+        # loop and folded from its innermost node out
+        chain = []
+        while isinstance(node, BinOp):
+            chain.append(node)
+            node = node.left
+        left = self.optimize(node)
+        for node in reversed(chain):
+            node.left = left
+            node.right = self.optimize(node.right)
+            left = self.fold_binary(node)
+        return left
+
+    def fold_binary(self, node: BinOp):
+        op = self.binary.get(node.op, None)
+        if op is None or not isinstance(node.left, CONSTANTS) or \
+                not isinstance(node.right, CONSTANTS):
+            return node
+        return self.fold(node, op, node.left.value, node.right.value)
+
+    def fold(self, node: Expr, op: Callable, *values) -> Expr:
+        try:
+            value = op(*values)
+        except Exception:
+            # left in place so the error still happens when it runs
+            return node
+        self.stats.folded += 1
+        return make_constant(value)
+
+    def optimize_expression_stmt(self, node: ExpressionStmt):
+        node.expression = self.optimize(node.expression)
+        return node
+
+    def hoist(self, node: While) -> list[Expr]:
+        # a pure expression whose variables the loop never assigns has the
+        # same value on every iteration. It can still raise, so it only moves
+        # when nothing with an effect runs before it in the first iteration:
+        # a pure condition, then the top level statements of the body up to
+        # the first one with an effect. Those of the body go behind an if
+        # that repeats the condition, nothing is evaluated for a loop that
+        # does not run
+        if not is_pure(node.condition):
+            return [node]
+        assigned = {child.name for child in walk(node) if isinstance(child, (Assignment, For))}
+        # lists and maps change in place, through an index or a builtin
+        assigned.update(changed.name for changed in self.changed_in_place(node))
+        seen: dict[str, str] = {}
+        before: list[Expr] = []
+        node.condition = self.replace_invariant(node.condition, assigned, seen, before)
+        guarded: list[Expr] = []
+        for stmt in node.body:
+            if isinstance(stmt, (If, While, For, Function, Return)):
+                # what comes after it may not run on the first iteration
+                break
+            if all(is_pure(child) for child in children(stmt)):
+                self.replace_children(stmt, assigned, seen, guarded)
+            if not is_pure(stmt):
+                break
+        if not guarded:
+            return [*before, node]
+        return [*before, If([node.condition], [[*guarded, node]], [], node.line, node.column)]
+
+    def changed_in_place(self, node: While) -> Iterator[Variable]:
+        for child in walk(node):
+            if isinstance(child, IndexAssignment):
+                target = child.target
+            elif isinstance(child, BuiltinFunction) and child.value in MUTATING and child.args:
+                target = child.args.args[0]
+            else:
+                continue
+            if isinstance(target, Variable):
+                yield target
+
+    def is_invariant(self, node: Expr, assigned: set[str]) -> bool:
+        if isinstance(node, CONSTANTS):
+            return True
+        if isinstance(node, Variable):
+            return node.name not in assigned
+        if isinstance(node, (BinOp, UnaryOp)):
+            return all(self.is_invariant(child, assigned) for child in children(node))
+        return False
+
+    def replace_invariant(self, node: Expr, assigned: set[str], seen: dict[str, str],
+                          hoisted: list[Expr]) -> Expr:
+        if isinstance(node, (BinOp, UnaryOp)) and self.is_invariant(node, assigned):
+            key = repr(node)
+            if key not in seen:
+                seen[key] = f"{TEMP_PREFIX}{self.temps}"
+                self.temps += 1
+                self.stats.hoisted += 1
+                hoisted.append(Assignment(seen[key], "=", node))
+            return Variable(seen[key])
+        self.replace_children(node, assigned, seen, hoisted)
+        return node
+
+    def replace_children(self, node: Expr, assigned: set[str], seen: dict[str, str],
+                         hoisted: list[Expr]):
+        def replace(child):
+            return self.replace_invariant(child, assigned, seen, hoisted)
+
+        if isinstance(node, BinOp):
+            node.left = replace(node.left)
+            node.right = replace(node.right)
+        elif isinstance(node, UnaryOp):
+            node.expr = replace(node.expr)
+        elif isinstance(node, (Assignment, Return)):
+            node.value = replace(node.value)
+        elif isinstance(node, ExpressionStmt):
+            node.expression = replace(node.expression)
+        elif isinstance(node, ListArguments):
+            node.args = [replace(arg) for arg in node.args]
+        elif isinstance(node, (FunctionCall, BuiltinFunction)):
+            node.args.args = [replace(arg) for arg in node.args]
+
+
+def optimize_program(ast: list[Expr], functions: dict[str, Function],
+                     stats: OptimizerStats | None = None) -> list[Expr]:
+    if stats is None:
+        stats = OptimizerStats()
+    stats.before += count_nodes(ast, functions)
+    ast = Optimizer(stats).optimize_block(ast)
+    stats.after += count_nodes(ast, functions)
+    return ast
@@ -1,109 +1,130 @@
 from statements import ExpressionStmt
+import os
 import sys
-from tokenizer import Tokenizer, read_file, Token
+from tokenizer import Tokenizer, read_file, Token, TokenCursor, TokenStream
 from lookups import BindingPower
-from typing import Callable
-from builtins_po import builtin_func, make_builtin_func
+from types import MappingProxyType
+from typing import Callable, Iterable, Iterator, Mapping
+from builtins_po import builtin_func
 
 from expressions import BinOp, BuiltinFunction, ListArguments, Number, Assignment, \
     Variable, Expr, String, Boolean, UnaryOp, Function, BuiltinFunction, FunctionCall, \
-    Return, Null, If, While
+    Return, Null, If, While, For, Range, Index, IndexAssignment, Block
 
 
-bp_lu = {}
-nud_lu = {}
-led_lu = {}
-stmt_lu = {}
-
-global_context = {}
-global_functions = {}
-keywords = ["return", "func", "if", "elif", "else", "while"]
+keywords = ["return", "func", "if", "elif", "else", "while", "for", "BEGIN", "END", "import"]
 
 
 class Parser:
-    __slots__ = ["tokens", "pos"]
+    __slots__ = ["tokens", "functions", "modules"]
 
-    def __init__(self, tokens: list[Token]):
-        self.tokens: list[Token] = tokens
-        self.pos: int = 0
+    def __init__(self, tokens: TokenStream | Iterable[Token],
+                 functions: dict[str, Function] | None = None):
+        # tokens are pulled on demand, only the current one is looked at
+        if isinstance(tokens, TokenStream):
+            self.tokens = tokens.cursor()
+        else:
+            self.tokens = TokenCursor(tokens)
+        # the symbol table of this compilation, functions defined while
+        # parsing are added to it
+        self.functions: dict[str, Function] = {} if functions is None else functions
+        # the names imported modules are bound to, `lib.f(x)` calls into lib
+        self.modules: set[str] = set()
 
     def current_token(self):
-        return self.tokens[self.pos]
+        return self.tokens.token()
 
     def current_token_kind(self):
-        return self.current_token().kind
+        return self.tokens.kind()
+
+    def current_token_value(self):
+        return self.tokens.value()
 
     def has_more_tokens(self):
-        return (self.pos < len(self.tokens) and
-                self.current_token().kind != "EOF")
+        return self.tokens.kind() != "EOF"
 
     def advance(self, context):
-        self.pos += 1
+        self.tokens.advance()
 
     def parse_primary_expr(self, context):
-        token: Token = self.current_token()
+        kind = self.current_token_kind()
 
-        if token.kind == "NUMBER":
+        if kind == "NUMBER":
+            value = self.current_token_value()
             self.advance(context)
-            return Number(float(token.value))
-        elif token.kind == "IDENTIFIER":
+            return Number(float(value))
+        elif kind == "IDENTIFIER":
+            value = self.current_token_value()
             # palabra reservada
             # function made by me
             # functions that the user defines
             # check if the identifier is a function
-            if token.value in keywords:
-                return self.parse_keywords(token.value, context)
+            if value in keywords:
+                return self.parse_keywords(value, context)
 
-            elif builtin_func.get(token.value, None) is not None:
+            elif builtin_func.get(value, None) is not None:
                 # from pdb import set_trace; set_trace()
+                token = self.current_token()
                 self.advance(context)  # consume puts
                 args = self.parse_list_arguments(context)
-                return self.call_function(token.value, args, global_context)
-            elif global_functions.get(token.value, None) is not None:
-                # from pdb import set_trace; set_trace()
-                self.advance(context)
-                args = self.parse_list_arguments(context)
-                return self.call_function(token.value, args, global_context)
+                return self.call_function(value, args, context, token.line, token.column)
 
+            token = self.current_token()
             self.advance(context)
-            return Variable(token.value)
-        elif token.kind == "STRING":
+            # a name followed by arguments calls a user function, it may be
+            # defined in another file and is only looked up when linking
+            if self.current_token_kind() == "LPAREN":
+                args = self.parse_list_arguments(context)
+                return FunctionCall(value, args, token.line, token.column)
+            return Variable(value)
+        elif kind == "STRING":
+            value = self.current_token_value()
             self.advance(context)
-            return String(token.value[1:-1])
-        elif token.kind == "BOOLEAN":
+            return String(value[1:-1])
+        elif kind == "BOOLEAN":
+            value = self.current_token_value()
             self.advance(context)
-            return Boolean(token.value == "true")
-        elif token.kind == "NULL":
+            return Boolean(value == "true")
+        elif kind == "NULL":
             self.advance(context)
             return Null()
-        elif token.kind == "LPAREN":
+        elif kind == "LPAREN":
             self.advance(context)
             expr = self.parse_expr(BindingPower.DEFAULT.value, context)
             self.expect("RPAREN")
             return expr
         else:
-            raise SyntaxError(f"Unexpected token {token}")
+            raise SyntaxError(f"Unexpected token {self.current_token()}")
 
     def parse_keywords(self, name: str, context):
         if name == "func":
             self.advance(context)  # consume "func"
-            token = self.current_token()
-            global_functions[token.value] = Function(
-                token.value, ListArguments([]), [])
-            global_functions[token.value] = self.parse_function(context)
-            return global_functions[token.value]
+            name = self.current_token_value()
+            self.functions[name] = Function(
+                name, ListArguments([]), [])
+            self.functions[name] = self.parse_function(context)
+            return self.functions[name]
         elif name == "return":
+            token = self.current_token()
             self.advance(context)  # consume "return"
             try:
-                return Return(self.parse_expr(BindingPower.DEFAULT.value, context))
+                return Return(self.parse_expr(BindingPower.DEFAULT.value, context),
+                              token.line, token.column)
             except SyntaxError as e:
-                return Return(Null())
+                return Return(Null(), token.line, token.column)
         elif name == "if":
             return self.parse_if(context)
         elif name == "while":
             return self.parse_while(context)
+        elif name == "for":
+            return self.parse_for(context)
+        elif name in ("BEGIN", "END"):
+            return self.parse_block(name, context)
+        elif name == "import":
+            return self.parse_import(context)
 
     def parse_if(self, context):
+        token = self.current_token()
         self.advance(context)  # consume "if"
         self.expect("LPAREN")
         conditions = [self.parse_expr(BindingPower.DEFAULT.value, context)]
@@ -111,13 +132,13 @@ class Parser:
         stmts: list[list[Expr]] = [[]]
         else_body = []
         index = 0
-        while self.has_more_tokens() and self.current_token().value != "end":
-            if self.current_token().value == "else":
+        while self.has_more_tokens() and self.current_token_value() != "end":
+            if self.current_token_value() == "else":
                 self.advance(context)  # consume "else"
-                while self.has_more_tokens() and self.current_token().value != "end":
+                while self.has_more_tokens() and self.current_token_value() != "end":
                     else_body.append(self.parse_stmt(context))
                 break
-            if self.current_token().value == "elif":
+            if self.current_token_value() == "elif":
                 self.advance(context)
                 self.expect("LPAREN")
                 conditions.append(
@@ -127,55 +148,181 @@ class Parser:
                 index += 1
             stmts[index].append(self.parse_stmt(context))
         self.advance(context)  # consume "end"
-        return If(conditions, stmts, else_body)
+        return If(conditions, stmts, else_body, token.line, token.column)
 
     def parse_while(self, context):
+        token = self.current_token()
         self.advance(context)  # consume while
         self.expect("LPAREN")
         condition = self.parse_expr(BindingPower.DEFAULT.value, context)
         self.expect("RPAREN")
         body = []
-        while self.has_more_tokens() and self.current_token().value != "end":
+        while self.has_more_tokens() and self.current_token_value() != "end":
             body.append(self.parse_stmt(context))
         self.advance(context)  # consume "end"
-        return While(condition, body)
+        return While(condition, body, token.line, token.column)
+
+    def parse_for(self, context):
+        token = self.current_token()
+        self.advance(context)  # consume for
+        self.expect("LPAREN")
+        if self.current_token_kind() != "IDENTIFIER" or self.current_token_value() in keywords:
+            raise SyntaxError(f"got {self.current_token()} expected the loop variable")
+        name = self.current_token_value()
+        self.advance(context)
+        if self.current_token_value() != "in":
+            raise SyntaxError(f"got {self.current_token()} expected in")
+        self.advance(context)  # consume in
+        iterable = self.parse_expr(BindingPower.DEFAULT.value, context)
+        self.expect("RPAREN")
+        body = []
+        while self.has_more_tokens() and self.current_token_value() != "end":
+            body.append(self.parse_stmt(context))
+        self.advance(context)  # consume "end"
+        return For(name, iterable, body, token.line, token.column)
+
+    def parse_array_literal(self, context):
+        # `@[1, 2, 3]` is sugar for the array builtin
+        token = self.current_token()
+        self.advance(context)  # consume @[
+        items = self.parse_items("RBRACKET", context)
+        return self.call_function("array", ListArguments(items), context,
+                                  token.line, token.column)
+
+    def parse_items(self, close: str, context) -> list[Expr]:
+        # comma separated expressions up to close, a trailing comma is fine
+        items = []
+        while self.current_token_kind() != close:
+            items.append(self.parse_expr(BindingPower.DEFAULT.value, context))
+            if self.current_token_kind() != "COMMA":
+                break
+            self.advance(context)
+        self.expect(close)
+        return items
+
+    def parse_list_literal(self, context):
+        # `[1, 2, 3]` is sugar for the list builtin
+        token = self.current_token()
+        self.advance(context)  # consume [
+        items = self.parse_items("RBRACKET", context)
+        return self.call_function("list", ListArguments(items), context,
+                                  token.line, token.column)
+
+    def parse_map_literal(self, context):
+        # `{"a": 1, b: 2}` is sugar for map("a", 1, "b", 2), a bare name
+        # as key is that name as a string
+        token = self.current_token()
+        self.advance(context)  # consume {
+        items = []
+        while self.current_token_kind() != "RBRACE":
+            if self.current_token_kind() == "IDENTIFIER" and \
+                    self.current_token_value() not in keywords:
+                items.append(String(self.current_token_value()))
+                self.advance(context)
+            else:
+                items.append(self.parse_expr(BindingPower.DEFAULT.value, context))
+            self.expect("COLON")
+            items.append(self.parse_expr(BindingPower.DEFAULT.value, context))
+            if self.current_token_kind() != "COMMA":
+                break
+            self.advance(context)
+        self.expect("RBRACE")
+        return self.call_function("map", ListArguments(items), context,
+                                  token.line, token.column)
+
+    def parse_index(self, left: Expr, bp: int, context):
+        self.advance(context)  # consume [
+        index = self.parse_expr(BindingPower.DEFAULT.value, context)
+        self.expect("RBRACKET")
+        return Index(left, index)
+
+    def parse_member(self, left: Expr, bp: int, context):
+        self.advance(context)  # consume .
+        token = self.current_token()
+        if token.kind != "IDENTIFIER":
+            raise SyntaxError(f"got {token} expected a member name")
+        self.advance(context)
+        if self.current_token_kind() != "LPAREN":
+            return Index(left, String(token.value))
+        # `xs.push(1)` calls push(xs, 1), a builtin or a user function
+        if isinstance(left, Variable) and left.name in self.modules:
+            args = ListArguments([left, String(token.value), *self.parse_list_arguments(context)])
+            return self.call_function("call", args, context, token.line, token.column)
+        args = ListArguments([left, *self.parse_list_arguments(context)])
+        if token.value in builtin_func:
+            return self.call_function(token.value, args, context, token.line, token.column)
+        return FunctionCall(token.value, args, token.line, token.column)
+
+    def parse_import(self, context):
+        # `import "lib.pos";` or `import "lib.pos" as name;` binds the module to
+        # a global, by default named after the file
+        token = self.current_token()
+        self.advance(context)  # consume import
+        if self.current_token_kind() != "STRING":
+            raise SyntaxError(f"got {self.current_token()} expected the module file in quotes")
+        path = self.current_token_value()[1:-1]
+        self.advance(context)
+        if self.current_token_value() == "as":
+            self.advance(context)  # consume as
+            if self.current_token_kind() != "IDENTIFIER":
+                raise SyntaxError(f"got {self.current_token()} expected a module name")
+            name = self.current_token_value()
+            self.advance(context)
+        else:
+            name = os.path.splitext(os.path.basename(path))[0]
+            if not name.isidentifier() or name in keywords:
+                raise SyntaxError(f"module {path} needs a name, import it with `as`")
+        self.modules.add(name)
+        call = self.call_function("import", ListArguments([String(path)]), context,
+                                  token.line, token.column)
+        return Assignment(name, "=", call, token.line, token.column)
+
+    def parse_block(self, name: str, context):
+        token = self.current_token()
+        self.advance(context)  # consume BEGIN or END
+        body = []
+        while self.has_more_tokens() and self.current_token_value() != "end":
+            body.append(self.parse_stmt(context))
+        self.advance(context)  # consume "end"
+        return Block(name, body, token.line, token.column)
+
+    def parse_range_literal(self, context):
+        # `1..10` is a single token; the stop still binds tighter operators,
+        # so `1..10 * 2` is the same range as `1..n * 2` with n = 10
+        start, stop = self.current_token_value().split("..")
+        self.advance(context)
+        stop_expr = self.parse_infix(Number(float(stop)), bp_lu["RANGE"], context)
+        return Range(Number(float(start)), stop_expr)
+
+    def parse_range(self, left: Expr, bp: int, context):
+        self.advance(context)  # consume ..
+        return Range(left, self.parse_expr(bp_lu["RANGE"], context))
 
     def parse_function(self, context):
-        token = self.current_token()  # func.name
-        name = token.value
+        name = self.current_token_value()  # func.name
         self.advance(context)  # consume name
         args = self.parse_list_arguments(context)  # consume args(a,b,c)
-        global_functions[name].args = args
+        self.functions[name].args = args
         stmts = []
-        while self.has_more_tokens() and self.current_token().value != "end":
+        while self.has_more_tokens() and self.current_token_value() != "end":
             stmt = self.parse_stmt(context)
-            global_functions[name].body.append(stmt)
+            self.functions[name].body.append(stmt)
             stmts.append(stmt)
 
         self.advance(context)
         function = Function(name, args, stmts)
-        global_functions[name] = function
+        self.functions[name] = function
         return function
 
-    def call_function(self, name, args, context):
+    def call_function(self, name, args, context, line=0, column=0):
         if name in builtin_func:
             function = BuiltinFunction(
-                name, builtin_func[name].function, len(args))
+                name, builtin_func[name].function, len(args), line, column)
             function.args = args
             return function
-        elif name in global_functions:
-            # from pdb import set_trace; set_trace()
-            function = global_functions[name]
-            local_context = {}
-            if len(args) != len(function.args):
-                raise SyntaxError(
-                    f"Function {name} expected {len(function.args)} args, got {len(args)}")
-            for var_name, value in zip(function.local_context.keys(), args):
-                local_context[var_name] = value
-
-            return FunctionCall(name, args, function.body, {**local_context, **global_functions})
-        else:
-            raise NameError(f"Function {name} not found")
+        # bound to its Function and arity checked by the resolver, the
+        # function may still be incomplete while its own body is parsed
+        return FunctionCall(name, args)
 
     def parse_list_arguments(self, context):
         self.expect("LPAREN")
@@ -188,15 +335,16 @@ class Parser:
         return ListArguments(args)
 
     def parse_binary_expr(self, left: Expr, bp: int, context):
-        op_token = self.current_token()
+        op_kind = self.current_token_kind()
+        op = self.current_token_value()
         self.advance(context)
-        right = self.parse_expr(bp_lu[op_token.kind], context)
-        return BinOp(left, op_token.value, right)
+        right = self.parse_expr(bp_lu[op_kind], context)
+        return BinOp(left, op, right)
 
     def parse_stmt(self, context):
         stmt_fn = stmt_lu.get(self.current_token_kind(), None)
         if stmt_fn is not None:
-            return stmt_fn()
+            return stmt_fn(self, context)
         # if no statement handler is found, parse an expression
         expression = self.parse_expr(BindingPower.DEFAULT.value, context)
         # expect semicolon at the end of the statement
@@ -209,116 +357,145 @@ class Parser:
         nud_fn = nud_lu.get(token_kind, None)
         if nud_fn is None:
             raise SyntaxError(f"Unexpected token {self.current_token()}")
-        left = nud_fn(context)
+        left = nud_fn(self, context)
+        return self.parse_infix(left, bp, context)
+
+    def parse_infix(self, left: Expr, bp: int, context: dict):
         while self.has_more_tokens() and self.current_token_kind() in bp_lu and bp < bp_lu[self.current_token_kind()]:
             token_kind = self.current_token_kind()
             led_fn = led_lu.get(token_kind, None)
             if led_fn is None:
                 raise SyntaxError(f"expected led handler token {
                                   self.current_token()}")
-            left = led_fn(left, bp, context)
+            left = led_fn(self, left, bp, context)
         return left
 
     def parse_unary_expr(self, context):
-        token = self.current_token()
+        op = self.current_token_value()
         self.advance(context)  # consume "-" or "not"
         right = self.parse_expr(BindingPower.UNARY.value, context)
-        return UnaryOp(token.value, right)
-
-    def nud(self, kind: str, bp: int, nud_fn: Callable):
-        bp_lu[kind] = bp
-        nud_lu[kind] = nud_fn
-
-    def led(self, kind: str, bp: int, led_fn: Callable):
-        bp_lu[kind] = bp
-        led_lu[kind] = led_fn
-
-    def stmt(self, kind: str, stmt_fn: Callable):
-        bp_lu[kind] = BindingPower.DEFAULT.value
-        stmt_lu[kind] = stmt_fn
+        return UnaryOp(op, right)
 
     def assignment_led(self, left: Expr, bp: int, context):
-        if not isinstance(left, Variable):
+        if not isinstance(left, (Variable, Index)):
             raise SyntaxError(f"Expected variable")
         # from pdb import set_trace; set_trace()
-        token = self.current_token()  # assignment
+        token = self.current_token()
+        op = token.value  # assignment
         self.advance(context)
         right = self.parse_expr(bp, context)
-        return Assignment(left.name, token.value, right)
-
-    def create_tokens_lookup(self):
-        # logical operators
-        self.led("AND", BindingPower.LOGICAL.value, self.parse_binary_expr)
-        self.led("OR", BindingPower.LOGICAL.value, self.parse_binary_expr)
-        self.nud("NOT", BindingPower.UNARY.value, self.parse_unary_expr)
-
-        # relational operators
-        self.led("EQUAL", BindingPower.RELATIONAL.value,
-                 self.parse_binary_expr)
-        self.led("NOT_EQUAL", BindingPower.RELATIONAL.value,
-                 self.parse_binary_expr)
-        self.led("LESS_EQUAL", BindingPower.RELATIONAL.value,
-                 self.parse_binary_expr)
-        self.led("GREATER_EQUAL", BindingPower.RELATIONAL.value,
-                 self.parse_binary_expr)
-        self.led("LESS", BindingPower.RELATIONAL.value, self.parse_binary_expr)
-        self.led("GREATER", BindingPower.RELATIONAL.value,
-                 self.parse_binary_expr)
-
-        # addition and multiplication and exponential
-        self.led("DOUBLE_STAR", BindingPower.EXPONENTIAL.value,
-                 self.parse_binary_expr)
-        self.led("PLUS", BindingPower.ADDITIVE.value, self.parse_binary_expr)
-        self.led("DASH", BindingPower.ADDITIVE.value, self.parse_binary_expr)
-
-        self.led("STAR", BindingPower.MULTIPLICATIVE.value,
-                 self.parse_binary_expr)
-        self.led("SLASH", BindingPower.MULTIPLICATIVE.value,
-                 self.parse_binary_expr)
-
-        self.nud("DASH", BindingPower.UNARY.value, self.parse_unary_expr)
-        # primary expressions
-        self.nud("NUMBER", BindingPower.PRIMARY.value, self.parse_primary_expr)
-        self.nud("STRING", BindingPower.PRIMARY.value, self.parse_primary_expr)
-        self.nud("IDENTIFIER", BindingPower.PRIMARY.value,
-                 self.parse_primary_expr)
-        self.nud("BOOLEAN", BindingPower.PRIMARY.value,
-                 self.parse_primary_expr)
-        # delimiters
-        self.nud("LPAREN", BindingPower.DEFAULT.value, self.parse_primary_expr)
-        self.nud("RPAREN", BindingPower.DEFAULT.value, self.advance)
-        self.nud("NULL", BindingPower.DEFAULT.value, self.parse_primary_expr)
-
-        self.led("ASSIGN", BindingPower.ASSIGNMENT.value, self.assignment_led)
-        self.led("PLUS_ASSIGN", BindingPower.ASSIGNMENT.value,
-                 self.assignment_led)
-        self.led("DASH_ASSIGN", BindingPower.ASSIGNMENT.value,
-                 self.assignment_led)
-        self.led("STAR_ASSIGN", BindingPower.ASSIGNMENT.value,
-                 self.assignment_led)
-        self.led("SLASH_ASSIGN", BindingPower.ASSIGNMENT.value,
-                 self.assignment_led)
+        if isinstance(left, Index):
+            return IndexAssignment(left.target, left.index, op, right, token.line, token.column)
+        return Assignment(left.name, op, right, token.line, token.column)
 
     def expect_error(self, expected_kind: str, error: None | str):
-        token: Token = self.current_token()
-        if token.kind != expected_kind:
+        if self.current_token_kind() != expected_kind:
             if error is None:
-                error = f"got {token} expected {expected_kind}"
+                error = f"got {self.current_token()} expected {expected_kind}"
             raise SyntaxError(error)
 
-        self.advance(global_context)
+        self.advance(None)
 
     def expect(self, expected_kind: str):
         self.expect_error(expected_kind, None)
 
-    def parse(self, context: dict):
-        self.create_tokens_lookup()
-        body: list[ExpressionStmt] = []
+    def statements(self, context: dict) -> Iterator[Expr]:
         while self.has_more_tokens():
-            body.append(self.parse_stmt(context))
+            yield self.parse_stmt(context)
+
+    def parse(self, context: dict):
+        body: list[ExpressionStmt] = list(self.statements(context))
         return body
 
 
+def create_tokens_lookup() -> tuple[Mapping[str, int], Mapping[str, Callable],
+                                     Mapping[str, Callable], Mapping[str, Callable]]:
+    # built once at import and read only afterwards, so any number of parsers
+    # can share them; the handlers are unbound and get the parser first
+    bp_lu: dict[str, int] = {}
+    nud_lu: dict[str, Callable] = {}
+    led_lu: dict[str, Callable] = {}
+    stmt_lu: dict[str, Callable] = {}
+
+    def nud(kind: str, bp: int, nud_fn: Callable):
+        bp_lu[kind] = bp
+        nud_lu[kind] = nud_fn
+
+    def led(kind: str, bp: int, led_fn: Callable):
+        bp_lu[kind] = bp
+        led_lu[kind] = led_fn
+
+    def stmt(kind: str, stmt_fn: Callable):
+        bp_lu[kind] = BindingPower.DEFAULT.value
+        stmt_lu[kind] = stmt_fn
+
+    # logical operators
+    led("AND", BindingPower.LOGICAL.value, Parser.parse_binary_expr)
+    led("OR", BindingPower.LOGICAL.value, Parser.parse_binary_expr)
+    nud("NOT", BindingPower.UNARY.value, Parser.parse_unary_expr)
+
+    # relational operators
+    led("EQUAL", BindingPower.RELATIONAL.value,
+        Parser.parse_binary_expr)
+    led("NOT_EQUAL", BindingPower.RELATIONAL.value,
+        Parser.parse_binary_expr)
+    led("LESS_EQUAL", BindingPower.RELATIONAL.value,
+        Parser.parse_binary_expr)
+    led("GREATER_EQUAL", BindingPower.RELATIONAL.value,
+        Parser.parse_binary_expr)
+    led("LESS", BindingPower.RELATIONAL.value, Parser.parse_binary_expr)
+    led("GREATER", BindingPower.RELATIONAL.value,
+        Parser.parse_binary_expr)
+    led("RANGE", BindingPower.RELATIONAL.value, Parser.parse_range)
+
+    # addition and multiplication and exponential
+    led("DOUBLE_STAR", BindingPower.EXPONENTIAL.value,
+        Parser.parse_binary_expr)
+    led("PLUS", BindingPower.ADDITIVE.value, Parser.parse_binary_expr)
+    led("DASH", BindingPower.ADDITIVE.value, Parser.parse_binary_expr)
+
+    led("STAR", BindingPower.MULTIPLICATIVE.value,
+        Parser.parse_binary_expr)
+    led("SLASH", BindingPower.MULTIPLICATIVE.value,
+        Parser.parse_binary_expr)
+
+    nud("DASH", BindingPower.UNARY.value, Parser.parse_unary_expr)
+    # primary expressions
+    nud("NUMBER", BindingPower.PRIMARY.value, Parser.parse_primary_expr)
+    nud("DOUBLE_DOT", BindingPower.PRIMARY.value, Parser.parse_range_literal)
+    nud("ARRAY_OPEN", BindingPower.PRIMARY.value, Parser.parse_array_literal)
+    nud("LBRACE", BindingPower.PRIMARY.value, Parser.parse_map_literal)
+    # registered before the led, `[` binds as an index once after a value
+    nud("LBRACKET", BindingPower.PRIMARY.value, Parser.parse_list_literal)
+    led("LBRACKET", BindingPower.CALL.value, Parser.parse_index)
+    led("DOT", BindingPower.MEMBER.value, Parser.parse_member)
+    nud("STRING", BindingPower.PRIMARY.value, Parser.parse_primary_expr)
+    nud("IDENTIFIER", BindingPower.PRIMARY.value,
+        Parser.parse_primary_expr)
+    nud("BOOLEAN", BindingPower.PRIMARY.value,
+        Parser.parse_primary_expr)
+    # delimiters
+    nud("LPAREN", BindingPower.DEFAULT.value, Parser.parse_primary_expr)
+    nud("RPAREN", BindingPower.DEFAULT.value, Parser.advance)
+    nud("NULL", BindingPower.DEFAULT.value, Parser.parse_primary_expr)
+
+    led("ASSIGN", BindingPower.ASSIGNMENT.value, Parser.assignment_led)
+    led("PLUS_ASSIGN", BindingPower.ASSIGNMENT.value,
+        Parser.assignment_led)
+    led("DASH_ASSIGN", BindingPower.ASSIGNMENT.value,
+        Parser.assignment_led)
+    led("STAR_ASSIGN", BindingPower.ASSIGNMENT.value,
+        Parser.assignment_led)
+    led("SLASH_ASSIGN", BindingPower.ASSIGNMENT.value,
+        Parser.assignment_led)
+
+    return (MappingProxyType(bp_lu), MappingProxyType(nud_lu),
+            MappingProxyType(led_lu), MappingProxyType(stmt_lu))
+
+
+bp_lu, nud_lu, led_lu, stmt_lu = create_tokens_lookup()
+
+
 if __name__ == "__main__":
     args = sys.argv
     if len(args) < 2:
@@ -0,0 +1,206 @@
+import linecache
+import time
+from contextvars import ContextVar
+
+from closures import ClosureCompiler, Compiled
+from expressions import BuiltinFunction, Expr, Function, FunctionCall
+
+# the bottom frame of every collapsed stack
+MAIN = "<main>"
+
+
+class Timing:
+    # times are in nanoseconds; active counts the frames of this entry on the
+    # stack, a recursive call only adds to inclusive once, at the outermost
+    __slots__ = ["calls", "inclusive", "exclusive", "active"]
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0
+        self.exclusive = 0
+        self.active = 0
+
+
+class Profiler:
+    # collects call counts and inclusive/exclusive times per user function,
+    # per builtin and per source line; programs only report to it when they
+    # were compiled by a ProfilingCompiler, so nothing is paid without one
+    __slots__ = ["functions", "builtins", "lines", "stacks", "names", "frames",
+                 "line_frames", "token"]
+
+    def __init__(self):
+        self.functions: dict[str, Timing] = {}
+        self.builtins: dict[str, Timing] = {}
+        self.lines: dict[tuple[str, int], Timing] = {}
+        # collapsed stack of function names -> exclusive time
+        self.stacks: dict[str, int] = {}
+        self.names: list[str] = []
+        self.frames: list[list] = []
+        self.line_frames: list[list] = []
+        self.token = None
+
+    def __enter__(self) -> "Profiler":
+        self.enter(self.functions, MAIN)
+        self.token = CURRENT_PROFILER.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        CURRENT_PROFILER.reset(self.token)
+        self.token = None
+        # closes <main>, and the lines of the statement that raised if any
+        while self.frames:
+            self.leave()
+        while self.line_frames:
+            self.leave_line()
+
+    def enter(self, table: dict[str, Timing], name: str):
+        timing = table.get(name, None)
+        if timing is None:
+            timing = table[name] = Timing()
+        timing.active += 1
+        self.names.append(name)
+        self.frames.append([timing, time.perf_counter_ns(), 0])
+
+    def leave(self):
+        timing, start, children = self.frames.pop()
+        elapsed = time.perf_counter_ns() - start
+        timing.calls += 1
+        timing.active -= 1
+        if not timing.active:
+            timing.inclusive += elapsed
+        timing.exclusive += elapsed - children
+        if self.frames:
+            self.frames[-1][2] += elapsed
+        stack = ";".join(self.names)
+        self.stacks[stack] = self.stacks.get(stack, 0) + elapsed - children
+        self.names.pop()
+
+    def enter_line(self, key: tuple[str, int]) -> bool:
+        # a call or assignment on the line of the statement holding it is
+        # part of that statement, it does not open a frame of its own; the
+        # same line in a recursive call does
+        depth = len(self.frames)
+        if self.line_frames and self.line_frames[-1][3] == key \
+                and self.line_frames[-1][4] == depth:
+            return False
+        timing = self.lines.get(key, None)
+        if timing is None:
+            timing = self.lines[key] = Timing()
+        timing.active += 1
+        self.line_frames.append([timing, time.perf_counter_ns(), 0, key, depth])
+        return True
+
+    def leave_line(self):
+        timing, start, children, _, _ = self.line_frames.pop()
+        elapsed = time.perf_counter_ns() - start
+        timing.calls += 1
+        timing.active -= 1
+        if not timing.active:
+            timing.inclusive += elapsed
+        timing.exclusive += elapsed - children
+        if self.line_frames:
+            self.line_frames[-1][2] += elapsed
+
+    def report(self, limit: int = 20) -> str:
+        lines = []
+        for title, table in (("functions", self.functions), ("builtins", self.builtins)):
+            lines.append(f"{title}:")
+            lines.append(f"{'calls':>10} {'inclusive':>12} {'exclusive':>12}  name")
+            for name, timing in sorted(table.items(), key=lambda item: -item[1].exclusive)[:limit]:
+                lines.append(f"{timing.calls:>10} {format_time(timing.inclusive):>12} "
+                             f"{format_time(timing.exclusive):>12}  {name}")
+        lines.append("lines:")
+        lines.append(f"{'hits':>10} {'inclusive':>12} {'exclusive':>12}  line")
+        for (file_name, line), timing in sorted(self.lines.items(),
+                                                key=lambda item: -item[1].exclusive)[:limit]:
+            source = linecache.getline(file_name, line).strip()
+            lines.append(f"{timing.calls:>10} {format_time(timing.inclusive):>12} "
+                         f"{format_time(timing.exclusive):>12}  {file_name}:{line}  {source}")
+        return "\n".join(lines)
+
+    def collapsed(self) -> str:
+        # the format flamegraph.pl and speedscope read: frames joined by ";"
+        # and the weight, microseconds here
+        return "".join(f"{stack} {elapsed // 1000}\n"
+                       for stack, elapsed in sorted(self.stacks.items()) if elapsed >= 1000)
+
+
+def format_time(nanoseconds: int) -> str:
+    return f"{nanoseconds / 1e6:.3f}ms"
+
+
+CURRENT_PROFILER: ContextVar[Profiler | None] = ContextVar("pos_profiler", default=None)
+
+# the active profiler or None
+current_profiler = CURRENT_PROFILER.get
+
+
+class ProfilingCompiler(ClosureCompiler):
+    # the closure compiler with every located statement, every user function
+    # body and every builtin call wrapped to report to a profiler
+    __slots__ = ["profiler", "file_name"]
+
+    def __init__(self, functions: dict[str, Function], profiler: Profiler, file_name: str):
+        super().__init__(functions)
+        self.profiler = profiler
+        self.file_name = file_name
+
+    def compile(self, node: Expr) -> Compiled:
+        compiled = super().compile(node)
+        line = getattr(node, "line", 0)
+        if not line:
+            return compiled
+        key = (self.file_name, line)
+        profiler = self.profiler
+
+        def profiled_line(context):
+            if not profiler.enter_line(key):
+                return compiled(context)
+            try:
+                return compiled(context)
+            finally:
+                profiler.leave_line()
+        return profiled_line
+
+    def compile_function_call(self, node: FunctionCall) -> Compiled:
+        name = node.name
+        compile_body = name not in self.bodies
+        call = super().compile_function_call(node)
+        if compile_body:
+            # the body is wrapped, not the call, so evaluating the arguments
+            # is counted in the caller
+            body = self.bodies[name]
+            profiler = self.profiler
+            functions = profiler.functions
+
+            def profiled_body(frame):
+                profiler.enter(functions, name)
+                try:
+                    return body(frame)
+                finally:
+                    profiler.leave()
+            self.bodies[name] = profiled_body
+        return call
+
+    def compile_builtin(self, node: BuiltinFunction) -> Compiled:
+        if node.args_count is not None and len(node.args) != node.args_count:
+            return super().compile_builtin(node)
+        name = node.value
+        function = node.function
+        args = tuple(self.compile(arg) for arg in node.args)
+        profiler = self.profiler
+        builtins = profiler.builtins
+
+        def profiled_builtin(context):
+            values = [arg(context) for arg in args]
+            profiler.enter(builtins, name)
+            try:
+                return function(*values)
+            finally:
+                profiler.leave()
+        return profiled_builtin
+
+
+def compile_program(ast: list[Expr], functions: dict[str, Function], profiler: Profiler,
+                    file_name: str = "<input>") -> list[Compiled]:
+    return ProfilingCompiler(functions, profiler, file_name).compile_program(ast)
@@ -0,0 +1,146 @@
+import mmap
+import os
+import stat
+from typing import BinaryIO, Iterator
+
+from collections_po import List
+from expressions import Block, Expr, Function, Variable
+from interpreter import ENGINES, compile_ast
+from io_po import CHUNK_SIZE
+from limits import current_budget
+from optimizer import walk
+
+# the globals every record is bound to before the script runs on it
+FIELD_NAMES = ("fields", "nf")
+
+
+def reads_any(ast: list[Expr], functions: dict[str, Function], names: tuple[str, ...]) -> bool:
+    # whether the statements or any function read one of the globals
+    return any(isinstance(node, Variable) and node.name in names
+               for stmt in ast + [stmt for function in functions.values()
+                                  for stmt in function.body]
+               for node in walk(stmt))
+
+
+def check_splittable(ast: list[Expr], functions: dict[str, Function]):
+    # every byte range of -j runs on its own process with its own globals:
+    # BEGIN and END would run once per range, on its totals only, and nr
+    # would start over in every range, so those scripts only run whole
+    if any(isinstance(stmt, Block) for stmt in ast):
+        raise SyntaxError("BEGIN and END blocks can not be split in ranges, run without -j")
+    if reads_any(ast, functions, ("nr",)):
+        raise SyntaxError("nr can not be counted across ranges, run without -j")
+
+
+class RecordProgram:
+    # a record script (-n) compiled once for one engine: its BEGIN blocks,
+    # the statements run for every record and its END blocks. Each record
+    # binds `line`, its number `nr` and, when the script reads them, the
+    # split `fields` and their count `nf`
+    __slots__ = ["engine", "begin", "body", "end", "split_fields"]
+
+    def __init__(self, ast: list[Expr], functions: dict[str, Function], engine: str = "tree"):
+        begin, body, end = [], [], []
+        for stmt in ast:
+            if isinstance(stmt, Block):
+                (begin if stmt.name == "BEGIN" else end).extend(stmt.body)
+            else:
+                body.append(stmt)
+        # splitting costs more than a short script, it is only done when needed
+        self.split_fields = reads_any(body + end, functions, FIELD_NAMES)
+        self.engine = engine
+        self.begin = compile_ast(begin, functions, engine)
+        self.body = compile_ast(body, functions, engine)
+        self.end = compile_ast(end, functions, engine)
+
+    def run(self, records: Iterator[str], context: dict, separator: str | None = None):
+        # a separator of None splits on runs of whitespace, as awk does
+        run = ENGINES[self.engine][1]
+        body = self.body
+        split_fields = self.split_fields
+        budget = current_budget()
+        run(self.begin, context)
+        number = 0
+        for line in records:
+            number += 1
+            # every record counts as one loop iteration against --max-steps
+            if budget is not None:
+                budget.step()
+            context["line"] = line
+            context["nr"] = float(number)
+            if split_fields:
+                fields = line.split(separator)
+                context["fields"] = List(fields)
+                context["nf"] = float(len(fields))
+            run(body, context)
+        run(self.end, context)
+
+
+def is_regular_file(file: BinaryIO) -> bool:
+    # pipes and terminals can neither be mapped nor split in ranges
+    try:
+        return stat.S_ISREG(os.fstat(file.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def read_chunks(file: BinaryIO, start: int = 0, end: int | None = None,
+                use_mmap: bool = False, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    # the bytes from start to end, or to the end of the file, a chunk at a
+    # time; mmap is only used on regular files, the rest is read
+    if use_mmap and is_regular_file(file):
+        size = os.fstat(file.fileno()).st_size
+        stop = size if end is None else min(end, size)
+        if start >= stop:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(start, stop, chunk_size):
+                yield mapped[offset:min(offset + chunk_size, stop)]
+        return
+    if start:
+        file.seek(start)
+    remaining = None if end is None else end - start
+    while remaining is None or remaining > 0:
+        chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+        if not chunk:
+            return
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+
+def read_records(file: BinaryIO, start: int = 0, end: int | None = None,
+                 use_mmap: bool = False, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    # lines are cut in bytes and decoded a chunk at a time, a newline byte
+    # is never part of a multibyte utf-8 character
+    rest = b""
+    for chunk in read_chunks(file, start, end, use_mmap, chunk_size):
+        data = rest + chunk if rest else chunk
+        cut = data.rfind(b"\n") + 1
+        rest = data[cut:]
+        if cut:
+            lines = data[:cut].decode().split("\n")
+            lines.pop()
+            yield from lines
+    # the last line has no newline
+    if rest:
+        yield rest.decode()
+
+
+def line_start(file: BinaryIO, offset: int) -> int:
+    # the first line starting at or after offset
+    if offset == 0:
+        return 0
+    file.seek(offset - 1)
+    file.readline()
+    return file.tell()
+
+
+def split_ranges(file_name: str, parts: int) -> list[tuple[int, int]]:
+    # about equal byte ranges, moved to line starts so every line falls in
+    # exactly one of them; ranges left empty by long lines are dropped
+    size = os.path.getsize(file_name)
+    with open(file_name, "rb") as file:
+        starts = [line_start(file, size * part // parts) for part in range(parts)]
+    ends = starts[1:] + [size]
+    return [(start, end) for start, end in zip(starts, ends) if start < end]
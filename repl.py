@@ -0,0 +1,99 @@
+from expressions import Assignment, Expr, For, Function
+from interpreter import ENGINES, compile_ast
+from optimizer import TEMP_PREFIX, drop_temps, optimize_program, temp_names
+from parser import Parser
+from tokenizer import TokenStream
+
+# the keywords a block starts with, every one of them is closed by `end`
+BLOCK_KEYWORDS = frozenset(("func", "if", "while", "for"))
+
+
+def block_depth(tokens: TokenStream) -> int:
+    # how many blocks the tokens open and leave unclosed
+    depth = 0
+    for index in range(len(tokens)):
+        if tokens.kind(index) == "IDENTIFIER":
+            value = tokens.value(index)
+            if value in BLOCK_KEYWORDS:
+                depth += 1
+            elif value == "end":
+                depth -= 1
+    return depth
+
+
+class Session:
+    # an interactive session: the globals, the functions and the names of
+    # imported modules outlive every input. Lines are buffered until every
+    # block in them is closed, then only the new statements are parsed,
+    # compiled and run, so an input costs the same however long the
+    # session has been going
+    __slots__ = ["engine", "optimize", "context", "functions", "modules", "pending", "depth"]
+
+    def __init__(self, engine: str = "tree", optimize: bool = False):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine}")
+        self.engine = engine
+        self.optimize = optimize
+        self.context: dict = {}
+        self.functions: dict[str, Function] = {}
+        self.modules: set[str] = set()
+        self.pending: list[str] = []
+        self.depth = 0
+
+    def feed(self, line: str) -> list[Expr] | None:
+        # None while a block is still open, else the statements that ran;
+        # a failing input is dropped whole, the session goes on without it
+        try:
+            # no token spans a newline, each line is scanned once
+            self.depth += block_depth(TokenStream(line))
+        except SyntaxError:
+            self.reset()
+            raise
+        self.pending.append(line)
+        if self.depth > 0:
+            return None
+        source = "\n".join(self.pending)
+        self.reset()
+        return self.execute(source)
+
+    def reset(self):
+        self.pending.clear()
+        self.depth = 0
+
+    def execute(self, source: str) -> list[Expr]:
+        tokens = TokenStream(source)
+        if not len(tokens):
+            return []
+        if tokens.kind(len(tokens) - 1) != "SEMICOLON":
+            # the last statement of an input may leave out its `;`
+            tokens = TokenStream(source + ";")
+        # parsed against its own table, an input that does not parse leaves
+        # no half defined function behind
+        functions: dict[str, Function] = {}
+        parser = Parser(tokens, functions)
+        parser.modules = set(self.modules)
+        ast = parser.parse(self.context)
+        if self.optimize:
+            ast = optimize_program(ast, functions)
+        if functions.keys() & self.functions.keys():
+            # callers already linked to the old definition are linked again
+            for function in self.functions.values():
+                function.frame_size = None
+        self.functions.update(functions)
+        self.modules = parser.modules
+        try:
+            ENGINES[self.engine][1](compile_ast(ast, self.functions, self.engine), self.context)
+        finally:
+            # the session outlives a failing input, so do its globals
+            if self.optimize:
+                drop_temps(self.context, temp_names(ast))
+        return ast
+
+
+def assigned_names(ast: list[Expr]) -> list[str]:
+    # the globals an input sets at its top level, what debug mode shows
+    names = {}
+    for stmt in ast:
+        if isinstance(stmt, (Assignment, For)) and not stmt.name.startswith(TEMP_PREFIX):
+            names[stmt.name] = None
+    return list(names)
@@ -0,0 +1,177 @@
+from typing import Any, Callable
+
+from expressions import BinOp, BuiltinFunction, ListArguments, Number, Assignment, \
+    Variable, Expr, String, Boolean, UnaryOp, Function, FunctionCall, \
+    Return, Null, If, While, For, Range, Index, IndexAssignment
+from statements import ExpressionStmt
+
+
+class Scope:
+    # the locals of one function: its parameters, then every name it assigns
+    __slots__ = ["slots", "reads"]
+
+    def __init__(self, params: list[str]):
+        self.slots: dict[str, int] = {}
+        self.reads: list[Variable] = []
+        for param in params:
+            self.slot(param)
+
+    def slot(self, name: str) -> int:
+        if name not in self.slots:
+            self.slots[name] = len(self.slots)
+        return self.slots[name]
+
+
+class Resolver:
+    # gives every Variable and Assignment inside a function a (depth, slot)
+    # and links every FunctionCall to its Function, so a call only fills a
+    # frame with its arguments instead of copying the caller context
+    __slots__ = ["functions", "scope", "nesting", "resolvers"]
+
+    def __init__(self, functions: dict[str, Function]):
+        self.functions = functions
+        # None while resolving top level statements, they use the globals dict
+        self.scope: Scope | None = None
+        # how many If and While bodies enclose the current node
+        self.nesting = 0
+        self.resolvers: dict[type, Callable[[Any], None]] = {
+            Number: self.resolve_nothing,
+            String: self.resolve_nothing,
+            Boolean: self.resolve_nothing,
+            Null: self.resolve_nothing,
+            Function: self.resolve_nothing,
+            Variable: self.resolve_variable,
+            ListArguments: self.resolve_list_arguments,
+            FunctionCall: self.resolve_function_call,
+            Return: self.resolve_return,
+            BuiltinFunction: self.resolve_builtin,
+            If: self.resolve_if,
+            While: self.resolve_while,
+            For: self.resolve_for,
+            Range: self.resolve_range,
+            Index: self.resolve_index,
+            IndexAssignment: self.resolve_index_assignment,
+            Assignment: self.resolve_assignment,
+            UnaryOp: self.resolve_unary,
+            BinOp: self.resolve_binary,
+            ExpressionStmt: self.resolve_expression_stmt,
+        }
+
+    def resolve(self, node: Expr):
+        resolver = self.resolvers.get(type(node), None)
+        if resolver is None:
+            raise SyntaxError(f"can not resolve {node}")
+        resolver(node)
+
+    def resolve_block(self, body: list[Expr]):
+        for stmt in body:
+            self.resolve(stmt)
+
+    def resolve_function(self, function: Function):
+        if function.frame_size is not None:
+            return
+        # set before the body so a recursive call does not resolve it again
+        function.frame_size = 0
+        outer, self.scope = self.scope, Scope([arg.name for arg in function.args])
+        nesting, self.nesting = self.nesting, 0
+        self.resolve_block(function.body)
+        scope, self.scope = self.scope, outer
+        self.nesting = nesting
+
+        # reads are bound last, a name assigned anywhere in the function is a
+        # local even where it is read before the assignment
+        for variable in scope.reads:
+            variable.slot = scope.slots.get(variable.name, None)
+            variable.depth = 0 if variable.slot is not None else 1
+        function.frame_size = len(scope.slots)
+
+    def resolve_nothing(self, node: Expr):
+        pass
+
+    def resolve_variable(self, node: Variable):
+        if self.scope is not None:
+            self.scope.reads.append(node)
+
+    def resolve_list_arguments(self, node: ListArguments):
+        self.resolve_block(node.args)
+
+    def resolve_function_call(self, node: FunctionCall):
+        function = self.functions.get(node.name, None)
+        if function is None:
+            raise NameError(f"Function {node.name} not found")
+        if len(function.args) != len(node.args):
+            raise SyntaxError(
+                f"Function {node.name} expected {len(function.args)} args, got {len(node.args)}")
+        node.function = function
+        node.depth = 0 if self.scope is None else 1
+        self.resolve_block(node.args)
+        self.resolve_function(function)
+
+    def resolve_return(self, node: Return):
+        node.nested = self.scope is not None and self.nesting > 0
+        self.resolve(node.value)
+
+    def resolve_builtin(self, node: BuiltinFunction):
+        self.resolve_block(node.args)
+
+    def resolve_if(self, node: If):
+        self.resolve_block(node.conditions)
+        self.nesting += 1
+        for body in node.body:
+            self.resolve_block(body)
+        self.resolve_block(node.else_body)
+        self.nesting -= 1
+
+    def resolve_while(self, node: While):
+        self.resolve(node.condition)
+        self.nesting += 1
+        self.resolve_block(node.body)
+        self.nesting -= 1
+
+    def resolve_for(self, node: For):
+        if self.scope is not None:
+            node.slot = self.scope.slot(node.name)
+        self.resolve(node.iterable)
+        self.nesting += 1
+        self.resolve_block(node.body)
+        self.nesting -= 1
+
+    def resolve_range(self, node: Range):
+        self.resolve(node.start)
+        self.resolve(node.stop)
+
+    def resolve_index(self, node: Index):
+        self.resolve(node.target)
+        self.resolve(node.index)
+
+    def resolve_index_assignment(self, node: IndexAssignment):
+        self.resolve(node.target)
+        self.resolve(node.index)
+        self.resolve(node.value)
+
+    def resolve_assignment(self, node: Assignment):
+        if self.scope is not None:
+            node.slot = self.scope.slot(node.name)
+        self.resolve(node.value)
+
+    def resolve_unary(self, node: UnaryOp):
+        self.resolve(node.expr)
+
+    def resolve_binary(self, node: BinOp):
+        # a chain like a + b + c nests on its left, it is walked in a loop so
+        # a long one does not take two frames per term
+        rights = []
+        while isinstance(node, BinOp):
+            rights.append(node.right)
+            node = node.left
+        self.resolve(node)
+        for right in reversed(rights):
+            self.resolve(right)
+
+    def resolve_expression_stmt(self, node: ExpressionStmt):
+        self.resolve(node.expression)
+
+
+def resolve_program(ast: list[Expr], functions: dict[str, Function]) -> list[Expr]:
+    Resolver(functions).resolve_block(ast)
+    return ast
@@ -0,0 +1,121 @@
+import io
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+from typing import Callable
+
+from client import STATUS, STDERR, STDOUT, send_frame
+
+# connections waiting for a free worker before new ones are refused
+BACKLOG = 128
+
+
+class FrameWriter:
+    # a text stream sending whatever is written to it to the client, as
+    # frames of one kind; OutputBuffer already hands it large writes
+    __slots__ = ["conn", "kind"]
+
+    def __init__(self, conn: socket.socket, kind: bytes):
+        self.conn = conn
+        self.kind = kind
+
+    def write(self, text: str) -> int:
+        if text:
+            send_frame(self.conn, self.kind, text.encode())
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+def serve_request(conn: socket.socket, handle: Callable[[list[str]], int]):
+    # one run with the client's arguments, working directory and stdin;
+    # stdout and stderr go back as they are written, the status last
+    with conn.makefile("rb") as reader:
+        request = json.loads(reader.readline())
+        stdin = reader.read()
+    saved = sys.stdin, sys.stdout, sys.stderr, os.getcwd()
+    sys.stdin = io.TextIOWrapper(io.BytesIO(stdin), encoding="utf-8")
+    sys.stdout = FrameWriter(conn, STDOUT)
+    sys.stderr = FrameWriter(conn, STDERR)
+    try:
+        os.chdir(request["cwd"])
+        status = handle(request["args"])
+    except (BrokenPipeError, ConnectionResetError):
+        # the client is gone, nobody is left to tell
+        raise
+    except SystemExit as exit:
+        # argparse errors and sys.exit in the run
+        status = exit.code if isinstance(exit.code, int) else (exit.code is not None)
+    except Exception as error:
+        print(f"pos: {type(error).__name__}: {error}", file=sys.stderr)
+        status = 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved[:3]
+        os.chdir(saved[3])
+    send_frame(conn, STATUS, str(int(status)).encode())
+
+
+def work(listener: socket.socket, handle: Callable[[list[str]], int]):
+    # the workers share the listening socket, the kernel hands each new
+    # connection to one of the workers waiting in accept
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    while True:
+        conn, _ = listener.accept()
+        with conn:
+            try:
+                serve_request(conn, handle)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+
+def listen(socket_path: str) -> socket.socket:
+    if os.path.exists(socket_path):
+        # only a socket left by a server that is gone is replaced
+        if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            raise FileExistsError(f"{socket_path} exists and is not a socket")
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(BACKLOG)
+    return listener
+
+
+def serve(socket_path: str, handle: Callable[[list[str]], int], workers: int):
+    # a pool of forked workers, each one already has the interpreter loaded
+    # and keeps its caches warm between runs; a worker that dies is
+    # replaced, the pool stops on SIGINT or SIGTERM
+    listener = listen(socket_path)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    children: set[int] = set()
+    print(f"pos: serving on {socket_path} with {workers} workers", file=sys.stderr)
+    try:
+        while True:
+            while len(children) < workers:
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        work(listener, handle)
+                    finally:
+                        os._exit(1)
+                children.add(pid)
+            pid, _ = os.wait()
+            children.discard(pid)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        listener.close()
+        os.unlink(socket_path)
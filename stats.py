@@ -0,0 +1,96 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator
+
+from expressions import Expr, Function
+from optimizer import walk
+
+
+def new_functions(functions: dict[str, Function],
+                  before: dict[str, Function]) -> dict[str, Function]:
+    # the functions dict is shared by every file, only those one file
+    # defined or redefined since the snapshot before it are its own
+    return {name: function for name, function in functions.items()
+            if before.get(name) is not function}
+
+
+def count_node_types(ast: list[Expr], functions: dict[str, Function]) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    bodies = [ast, *(function.body for function in functions.values())]
+    for body in bodies:
+        for stmt in body:
+            for node in walk(stmt):
+                name = type(node).__name__
+                counts[name] = counts.get(name, 0) + 1
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+class FileStats:
+    # what running one file cost and what it looked like; phases maps each
+    # phase to its wall time in seconds and its tracemalloc peak in bytes,
+    # None for a phase run without tracing
+    __slots__ = ["file_name", "phases", "tokens", "nodes", "globals", "functions"]
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.phases: dict[str, tuple[float, int | None]] = {}
+        self.tokens = 0
+        self.nodes: dict[str, int] = {}
+        self.globals = 0
+        self.functions = 0
+
+    @contextmanager
+    def phase(self, name: str, memory: bool = True) -> Iterator[None]:
+        # the peak is reset per phase, so it is what this phase allocated on
+        # top of what was alive when it started; tracing slows every
+        # allocation down, so a phase can be timed without it
+        if not memory:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.phases[name] = (time.perf_counter() - start, None)
+            return
+        started = tracemalloc.is_tracing()
+        if not started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - base
+            if not started:
+                tracemalloc.stop()
+            self.phases[name] = (elapsed, peak)
+
+    def to_dict(self) -> dict:
+        return {
+            "file": self.file_name,
+            "phases": {name: {"seconds": elapsed, "peak_bytes": peak}
+                       for name, (elapsed, peak) in self.phases.items()},
+            "tokens": self.tokens,
+            "nodes": sum(self.nodes.values()),
+            "node_types": self.nodes,
+            "globals": self.globals,
+            "functions": self.functions,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    def to_text(self) -> str:
+        lines = [f"stats for {self.file_name}:"]
+        for name, (elapsed, peak) in self.phases.items():
+            memory = f"{'-':>19}" if peak is None else f"{peak / 1024:12.1f}KB peak"
+            lines.append(f"  {name:<10} {elapsed * 1000:10.3f}ms {memory}")
+        lines.append(f"  tokens     {self.tokens}")
+        lines.append(f"  nodes      {sum(self.nodes.values())}: "
+                     + ", ".join(f"{name} {count}" for name, count in self.nodes.items()))
+        lines.append(f"  globals    {self.globals}")
+        lines.append(f"  functions  {self.functions}")
+        return "\n".join(lines)
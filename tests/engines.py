@@ -0,0 +1,24 @@
+import io
+from contextlib import redirect_stdout
+
+from interpreter import ENGINES, Interpreter
+
+
+def run(source: str, engine: str, optimize: bool = False) -> tuple[str, dict]:
+    # the output and the globals of one run
+    output = io.StringIO()
+    with redirect_stdout(output):
+        context = Interpreter(engine, optimize).run(source)
+    return output.getvalue(), context
+
+
+def run_all(source: str, optimize: bool = False,
+            engines=ENGINES) -> dict[str, tuple[str, dict]]:
+    return {engine: run(source, engine, optimize) for engine in engines}
+
+
+def assert_same_output(source: str, optimize: bool = False, engines=ENGINES) -> str:
+    outputs = {engine: output
+               for engine, (output, _) in run_all(source, optimize, engines).items()}
+    assert len(set(outputs.values())) == 1, outputs
+    return outputs["tree"]
@@ -0,0 +1,26 @@
+import pytest
+
+from engines import assert_same_output
+
+# arrays need numpy
+pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_augmented_assignment_does_not_change_an_alias(optimize):
+    output = assert_same_output("""a = array(1, 2, 3);
+b = a;
+a += 1;
+a *= 2;
+puts(b, a);
+
+func shift(xs)
+    ys = xs;
+    xs -= 1;
+    xs /= 2;
+    return ys;
+end;
+c = array(4, 5);
+puts(shift(c), c);
+""", optimize)
+    assert output == "@[1.0, 2.0, 3.0] @[4.0, 6.0, 8.0] \n@[4.0, 5.0] @[4.0, 5.0] \n"
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+import cache
+import main
+from builtins_po import builtin_func
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / "script.pos"
+    path.write_text("func f(x)\n    return x + 1;\nend;\ny = f(1);\n")
+    return path
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    # how many times a source was parsed rather than read from the cache
+    count = []
+    encode_source = main.encode_source
+
+    def counting(*args):
+        count.append(args[1])
+        return encode_source(*args)
+
+    monkeypatch.setattr(main, "encode_source", counting)
+    return count
+
+
+def run(path, options) -> dict:
+    context, functions = {}, {}
+    ast = main.load_file(str(path), functions, options)
+    main.run_compiled(main.compile_ast(ast, functions, "tree"), context, "tree")
+    return context
+
+
+def test_a_second_run_hits_the_cache(script, parses):
+    assert run(script, {"cache": True}) == {"y": 2.0}
+    path = cache.cache_path(str(script))
+    assert os.path.isfile(path)
+    assert run(script, {"cache": True}) == {"y": 2.0}
+    assert parses == [str(script)]
+
+
+def test_the_cache_is_opt_in(script):
+    parse = main.make_arg_parser()
+    args = parse.parse_args([str(script)])
+    options = main.make_options(args, parse)
+    assert "cache" not in options
+    assert run(script, options) == {"y": 2.0}
+    assert not os.path.exists(os.path.dirname(cache.cache_path(str(script))))
+
+
+def test_a_changed_source_is_a_miss(script, parses):
+    run(script, {"cache": True})
+    script.write_text("y = 5;\n")
+    assert run(script, {"cache": True}) == {"y": 5.0}
+    assert len(parses) == 2
+
+
+def test_a_cache_dir_keeps_sources_apart(tmp_path, script, parses):
+    options = {"cache": True, "cache_dir": str(tmp_path / "cache")}
+    run(script, options)
+    run(script, options)
+    assert len(parses) == 1
+    assert os.listdir(tmp_path / "cache") == [os.path.basename(cache.cache_path(
+        str(script), options["cache_dir"]))]
+
+
+def test_a_corrupt_entry_is_rewritten(script, parses):
+    run(script, {"cache": True})
+    with open(cache.cache_path(str(script)), "wb") as file:
+        file.write(b"not a cache entry")
+    assert run(script, {"cache": True}) == {"y": 2.0}
+    assert run(script, {"cache": True}) == {"y": 2.0}
+    assert len(parses) == 2
+
+
+def test_registering_a_builtin_is_a_miss(script, parses, monkeypatch):
+    run(script, {"cache": True})
+    # taken out again by monkeypatch, as Interpreter.register would add it
+    monkeypatch.setitem(builtin_func, "double", builtin_func["len"])
+    assert run(script, {"cache": True}) == {"y": 2.0}
+    assert len(parses) == 2
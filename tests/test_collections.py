@@ -0,0 +1,54 @@
+import pytest
+
+from engines import assert_same_output, run
+from interpreter import ENGINES
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_list_index_syntax(optimize):
+    output = assert_same_output("""xs = [1, 2, 3];
+xs[0] = 10;
+xs[1] += 5;
+xs.push(4);
+puts(xs, len(xs), xs[-1]);
+puts(pop(xs), len(xs));
+t = 0;
+for (v in xs) t += v; end;
+puts(t);
+""", optimize)
+    assert output == "[10.0, 7.0, 3.0, 4.0] 4.0 4.0 \n4.0 3.0 \n20.0 \n"
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_map_member_syntax(optimize):
+    output = assert_same_output("""m = {a: 1, b: "x"};
+m.a += 2;
+m.c = [1];
+m["d"] = 7;
+m.c.push(2);
+puts(m.a, m.b, m["d"], m.c, len(m));
+for (k in m) puts(k); end;
+""", optimize)
+    assert output == "3.0 x 7.0 [1.0, 2.0] 4.0 \na \nb \nc \nd \n"
+
+
+def test_a_list_is_changed_in_place_under_its_aliases():
+    output = assert_same_output("""xs = [1, 2];
+ys = xs;
+ys.push("s");
+ys[0] = 5;
+puts(xs);
+""")
+    assert output == '[5.0, 2.0, "s"] \n'
+
+
+@pytest.mark.parametrize("source, error", [
+    ("xs = [1]; puts(xs[3]);", "list index 3.0 out of range"),
+    ("xs = [1]; xs[5] = 2;", "list index 5.0 out of range"),
+    ("xs = []; pop(xs);", "pop from an empty list"),
+    ("m = {a: 1}; puts(m.b);", 'key "b" not found'),
+])
+@pytest.mark.parametrize("engine", ENGINES)
+def test_a_bad_index_is_an_error(engine, source, error):
+    with pytest.raises((IndexError, KeyError), match=error):
+        run(source, engine)
@@ -0,0 +1,73 @@
+import pytest
+
+import main
+from interpreter import ENGINES, Interpreter, ModuleLoader
+
+COUNTER = """puts("counter loaded");
+counts = [0];
+func bump()
+    counts[0] += 1;
+    return counts[0];
+end;
+"""
+
+JOB = """import "counter.pos";
+puts(counter.bump());
+"""
+
+
+@pytest.fixture
+def scripts(tmp_path, monkeypatch):
+    (tmp_path / "counter.pos").write_text(COUNTER)
+    for name in ("one.pos", "two.pos"):
+        (tmp_path / name).write_text(JOB)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_isolated_jobs_do_not_share_modules(scripts, capsys):
+    args = main.make_arg_parser().parse_args(["--isolated", "one.pos", "two.pos"])
+    assert main.run_command(args, main.make_options(args, main.make_arg_parser())) == 0
+    assert capsys.readouterr().out == "counter loaded \n1.0 \n" * 2
+
+
+def test_each_run_of_a_compiled_program_imports_again(scripts, capsys):
+    program = Interpreter().compile(JOB)
+    program.run()
+    program.run()
+    assert capsys.readouterr().out == "counter loaded \n1.0 \n" * 2
+
+
+def test_one_loader_imports_once(scripts, capsys):
+    program = Interpreter().compile(JOB)
+    with ModuleLoader():
+        program.run()
+        program.run()
+    assert capsys.readouterr().out == "counter loaded \n1.0 \n2.0 \n"
+
+
+@pytest.fixture
+def cycle(tmp_path, monkeypatch):
+    (tmp_path / "a.pos").write_text('import "b.pos";\nputs("a");\n')
+    (tmp_path / "b.pos").write_text('import "c.pos";\n')
+    (tmp_path / "c.pos").write_text('import "a.pos";\n')
+    (tmp_path / "self.pos").write_text('import "self.pos";\n')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_a_circular_import_names_the_cycle(cycle, engine):
+    with ModuleLoader(engine) as loader:
+        with pytest.raises(ImportError, match=r"circular import: a.pos -> b.pos -> c.pos -> a.pos"):
+            Interpreter(engine).run('import "a.pos";')
+        with pytest.raises(ImportError, match=r"circular import: self.pos -> self.pos"):
+            Interpreter(engine).run('import "self.pos";')
+        # nothing half loaded is kept
+        assert loader.loading == [] and loader.modules == {}
+
+
+def test_a_module_imported_twice_without_a_cycle_loads_once(scripts, capsys):
+    (scripts / "both.pos").write_text('import "counter.pos";\nimport "one.pos";\n')
+    Interpreter().run('import "both.pos";\nimport "counter.pos";\nputs(counter.bump());\n')
+    assert capsys.readouterr().out == "counter loaded \n1.0 \n2.0 \n"
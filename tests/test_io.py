@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def run_main(args: list[str], stdin: str) -> str:
+    return subprocess.run([sys.executable, MAIN, *args], input=stdin, capture_output=True,
+                          text=True, check=True).stdout
+
+
+def test_the_repl_and_input_share_piped_stdin():
+    output = run_main([], 'x = input("");\n5\nputs(x + 1);\ny = read_line();\nnext\nputs(y);\n')
+    assert output == "$$ $$ 6.0 \n$$ $$ next \n$$ \n"
+
+
+def test_a_script_reads_all_of_piped_stdin(tmp_path):
+    script = tmp_path / "script.pos"
+    script.write_text('x = input("");\nfor (line in lines())\n    puts(line);\nend;\n')
+    assert run_main([str(script)], "1\na\nb\n") == "a \nb \n"
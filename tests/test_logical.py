@@ -0,0 +1,23 @@
+import pytest
+
+from engines import assert_same_output, run
+from interpreter import ENGINES
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("source", ["false and 1 / d", "true or 1 / d"])
+def test_the_right_side_is_evaluated(engine, source):
+    with pytest.raises(ZeroDivisionError):
+        run(f"d = 0;\nx = ({source});\n", engine)
+
+
+def test_calls_on_both_sides_run():
+    output = assert_same_output("""func show(x)
+    puts(x);
+    return x;
+end;
+a = (show(false) and show(1));
+b = (show(true) or show(2));
+puts(a, b);
+""")
+    assert output == "false \n1.0 \ntrue \n2.0 \nfalse true \n"
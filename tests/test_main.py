@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import cache
+import main
+
+
+@pytest.fixture
+def script(tmp_path):
+    def write(source: str, name: str = "script.pos") -> str:
+        path = tmp_path / name
+        path.write_text(source)
+        return str(path)
+    return write
+
+
+def test_a_single_job_does_not_encode(script, monkeypatch):
+    def encode_program(ast):
+        raise AssertionError("encoded without the cache or a pool")
+
+    monkeypatch.setattr(cache, "encode_program", encode_program)
+    functions = {}
+    ast = main.load_file(script("func f(x)\n    return x;\nend;\ny = f(1);\n"), functions, {})
+    assert len(ast) == 2 and list(functions) == ["f"]
+
+
+@pytest.mark.parametrize("options", [{}, {"jobs": 2}])
+def test_too_deep_a_source_is_a_clean_error(script, capsys, options):
+    deep = script("x = " + "(" * 3000 + "1" + ")" * 3000 + ";\n", "deep.pos")
+    args = main.make_arg_parser().parse_args([deep, script("puts(1);\n")])
+    assert main.run_command(args, options) == 1
+    assert capsys.readouterr().err == f"pos: SyntaxError: {deep} nests too deeply to be compiled\n"
+
+
+def test_stats_count_only_what_each_file_defines(script, capsys):
+    parse = main.make_arg_parser()
+    files = [script("func f(x)\n    return x;\nend;\n", "one.pos"),
+             script("func g(x)\n    return x;\nend;\nfunc h(x)\n    return x;\nend;\n", "two.pos")]
+    args = parse.parse_args(["--stats", "--stats-format", "json", *files])
+    assert main.run_command(args, main.make_options(args, parse)) == 0
+    reports = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    assert [report["functions"] for report in reports] == [1, 2]
+    assert [report["node_types"]["Function"] for report in reports] == [1, 2]
+    # the execute phase is timed but not traced unless asked for
+    assert all(report["phases"]["execute"]["peak_bytes"] is None for report in reports)
+
+
+def test_a_memory_limit_below_what_is_measured_is_refused(script, capsys):
+    parse = main.make_arg_parser()
+    args = parse.parse_args(["--max-memory", "100", script("puts(1);\n")])
+    with pytest.raises(SystemExit):
+        main.make_options(args, parse)
+    assert "--max-memory must be at least" in capsys.readouterr().err
@@ -0,0 +1,17 @@
+import pytest
+
+from engines import assert_same_output, run
+
+
+def chain(terms: int) -> str:
+    return "a = 1;\nx = " + " + ".join(["a * 2"] * terms) + " - 3;\nputs(x);\n"
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_long_chain(optimize):
+    assert assert_same_output(chain(600), optimize) == "1197.0 \n"
+
+
+def test_too_deep_is_a_syntax_error():
+    with pytest.raises(SyntaxError):
+        run(chain(5000), "python")
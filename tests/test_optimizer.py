@@ -0,0 +1,46 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from engines import run_all
+from interpreter import ENGINES, Interpreter
+from repl import Session
+
+LOOP = """n = 3;
+k = 2;
+i = 0;
+while (i < n * k)
+    i += 1;
+    total = i * (n + k);
+end;
+"""
+
+
+def test_hoisted_values_stay_out_of_the_globals():
+    for engine, (_, context) in run_all(LOOP, optimize=True).items():
+        assert context == {"n": 3.0, "k": 2.0, "i": 6.0, "total": 30.0}, engine
+
+
+def test_hoisted_values_stay_out_of_a_session():
+    session = Session("tree", optimize=True)
+    for line in LOOP.splitlines():
+        session.feed(line)
+    assert sorted(session.context) == ["i", "k", "n", "total"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_nothing_that_can_raise_moves_before_an_effect(engine):
+    # 1 / d is invariant, but puts runs before it
+    source = """d = 0;
+i = 0;
+while (i < 3)
+    puts("before");
+    x = 1 / d;
+    i += 1;
+end;
+"""
+    output = io.StringIO()
+    with redirect_stdout(output), pytest.raises(ZeroDivisionError):
+        Interpreter(engine, optimize=True).run(source)
+    assert output.getvalue() == "before \n"
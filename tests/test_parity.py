@@ -0,0 +1,75 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from interpreter import ENGINES, Interpreter
+
+
+def outcome(source: str, engine: str, optimize: bool) -> tuple[str, str | None]:
+    # the output and the error of one run, as the user would see them
+    output = io.StringIO()
+    error = None
+    with redirect_stdout(output):
+        try:
+            Interpreter(engine, optimize).run(source)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    return output.getvalue(), error
+
+
+PROGRAMS = {
+    "python builtin": ("x = abs; puts(x);", "", "NameError: Var abs not found"),
+    "python builtin call": ("puts(1); puts(max(2, 3));", "", "NameError: Function max not found"),
+    "global read before assignment": ("""x = 5;
+func f()
+    puts(x);
+    x = 2;
+    puts(x);
+end;
+f();
+puts(x);
+""", "5.0 \n2.0 \n5.0 \n", None),
+    "global read live": ("""x = 1;
+func set()
+    x = 7;
+end;
+func show()
+    puts(x);
+    x = 3;
+end;
+set();
+show();
+x = 4;
+show();
+""", "1.0 \n4.0 \n", None),
+    "missing global": ("""func g()
+    y = y + 1;
+end;
+g();
+""", "", "NameError: Var y not found"),
+    "augmented missing global": ("""func g()
+    z += 1;
+end;
+g();
+""", "", "KeyError: 'z'"),
+    "augmented missing top level": ("z += 1;", "", "KeyError: 'z'"),
+    "assigned in a branch": ("""w = 10;
+func h(c)
+    if (c)
+        w = 1;
+    end;
+    puts(w);
+end;
+h(true);
+h(false);
+""", "1.0 \n10.0 \n", None),
+}
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_engines_agree(name, optimize):
+    source, output, error = PROGRAMS[name]
+    outcomes = {engine: outcome(source, engine, optimize) for engine in ENGINES}
+    assert set(outcomes.values()) == {(output, error)}, outcomes
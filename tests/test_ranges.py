@@ -0,0 +1,17 @@
+import pytest
+
+from engines import assert_same_output
+
+# arrays need numpy
+pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_range_bound_from_an_array(optimize):
+    output = assert_same_output("""a = array(3, 1);
+for (i in 1..a[0])
+    puts(i);
+end;
+puts(len(a[1]..a[0]));
+""", optimize)
+    assert output == "1.0 \n2.0 \n3.0 \n3.0 \n"
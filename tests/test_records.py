@@ -0,0 +1,38 @@
+import pytest
+
+import main
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    data = tmp_path / "data.txt"
+    data.write_text("".join(f"row {index} {index % 3}\n" for index in range(200)))
+    return tmp_path, str(data)
+
+
+def run_records(tmp_path, data: str, source: str, jobs: int) -> int:
+    script = tmp_path / "script.pos"
+    script.write_text(source)
+    args = main.make_arg_parser().parse_args(["-n", "-j", str(jobs), str(script), data])
+    return main.run_command(args, main.make_options(args, main.make_arg_parser()))
+
+
+@pytest.mark.parametrize("source", [
+    "BEGIN\n    n = 0;\nend;\nn += 1;\n",
+    "x = 1;\nEND\n    puts(x);\nend;\n",
+    "func count()\n    return nr;\nend;\nputs(count());\n",
+])
+def test_split_runs_refuse_begin_end_and_nr(inputs, capsys, source):
+    tmp_path, data = inputs
+    assert run_records(tmp_path, data, source, 2) == 1
+    assert "run without -j" in capsys.readouterr().err
+
+
+def test_split_runs_match_a_whole_run(inputs, capsys):
+    tmp_path, data = inputs
+    source = "if (number(fields[2]) == 1)\n    puts(fields[1]);\nend;\n"
+    assert run_records(tmp_path, data, source, 1) == 0
+    whole = capsys.readouterr().out
+    assert run_records(tmp_path, data, source, 3) == 0
+    assert capsys.readouterr().out == whole
+    assert whole.split() == [str(index) for index in range(1, 200, 3)]
@@ -0,0 +1,46 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from interpreter import ENGINES
+from repl import Session
+
+
+def feed(session: Session, *lines: str) -> str:
+    output = io.StringIO()
+    with redirect_stdout(output):
+        for line in lines:
+            session.feed(line)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+@pytest.mark.parametrize("engine", ENGINES)
+def test_a_redefined_function_is_called_by_its_old_callers(engine, optimize):
+    session = Session(engine, optimize)
+    assert feed(session, "func f(x)", "return x + 1;", "end;",
+                "func g(x) return f(x) * 2; end;", "puts(g(1));") == "4.0 \n"
+    assert feed(session, "func f(x) return x + 10; end;", "puts(g(1));") == "22.0 \n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_a_redefinition_can_change_the_arguments(engine):
+    session = Session(engine)
+    feed(session, "func f(x) return x; end;", "func g(x) return f(x); end;")
+    assert feed(session, "func f(x, y) return x * y; end;", "puts(f(2, 3));") == "6.0 \n"
+    # the old caller no longer matches, it is refused when next linked
+    with pytest.raises(SyntaxError, match="Function f expected 2 args, got 1"):
+        feed(session, "puts(g(1));")
+    assert feed(session, "func g(x) return f(x, x); end;", "puts(g(3));") == "9.0 \n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_a_redefinition_that_does_not_parse_keeps_the_old_one(engine):
+    session = Session(engine)
+    feed(session, "x = 1;", "func f(x) return x * 2; end;")
+    for line in ("func f(x y) return x; end;", "func f(x) return `; end;"):
+        with pytest.raises(SyntaxError):
+            feed(session, line)
+    assert session.pending == [] and session.depth == 0
+    assert feed(session, "puts(f(4), x);") == "8.0 1.0 \n"
@@ -0,0 +1,44 @@
+from engines import assert_same_output
+
+
+def test_top_level_return_leaves_the_if_body():
+    output = assert_same_output("""x = 1;
+if (x == 1)
+    puts("before");
+    return 0;
+    puts("after");
+end;
+puts("next");
+""")
+    assert output == "before \nnext \n"
+
+
+def test_top_level_return_in_else_and_elif():
+    output = assert_same_output("""for (x in 1..3)
+    if (x == 1)
+        return 0;
+        puts("one");
+    elif (x == 2)
+        puts("two");
+        return 0;
+        puts("still two");
+    else
+        return 0;
+        puts("three");
+    end;
+    puts(x);
+end;
+""")
+    assert output == "1.0 \ntwo \n2.0 \n3.0 \n"
+
+
+def test_return_inside_function_if():
+    output = assert_same_output("""func sign(x)
+    if (x < 0)
+        return -1;
+    end;
+    return 1;
+end;
+puts(sign(-5), sign(5));
+""")
+    assert output == "-1.0 1.0 \n"
@@ -0,0 +1,120 @@
+import io
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from functools import partial
+
+import pytest
+
+from client import STATUS, STDERR, STDOUT, read_frames, request
+from server import serve_request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def exchange(handle, payload: bytes) -> list[tuple[bytes, bytes]]:
+    # one request through serve_request over a socket pair, its frames back
+    server, client = socket.socketpair()
+    with server, client:
+        client.sendall(payload)
+        client.shutdown(socket.SHUT_WR)
+        serve_request(server, handle)
+        server.shutdown(socket.SHUT_WR)
+        frames = []
+        with client.makefile("rb") as reader:
+            for kind, data in read_frames(reader):
+                frames.append((kind, data))
+                if kind == STATUS:
+                    return frames
+    raise AssertionError("no status frame")
+
+
+def joined(frames: list[tuple[bytes, bytes]], kind: bytes) -> bytes:
+    return b"".join(data for frame_kind, data in frames if frame_kind == kind)
+
+
+def test_a_request_gets_its_output_then_its_status(tmp_path):
+    def handle(args):
+        print("out", args, sys.stdin.read(), os.getcwd())
+        print("err", file=sys.stderr)
+        return 3
+
+    cwd = os.getcwd()
+    frames = exchange(handle, b'{"args": ["a"], "cwd": "%s"}\nin' % str(tmp_path).encode())
+    # frames come as they are written, the status last
+    kinds = [kind for kind, _ in frames]
+    assert kinds == sorted(kinds, key=[STDOUT, STDERR, STATUS].index) and kinds.count(STATUS) == 1
+    assert joined(frames, STDOUT) == f"out ['a'] in {tmp_path}\n".encode()
+    assert joined(frames, STDERR) == b"err\n"
+    assert frames[-1] == (STATUS, b"3")
+    # the server's own streams and directory are back
+    assert os.getcwd() == cwd
+
+
+@pytest.mark.parametrize("error, status, stderr", [
+    (SystemExit(2), b"2", b""),
+    (SystemExit("usage"), b"1", b""),
+    (NameError("Var x not found"), b"1", b"pos: NameError: Var x not found\n"),
+])
+def test_a_failing_run_is_a_status(tmp_path, error, status, stderr):
+    def handle(args):
+        raise error
+
+    frames = exchange(handle, b'{"args": [], "cwd": "%s"}\n' % str(tmp_path).encode())
+    assert frames[-1] == (STATUS, status)
+    assert joined(frames, STDERR) == stderr
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "pos.sock")
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py"),
+                                "--serve", path, "--workers", "2"], stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(200):
+            if os.path.exists(path):
+                break
+            time.sleep(0.05)
+        else:
+            raise AssertionError("the server did not start")
+        yield path
+    finally:
+        process.terminate()
+        process.wait(10)
+    assert not os.path.exists(path)
+
+
+def run(socket_path: str, args: list[str], stdin: bytes = b"",
+        cwd: str | None = None) -> tuple[int, bytes, bytes]:
+    stdout, stderr = io.BytesIO(), io.BytesIO()
+    status = request(socket_path, args, stdin, cwd, stdout, stderr)
+    return status, stdout.getvalue(), stderr.getvalue()
+
+
+def test_served_runs_match_pos(server, tmp_path):
+    (tmp_path / "echo.pos").write_text("for (line in lines())\n    puts(line);\nend;\n")
+    (tmp_path / "bad.pos").write_text("puts(1);\nputs(y);\n")
+    assert run(server, ["echo.pos"], b"a\nb\n", str(tmp_path)) == (0, b"a \nb \n", b"")
+    status, stdout, stderr = run(server, ["bad.pos"], cwd=str(tmp_path))
+    assert (status, stdout) == (1, b"1.0 \n") and b"Var y not found" in stderr
+    status, _, stderr = run(server, ["--no-such-flag", "echo.pos"], cwd=str(tmp_path))
+    assert status == 2 and b"unrecognized arguments" in stderr
+
+
+def test_concurrent_requests_each_get_their_own_output(server, tmp_path):
+    for n in range(6):
+        (tmp_path / f"job{n}.pos").write_text(f"for (i in 1..200)\n    puts({n});\nend;\n")
+    results = {}
+
+    def job(n):
+        results[n] = run(server, [f"job{n}.pos"], cwd=str(tmp_path))
+
+    threads = [threading.Thread(target=partial(job, n)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert results == {n: (0, f"{n}.0 \n".encode() * 200, b"") for n in range(6)}
@@ -0,0 +1,56 @@
+import pytest
+
+from tokenizer import Token, TokenCursor, TokenStream, Tokenizer
+
+SOURCE = "x = 1;\n  puts(x);"
+
+
+def test_stream_matches_the_tokenizer():
+    assert list(TokenStream(SOURCE)) == Tokenizer(SOURCE).tokenize()
+
+
+def test_positions_count_lines_and_columns_from_one():
+    stream = TokenStream(SOURCE)
+    assert stream.position(0) == (1, 1)
+    assert stream.position(SOURCE.index("puts")) == (2, 3)
+    assert stream[4] == Token("IDENTIFIER", "puts", 2, 3)
+
+
+def test_negative_indexes_count_from_the_last_token():
+    stream = TokenStream(SOURCE)
+    assert len(stream) == 9
+    assert stream[-1] == Token("SEMICOLON", ";", 2, 10)
+    assert stream[-len(stream)] == stream[0]
+    for index in (len(stream), -len(stream) - 1):
+        with pytest.raises(IndexError):
+            stream[index]
+
+
+def test_the_cursor_stops_on_an_eof_sentinel():
+    stream = TokenStream(SOURCE)
+    cursor = stream.cursor()
+    tokens = []
+    while cursor.kind() != "EOF":
+        tokens.append(cursor.token())
+        cursor.advance()
+    assert tokens == list(stream)
+    # past the end it stays on EOF, placed right after the last token
+    cursor.advance()
+    assert cursor.token() == Token("EOF", "", 2, 11)
+    assert cursor.value() == ""
+
+
+@pytest.mark.parametrize("source", ["", "  \n  "])
+def test_an_empty_source_is_only_eof(source):
+    stream = TokenStream(source)
+    assert len(stream) == 0 and list(stream) == []
+    assert stream.cursor().kind() == "EOF"
+    assert TokenCursor(Tokenizer(source).scan()).kind() == "EOF"
+
+
+@pytest.mark.parametrize("source, where", [("`", "line 1, column 1"),
+                                           ("x = 1;\n  y = `;", "line 2, column 7")])
+def test_an_invalid_token_says_where_it_is(source, where):
+    for tokenize in (TokenStream, lambda source: Tokenizer(source).tokenize()):
+        with pytest.raises(SyntaxError, match=f"Invalid token at {where}"):
+            tokenize(source)
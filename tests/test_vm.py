@@ -0,0 +1,45 @@
+import pytest
+
+from interpreter import run_compiled
+from limits import Budget, ResourceLimitExceeded
+from parser import Parser
+from repl import Session
+from tokenizer import TokenStream
+from vm import ITER_PREFIX, compile_program, run_program
+
+
+def compile_source(source: str):
+    functions = {}
+    ast = Parser(TokenStream(source), functions).parse({})
+    return compile_program(ast, functions)
+
+
+def hidden(context: dict) -> list[str]:
+    return [name for name in context if name.startswith(ITER_PREFIX)]
+
+
+def test_an_error_in_a_loop_leaves_no_iterator():
+    session = Session("vm")
+    with pytest.raises(ZeroDivisionError):
+        session.feed("for (i in 1..3) x = 1 / 0; end;")
+    assert hidden(session.context) == []
+    assert session.context["i"] == 1.0
+
+
+def test_a_budget_in_a_nested_loop_leaves_no_iterator():
+    context = {}
+    program = compile_source("""for (i in 1..100)
+    for (j in 1..100)
+        x = j;
+    end;
+end;
+""")
+    with pytest.raises(ResourceLimitExceeded):
+        run_compiled(program, context, "vm", Budget(max_steps=50))
+    assert hidden(context) == []
+
+
+def test_a_finished_loop_leaves_no_iterator():
+    context = {}
+    run_program(compile_source("for (i in 1..3) x = i; end;\n"), context)
+    assert context == {"i": 3.0, "x": 3.0}
@@ -1,6 +1,10 @@
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
 import re
 import sys
+from typing import Iterable, Iterator
+import mmap
 
 
 @dataclass
@@ -22,7 +26,10 @@ TOKEN_REGEX = [
     (r"or", "OR"),
     (r"not", "NOT"),
     (r"\d+\.{2}\d+", "DOUBLE_DOT"),
-    (r"\d+(\.\d*)?", "NUMBER"),
+    (r"\.{2}", "RANGE"),
+    (r"\.", "DOT"),
+    # a dot followed by another one starts a range, as in `1..n`
+    (r"\d+(?:\.(?!\.)\d*)?", "NUMBER"),
     (r"true|false", "BOOLEAN"),
     (r"\".*?\"", "STRING"),
     (r"'.*?'", "STRING"),
@@ -41,53 +48,215 @@ TOKEN_REGEX = [
     (r"/", "SLASH"),
     (r"\(", "LPAREN"),
     (r"\)", "RPAREN"),
+    (r"@\[", "ARRAY_OPEN"),
+    (r"\[", "LBRACKET"),
+    (r"\]", "RBRACKET"),
+    (r"\{", "LBRACE"),
+    (r"\}", "RBRACE"),
+    (r":", "COLON"),
     (r";", "SEMICOLON"),
     (r"\n", "NEWLINE"),
     (r"\s+", "WHITESPACE"),
 ]
 
 
+# every pattern becomes one named alternative of a single regex, tried in the
+# same order as TOKEN_REGEX, so the first alternative that matches wins
+TOKEN_PATTERN = re.compile("|".join(
+    f"(?P<T{index}>{pattern})" for index, (pattern, _) in enumerate(TOKEN_REGEX)))
+TOKEN_KINDS = {f"T{index}": kind for index, (_, kind) in enumerate(TOKEN_REGEX)}
+SKIP_KINDS = frozenset(("NEWLINE", "WHITESPACE"))
+
+# token kinds as small ints for TokenStream, 0 is reserved for EOF
+KIND_NAMES = ["EOF", *dict.fromkeys(kind for _, kind in TOKEN_REGEX)]
+KIND_IDS = {kind: index for index, kind in enumerate(KIND_NAMES)}
+GROUP_KIND_IDS = {group: KIND_IDS[kind] for group, kind in TOKEN_KINDS.items()}
+
+
 class Tokenizer:
-    __slots__ = ["code", "pos", "line", "column"]
+    __slots__ = ["code", "pos", "line", "column", "scanner"]
 
     def __init__(self, code: str):
         self.code = code
         self.pos = 0
         self.line = 1
         self.column = 1
+        self.scanner = None
 
-    def next_token(self):
-        while self.pos < len(self.code):
-            for pattern, token_type in TOKEN_REGEX:
-                regex = re.compile(pattern)
-                match = regex.match(self.code, self.pos)
-                if match:
-                    value = match.group(0)
-                    if token_type == "WHITESPACE":
-                        self.pos += len(value)
-                        self.column += len(value)
-                        return self.next_token()
-                    elif token_type == "NEWLINE":
-                        self.pos += len(value)
-                        self.line += 1
-                        start_column: int = self.column
-                        self.column = 1
-                        return self.next_token()
-                    else:
-                        start_column: int = self.column
-                        self.column += len(value)
-                        self.pos += len(value)
-                        return Token(token_type, value, self.line, start_column)
-            else:
+    def scan(self) -> Iterator[Token]:
+        code = self.code
+        end = len(code)
+        match = TOKEN_PATTERN.match
+        kinds = TOKEN_KINDS
+        pos, line, column = self.pos, self.line, self.column
+        while pos < end:
+            found = match(code, pos)
+            if found is None:
+                self.pos, self.line, self.column = pos, line, column
                 raise SyntaxError(f"Invalid token at line {
-                    self.line}, column {self.column}")
-        return Token("EOF", "", self.line, self.column)
+                    line}, column {column}")
+            kind = kinds[found.lastgroup]
+            value = found.group()
+            pos = found.end()
+            if kind in SKIP_KINDS:
+                newlines = value.count("\n")
+                if newlines:
+                    line += newlines
+                    column = len(value) - value.rfind("\n")
+                else:
+                    column += len(value)
+                continue
+            token = Token(kind, value, line, column)
+            column += len(value)
+            self.pos, self.line, self.column = pos, line, column
+            yield token
+        self.pos, self.line, self.column = pos, line, column
+
+    def next_token(self):
+        if self.scanner is None:
+            self.scanner = self.scan()
+        token = next(self.scanner, None)
+        if token is None:
+            return Token("EOF", "", self.line, self.column)
+        return token
 
     def tokenize(self):
-        tokens = []
-        while (token := self.next_token()).kind != "EOF":
-            tokens.append(token)
-        return tokens
+        return list(self.scan())
+
+
+class TokenCursor:
+    __slots__ = ["tokens", "current"]
+
+    def __init__(self, tokens: Iterable[Token]):
+        self.tokens: Iterator[Token] = iter(tokens)
+        self.current: Token = self.pull(None)
+
+    def pull(self, previous: Token | None) -> Token:
+        token = next(self.tokens, None)
+        if token is not None:
+            return token
+        if previous is None:
+            return Token("EOF", "", 1, 1)
+        return Token("EOF", "", previous.line,
+                     previous.column + len(previous.value))
+
+    def kind(self) -> str:
+        return self.current.kind
+
+    def value(self) -> str:
+        return self.current.value
+
+    def token(self) -> Token:
+        return self.current
+
+    def advance(self):
+        if self.current.kind != "EOF":
+            self.current = self.pull(self.current)
+
+
+class TokenStream:
+    # one entry per token in each array column, the last entry is EOF; values
+    # are sliced from the source and Token objects built only when asked for
+    __slots__ = ["source", "kinds", "starts", "ends", "line_starts"]
+
+    def __init__(self, source: str):
+        offset = "I" if len(source) < 2**32 else "Q"
+        self.source = source
+        self.kinds = array("B")
+        self.starts = array(offset)
+        self.ends = array(offset)
+        self.line_starts = array(offset, [0])
+
+        newline = source.find("\n")
+        while newline != -1:
+            self.line_starts.append(newline + 1)
+            newline = source.find("\n", newline + 1)
+
+        match = TOKEN_PATTERN.match
+        group_kinds = GROUP_KIND_IDS
+        skip = (KIND_IDS["NEWLINE"], KIND_IDS["WHITESPACE"])
+        kinds_append = self.kinds.append
+        starts_append = self.starts.append
+        ends_append = self.ends.append
+        pos, end = 0, len(source)
+        while pos < end:
+            found = match(source, pos)
+            if found is None:
+                line, column = self.position(pos)
+                raise SyntaxError(f"Invalid token at line {
+                    line}, column {column}")
+            kind = group_kinds[found.lastgroup]
+            start, pos = found.span()
+            if kind in skip:
+                continue
+            kinds_append(kind)
+            starts_append(start)
+            ends_append(pos)
+        kinds_append(KIND_IDS["EOF"])
+        starts_append(end)
+        ends_append(end)
+
+    def __len__(self) -> int:
+        return len(self.kinds) - 1
+
+    def __getitem__(self, index: int) -> Token:
+        if not -len(self) <= index < len(self):
+            raise IndexError("token index out of range")
+        return self.token(index % len(self))
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self)):
+            yield self.token(index)
+
+    def kind(self, index: int) -> str:
+        return KIND_NAMES[self.kinds[index]]
+
+    def value(self, index: int) -> str:
+        return self.source[self.starts[index]:self.ends[index]]
+
+    def position(self, offset: int) -> tuple[int, int]:
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def token(self, index: int) -> Token:
+        line, column = self.position(self.starts[index])
+        return Token(self.kind(index), self.value(index), line, column)
+
+    def cursor(self) -> "StreamCursor":
+        return StreamCursor(self)
+
+
+class StreamCursor:
+    __slots__ = ["stream", "kinds", "last", "pos"]
+
+    def __init__(self, stream: TokenStream):
+        self.stream = stream
+        self.kinds = stream.kinds
+        self.last = len(stream)
+        self.pos = 0
+
+    def kind(self) -> str:
+        return KIND_NAMES[self.kinds[self.pos]]
+
+    def value(self) -> str:
+        return self.stream.value(self.pos)
+
+    def token(self) -> Token:
+        return self.stream.token(self.pos)
+
+    def advance(self):
+        if self.pos < self.last:
+            self.pos += 1
+
+
+def tokenize_stream(lines: Iterable[str]) -> Iterator[Token]:
+    # no token spans a newline, so every line can be scanned on its own and
+    # only the current line has to be kept in memory
+    tokenizer = Tokenizer("")
+    for line in lines:
+        tokenizer.code = line
+        tokenizer.pos = 0
+        yield from tokenizer.scan()
 
 
 def read_file(file_path: str) -> str:
@@ -95,6 +264,18 @@ def read_file(file_path: str) -> str:
         return file.read()
 
 
+def read_lines(file_path: str, use_mmap: bool = False) -> Iterator[str]:
+    with open(file_path, "rb" if use_mmap else "r") as file:
+        if not use_mmap:
+            yield from file
+            return
+        if file.seek(0, 2) == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b""):
+                yield line.decode()
+
+
 if __name__ == "__main__":
     args = sys.argv
     if len(args) < 2:
@@ -0,0 +1,383 @@
+import ast
+from types import CodeType
+from typing import Any, Callable
+
+from expressions import BinOp, BuiltinFunction, ListArguments, Number, Assignment, \
+    Variable, Expr, String, Boolean, UnaryOp, Function, FunctionCall, \
+    Return, Null, If, While, For, Range, Index, IndexAssignment, NumberRange, UNSET
+from collections_po import UPDATE_OPS, get_item, set_item, update_item
+from statements import ExpressionStmt
+from optimizer import walk
+
+# helpers, builtins and user functions live in the program globals next to
+# the pos variables, the prefix keeps them apart
+PREFIX = "__pos_"
+CONTEXT = f"{PREFIX}context"
+AND = f"{PREFIX}and"
+OR = f"{PREFIX}or"
+RANGE = f"{PREFIX}range"
+GET_ITEM = f"{PREFIX}get_item"
+SET_ITEM = f"{PREFIX}set_item"
+UPDATE_ITEM = f"{PREFIX}update_item"
+UNSET_VALUE = f"{PREFIX}unset"
+READ_GLOBAL = f"{PREFIX}read_global"
+RESERVED = frozenset(("None", "True", "False", "__debug__"))
+
+ARITHMETIC_OPS: dict[str, type[ast.operator]] = {
+    "+": ast.Add,
+    "-": ast.Sub,
+    "**": ast.Pow,
+    "*": ast.Mult,
+    "/": ast.Div,
+}
+
+COMPARE_OPS: dict[str, type[ast.cmpop]] = {
+    "==": ast.Eq,
+    "!=": ast.NotEq,
+    ">": ast.Gt,
+    ">=": ast.GtE,
+    "<": ast.Lt,
+    "<=": ast.LtE,
+}
+
+# pos evaluates both sides of and/or, python's own would skip the right
+LOGICAL_OPS: dict[str, str] = {
+    "and": AND,
+    "or": OR,
+}
+
+UNARY_OPS: dict[str, type[ast.unaryop]] = {
+    "-": ast.USub,
+    "not": ast.Not,
+}
+
+ASSIGNMENT_OPS: dict[str, type[ast.operator]] = {
+    "+=": ast.Add,
+    "-=": ast.Sub,
+    "*=": ast.Mult,
+    "/=": ast.Div,
+}
+
+
+def both_and(left, right):
+    return left and right
+
+
+def both_or(left, right):
+    return left or right
+
+
+def read_global(context: dict, name: str):
+    # a function local read before it is assigned reads the global of the
+    # same name at that moment, as Variable.evaluate does
+    if name in context:
+        return context[name]
+    raise NameError(f"Var {name} not found")
+
+
+def load(name: str) -> ast.Name:
+    return ast.Name(name, ast.Load())
+
+
+def store(name: str) -> ast.Name:
+    return ast.Name(name, ast.Store())
+
+
+class PythonTranspiler:
+    # turns the ast into a python module: user functions become defs, While a
+    # while loop, For a for loop, If an if/elif/else chain, and builtins are called through
+    # globals bound by run_program
+    __slots__ = ["functions", "defs", "builtins", "in_function", "unset", "assigned",
+                 "statements", "expressions"]
+
+    def __init__(self, functions: dict[str, Function]):
+        self.functions = functions
+        self.defs: dict[str, ast.FunctionDef | None] = {}
+        self.builtins: dict[str, Callable] = {}
+        self.in_function = False
+        # the locals of the function being transpiled that start out unset,
+        # and those surely assigned before the statement being transpiled
+        self.unset: set[str] = set()
+        self.assigned: set[str] = set()
+        self.statements: dict[type, Callable[[Any], list[ast.stmt]]] = {
+            Function: self.transpile_function,
+            Return: self.transpile_return,
+            If: self.transpile_if,
+            While: self.transpile_while,
+            For: self.transpile_for,
+            IndexAssignment: self.transpile_index_assignment,
+            Assignment: self.transpile_assignment,
+        }
+        self.expressions: dict[type, Callable[[Any], ast.expr]] = {
+            Number: self.transpile_constant,
+            String: self.transpile_constant,
+            Boolean: self.transpile_constant,
+            Null: self.transpile_constant,
+            Variable: self.transpile_variable,
+            ListArguments: self.transpile_list_arguments,
+            FunctionCall: self.transpile_function_call,
+            BuiltinFunction: self.transpile_builtin,
+            UnaryOp: self.transpile_unary,
+            BinOp: self.transpile_binary,
+            Range: self.transpile_range,
+            Index: self.transpile_index,
+            ExpressionStmt: self.transpile_expression_stmt,
+        }
+
+    def transpile_program(self, program: list[Expr]) -> ast.Module:
+        body = self.transpile_block(program)
+        # defs go first so every call finds its function, as every pos
+        # function is known once parsing is done
+        module = ast.Module([*self.defs.values(), *body], [])
+        return ast.fix_missing_locations(module)
+
+    def transpile_block(self, body: list[Expr]) -> list[ast.stmt]:
+        stmts = []
+        for stmt in body:
+            stmts.extend(self.transpile_stmt(stmt))
+        return stmts
+
+    def transpile_branch(self, body: list[Expr]) -> list[ast.stmt]:
+        # an if body stops at its first Return, a top level one included,
+        # where it only evaluates its value
+        stmts = []
+        for stmt in body:
+            stmts.extend(self.transpile_stmt(stmt))
+            if isinstance(stmt, Return):
+                break
+        return stmts
+
+    def transpile_stmt(self, node: Expr) -> list[ast.stmt]:
+        transpiler = self.statements.get(type(node), None)
+        if transpiler is not None:
+            return transpiler(node)
+        return [ast.Expr(self.transpile_expr(node))]
+
+    def transpile_expr(self, node: Expr) -> ast.expr:
+        transpiler = self.expressions.get(type(node), None)
+        if transpiler is None:
+            raise SyntaxError(f"can not transpile {node}")
+        return transpiler(node)
+
+    def transpile_constant(self, node: Number | String | Boolean | Null):
+        return ast.Constant(node.value)
+
+    def transpile_variable(self, node: Variable):
+        return self.read(self.variable_name(node.name))
+
+    def read(self, name: str, update: bool = False) -> ast.expr:
+        # an augmented assignment looks a missing name up as context[name] does
+        missing = ast.Subscript(load(CONTEXT), ast.Constant(name), ast.Load()) if update else \
+            ast.Call(load(READ_GLOBAL), [load(CONTEXT), ast.Constant(name)], [])
+        if not self.in_function:
+            return missing if update else load(name)
+        if name not in self.unset or name in self.assigned:
+            return load(name)
+        # `name if name is not unset else read_global(context, "name")`
+        return ast.IfExp(ast.Compare(load(name), [ast.IsNot()], [load(UNSET_VALUE)]), load(name),
+                         missing)
+
+    def transpile_body(self, body: list[Expr], branch: bool = False) -> list[ast.stmt]:
+        # a nested body may not run, what it assigns is not sure after it
+        assigned = set(self.assigned)
+        stmts = self.transpile_branch(body) if branch else self.transpile_block(body)
+        self.assigned = assigned
+        return stmts or [ast.Pass()]
+
+    def variable_name(self, name: str) -> str:
+        if name in RESERVED or name.startswith(PREFIX):
+            raise SyntaxError(f"Var {name} can not be used with the python engine")
+        return name
+
+    def transpile_list_arguments(self, node: ListArguments):
+        return ast.List([self.transpile_expr(arg) for arg in node], ast.Load())
+
+    def transpile_function(self, node: Function):
+        # functions are registered while parsing, defining one does nothing
+        return []
+
+    def transpile_function_call(self, node: FunctionCall):
+        name = self.link(node.name)
+        params = self.functions[node.name].args
+        if len(params) != len(node.args):
+            raise SyntaxError(
+                f"Function {node.name} expected {len(params)} args, got {len(node.args)}")
+        return ast.Call(load(name), [self.transpile_expr(arg) for arg in node.args], [])
+
+    def link(self, name: str) -> str:
+        # each called function becomes one def, the name is reserved first so
+        # a recursive call finds it while its body is being transpiled
+        def_name = f"{PREFIX}func_{name}"
+        if name in self.defs:
+            return def_name
+        if name not in self.functions:
+            raise NameError(f"Function {name} not found")
+        self.defs[name] = None
+        function = self.functions[name]
+        params = [self.variable_name(arg.name) for arg in function.args]
+        # a variable the function assigns but does not take as a parameter
+        # starts out unset; until it is assigned, reading it reads the global
+        unset = {self.variable_name(node.name) for stmt in function.body for node in walk(stmt)
+                 if isinstance(node, (Assignment, For))} - set(params)
+        outer = self.in_function, self.unset, self.assigned
+        self.in_function, self.unset, self.assigned = True, unset, set()
+        body = self.transpile_block(function.body)
+        self.in_function, self.unset, self.assigned = outer
+
+        prelude = [ast.Assign([store(local)], load(UNSET_VALUE)) for local in sorted(unset)]
+        self.defs[name] = ast.FunctionDef(
+            def_name,
+            ast.arguments([], [ast.arg(param) for param in params], None, [], [], None, []),
+            prelude + body or [ast.Pass()], [], None, None, [])
+        return def_name
+
+    def transpile_return(self, node: Return):
+        value = self.transpile_expr(node.value)
+        if not self.in_function:
+            # a top level return only evaluates its value, as in the tree walker
+            return [ast.Expr(value)]
+        return [ast.Return(value)]
+
+    def transpile_builtin(self, node: BuiltinFunction):
+        if node.args_count is not None and len(node.args) != node.args_count:
+            raise ValueError("invalid number of arguments")
+        name = f"{PREFIX}builtin_{node.value}"
+        self.builtins[name] = node.function
+        return ast.Call(load(name), [self.transpile_expr(arg) for arg in node.args], [])
+
+    def transpile_if(self, node: If):
+        conditions = [self.transpile_expr(condition) for condition in node.conditions]
+        orelse = self.transpile_body(node.else_body, True) if node.else_body else []
+        for condition, body in reversed(list(zip(conditions, node.body))):
+            orelse = [ast.If(condition, self.transpile_body(body, True), orelse)]
+        return orelse
+
+    def transpile_while(self, node: While):
+        return [ast.While(self.transpile_expr(node.condition), self.transpile_body(node.body), [])]
+
+    def transpile_for(self, node: For):
+        name = self.variable_name(node.name)
+        iterable = self.transpile_expr(node.iterable)
+        assigned = set(self.assigned)
+        self.assigned.add(name)
+        body = self.transpile_body(node.body)
+        self.assigned = assigned
+        return [ast.For(store(name), iterable, body, [])]
+
+    def transpile_range(self, node: Range):
+        return ast.Call(load(RANGE), [self.transpile_expr(node.start),
+                                      self.transpile_expr(node.stop)], [])
+
+    def transpile_index(self, node: Index):
+        return ast.Call(load(GET_ITEM), [self.transpile_expr(node.target),
+                                         self.transpile_expr(node.index)], [])
+
+    def transpile_index_assignment(self, node: IndexAssignment):
+        target = self.transpile_expr(node.target)
+        index = self.transpile_expr(node.index)
+        value = self.transpile_expr(node.value)
+        if node.op != "=":
+            op = UPDATE_OPS.get(node.op, None)
+            if op is None:
+                raise SyntaxError("dont know the assignment operator")
+            # the target and index are evaluated once, as in the other engines
+            name = f"{PREFIX}op_{op.__name__}"
+            self.builtins[name] = op
+            return [ast.Expr(ast.Call(load(UPDATE_ITEM), [
+                target, index, load(name), value], []))]
+        return [ast.Expr(ast.Call(load(SET_ITEM), [target, index, value], []))]
+
+    def transpile_assignment(self, node: Assignment):
+        name = self.variable_name(node.name)
+        value = self.transpile_expr(node.value)
+        if node.op != "=":
+            op = ASSIGNMENT_OPS.get(node.op, None)
+            if op is None:
+                raise SyntaxError("dont know the assignment operator")
+            # not an AugAssign, python would change an array in place under its aliases
+            value = ast.BinOp(self.read(name, True), op(), value)
+        self.assigned.add(name)
+        return [ast.Assign([store(name)], value)]
+
+    def transpile_unary(self, node: UnaryOp):
+        op = UNARY_OPS.get(node.op, None)
+        if op is None:
+            raise SyntaxError("dont know the unary operator")
+        return ast.UnaryOp(op(), self.transpile_expr(node.expr))
+
+    def transpile_binary(self, node: BinOp):
+        # a long chain like a + b + c nests on its left, it is transpiled in a
+        # loop from its innermost node out
+        chain = []
+        while isinstance(node, BinOp):
+            chain.append(node)
+            node = node.left
+        left = self.transpile_expr(node)
+        for node in reversed(chain):
+            left = self.transpile_binary_node(node, left)
+        return left
+
+    def transpile_binary_node(self, node: BinOp, left: ast.expr) -> ast.expr:
+        right = self.transpile_expr(node.right)
+        if node.op in ARITHMETIC_OPS:
+            return ast.BinOp(left, ARITHMETIC_OPS[node.op](), right)
+        if node.op in COMPARE_OPS:
+            return ast.Compare(left, [COMPARE_OPS[node.op]()], [right])
+        if node.op in LOGICAL_OPS:
+            return ast.Call(load(LOGICAL_OPS[node.op]), [left, right], [])
+        raise SyntaxError("dont know the operator")
+
+    def transpile_expression_stmt(self, node: ExpressionStmt):
+        return self.transpile_expr(node.expression)
+
+
+class PythonProgram:
+    __slots__ = ["code", "builtins", "names"]
+
+    def __init__(self, code: CodeType, builtins: dict[str, Callable]):
+        self.code = code
+        self.builtins = builtins
+        # every prefixed name a run leaves in the globals: the helpers, the
+        # builtins and the defs; looked up once, the globals can be huge
+        self.names = tuple(dict.fromkeys([
+            CONTEXT, AND, OR, RANGE, GET_ITEM, SET_ITEM, UPDATE_ITEM, UNSET_VALUE, READ_GLOBAL,
+            *builtins,
+            *(name for name in code.co_names if name.startswith(PREFIX))]))
+
+    def __repr__(self) -> str:
+        return f"PythonProgram(code={self.code}, builtins={list(self.builtins)})"
+
+
+def transpile(ast_nodes: list[Expr], functions: dict[str, Function]) -> tuple[ast.Module, dict[str, Callable]]:
+    transpiler = PythonTranspiler(functions)
+    return transpiler.transpile_program(ast_nodes), transpiler.builtins
+
+
+def to_source(ast_nodes: list[Expr], functions: dict[str, Function]) -> str:
+    return ast.unparse(transpile(ast_nodes, functions)[0])
+
+
+def compile_program(ast_nodes: list[Expr], functions: dict[str, Function]) -> PythonProgram:
+    module, builtins = transpile(ast_nodes, functions)
+    return PythonProgram(compile(module, "<pos>", "exec"), builtins)
+
+
+def run_program(program: PythonProgram, context: dict):
+    # the context itself is the globals of the program, so top level
+    # assignments land in it; the bound helpers are taken out afterwards.
+    # python's own builtins are not there, a pos name is a pos name only
+    context.update({CONTEXT: context, AND: both_and, OR: both_or, RANGE: NumberRange,
+                    GET_ITEM: get_item, SET_ITEM: set_item, UPDATE_ITEM: update_item,
+                    UNSET_VALUE: UNSET, READ_GLOBAL: read_global, "__builtins__": {},
+                    **program.builtins})
+    try:
+        exec(program.code, context)
+    except NameError as error:
+        if error.name is None:
+            raise
+        # python's own, for a global that is not there
+        raise NameError(f"Var {error.name} not found") from None
+    finally:
+        context.pop("__builtins__", None)
+        for name in program.names:
+            context.pop(name, None)
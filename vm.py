@@ -0,0 +1,614 @@
+import operator
+from array import array
+from typing import Any, Callable
+
+from expressions import BinOp, BuiltinFunction, ListArguments, Number, Assignment, \
+    Variable, Expr, String, Boolean, UnaryOp, Function, FunctionCall, \
+    Return, Null, If, While, For, Range, Index, IndexAssignment, NumberRange, UNSET
+from collections_po import get_item, set_item
+from limits import LARGE_STRING, ResourceLimitExceeded, check_string, current_budget
+from statements import ExpressionStmt
+
+# an instruction is its opcode followed by OPCODE_ARGS[opcode] arguments,
+# all stored inline in the code array
+LOAD_CONST = 0
+LOAD_NAME = 1
+STORE_NAME = 2
+BINARY_OP = 3
+UNARY_OP = 4
+POP_TOP = 5
+JUMP = 6
+JUMP_IF_FALSE = 7
+CALL_FUNCTION = 8
+CALL_BUILTIN = 9
+RETURN_VALUE = 10
+BUILD_LIST = 11
+# fused forms of the common `x < 10`, `i * 2` and `x += ...` shapes
+BINARY_CONST = 12
+BINARY_NAME_CONST = 13
+INPLACE_NAME = 14
+# the jump back to the condition of a while loop, where budgets count a step
+LOOP = 15
+# for loops keep their iterator in a hidden local named by GET_ITER, FOR_ITER
+# stores the next value straight into the loop variable
+BUILD_RANGE = 16
+GET_ITER = 17
+FOR_ITER = 18
+# container[key] reads and stores, the inplace form takes a BINARY_OPS index
+BINARY_SUBSCR = 19
+STORE_SUBSCR = 20
+INPLACE_SUBSCR = 21
+
+# the names of the hidden iterators, the dot keeps them apart from pos names
+ITER_PREFIX = ".iter"
+
+OPCODE_NAMES = ["LOAD_CONST", "LOAD_NAME", "STORE_NAME", "BINARY_OP", "UNARY_OP",
+                "POP_TOP", "JUMP", "JUMP_IF_FALSE", "CALL_FUNCTION",
+                "CALL_BUILTIN", "RETURN_VALUE", "BUILD_LIST", "BINARY_CONST",
+                "BINARY_NAME_CONST", "INPLACE_NAME", "LOOP", "BUILD_RANGE", "GET_ITER",
+                "FOR_ITER", "BINARY_SUBSCR", "STORE_SUBSCR", "INPLACE_SUBSCR"]
+OPCODE_ARGS = [1, 1, 1, 1, 1, 0, 1, 1, 1, 1, 0, 1, 2, 3, 2, 1, 0, 1, 3, 0, 0, 1]
+
+# the argument of BINARY_OP and UNARY_OP indexes these tables
+BINARY_OPS: list[tuple[str, Callable[[Any, Any], Any]]] = [
+    ("+", operator.add),
+    ("-", operator.sub),
+    ("**", operator.pow),
+    ("*", operator.mul),
+    ("/", operator.truediv),
+    # both sides are always evaluated, as in BinOp.evaluate
+    ("and", lambda left, right: left and right),
+    ("or", lambda left, right: left or right),
+    ("==", operator.eq),
+    ("!=", operator.ne),
+    (">", operator.gt),
+    (">=", operator.ge),
+    ("<", operator.lt),
+    ("<=", operator.le),
+    # never in place, an alias of the old value keeps it
+    ("+=", operator.add),
+    ("-=", operator.sub),
+    ("*=", operator.mul),
+    ("/=", operator.truediv),
+]
+BINARY_OP_IDS = {op: index for index, (op, _) in enumerate(BINARY_OPS)}
+BINARY_FUNCTIONS = tuple(function for _, function in BINARY_OPS)
+
+UNARY_OPS: list[tuple[str, Callable[[Any], Any]]] = [
+    ("-", operator.neg),
+    ("not", operator.not_),
+]
+UNARY_OP_IDS = {op: index for index, (op, _) in enumerate(UNARY_OPS)}
+UNARY_FUNCTIONS = tuple(function for _, function in UNARY_OPS)
+
+
+class Code:
+    __slots__ = ["name", "params", "ops", "consts", "names", "positions"]
+
+    def __init__(self, name: str, params: tuple[str, ...], ops: array,
+                 consts: tuple, names: tuple[str, ...],
+                 positions: dict[int, tuple[int, int]] | None = None):
+        self.name = name
+        self.params = params
+        self.ops = ops
+        self.consts = consts
+        self.names = names
+        # source line and column of the loops, calls and stores, by offset
+        self.positions = {} if positions is None else positions
+
+    def disassemble(self) -> str:
+        lines = [f"code {self.name}({', '.join(self.params)})"]
+        pc = 0
+        while pc < len(self.ops):
+            op = self.ops[pc]
+            args = self.ops[pc + 1:pc + 1 + OPCODE_ARGS[op]]
+            details = []
+            if op in (BINARY_OP, BINARY_CONST, BINARY_NAME_CONST, INPLACE_NAME, INPLACE_SUBSCR):
+                details.append(BINARY_OPS[args[0]][0])
+            elif op == UNARY_OP:
+                details.append(UNARY_OPS[args[0]][0])
+            if op in (LOAD_NAME, STORE_NAME, BINARY_NAME_CONST, INPLACE_NAME, GET_ITER):
+                details.append(self.names[args[-1] if op != BINARY_NAME_CONST else args[1]])
+            elif op == FOR_ITER:
+                details.extend((self.names[args[0]], self.names[args[1]], str(args[2])))
+            if op in (LOAD_CONST, BINARY_CONST, BINARY_NAME_CONST):
+                details.append(repr(self.consts[args[-1]]))
+            if not details:
+                details = [str(arg) for arg in args]
+            lines.append(f"{pc:>6} {OPCODE_NAMES[op]:<18} {' '.join(details)}")
+            pc += 1 + len(args)
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return f"Code(name={self.name}, params={self.params}, size={len(self.ops) // 2})"
+
+
+class Program:
+    __slots__ = ["main", "functions", "builtins"]
+
+    def __init__(self, main: Code, functions: list[Code], builtins: list[tuple[Callable, int]]):
+        self.main = main
+        self.functions = functions
+        self.builtins = builtins
+
+    def __repr__(self) -> str:
+        return f"Program(main={self.main}, functions={self.functions})"
+
+
+class CodeBuilder:
+    __slots__ = ["name", "params", "ops", "consts", "const_ids", "names", "name_ids",
+                 "positions"]
+
+    def __init__(self, name: str, params: tuple[str, ...]):
+        self.name = name
+        self.params = params
+        self.ops: list[int] = []
+        self.consts: list = []
+        self.const_ids: dict = {}
+        self.names: list[str] = []
+        self.name_ids: dict[str, int] = {}
+        self.positions: dict[int, tuple[int, int]] = {}
+
+    def emit(self, op: int, *args: int) -> int:
+        self.ops.append(op)
+        self.ops.extend(args)
+        return len(self.ops) - 1 - len(args)
+
+    def locate(self, at: int, node: Expr):
+        if node.line:
+            self.positions[at] = (node.line, node.column)
+
+    def patch(self, at: int, target: int):
+        self.ops[at + 1] = target
+
+    def here(self) -> int:
+        return len(self.ops)
+
+    def const(self, value) -> int:
+        # 1 == 1.0 == True as dict keys, so the type is part of the key
+        key = (type(value), value)
+        if key not in self.const_ids:
+            self.const_ids[key] = len(self.consts)
+            self.consts.append(value)
+        return self.const_ids[key]
+
+    def name_id(self, name: str) -> int:
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return self.name_ids[name]
+
+    def build(self) -> Code:
+        typecode = "H" if max(self.ops, default=0) < 2**16 else "I"
+        return Code(self.name, self.params, array(typecode, self.ops),
+                    tuple(self.consts), tuple(self.names), self.positions)
+
+
+class BytecodeCompiler:
+    # compiles the ast into one Code for the top level statements and one per
+    # called user function; expressions leave exactly one value on the stack,
+    # statements leave it as they found it
+    __slots__ = ["functions", "function_ids", "codes", "builtins", "builder",
+                 "expressions", "statements"]
+
+    def __init__(self, functions: dict[str, Function]):
+        self.functions = functions
+        self.function_ids: dict[str, int] = {}
+        self.codes: list[Code | None] = []
+        self.builtins: list[tuple[Callable, int]] = []
+        self.builder: CodeBuilder = CodeBuilder("<main>", ())
+        self.expressions: dict[type, Callable[[Any], None]] = {
+            Number: self.compile_constant,
+            String: self.compile_constant,
+            Boolean: self.compile_constant,
+            Null: self.compile_constant,
+            Variable: self.compile_variable,
+            ListArguments: self.compile_list_arguments,
+            FunctionCall: self.compile_function_call,
+            BuiltinFunction: self.compile_builtin,
+            UnaryOp: self.compile_unary,
+            BinOp: self.compile_binary,
+            Range: self.compile_range,
+            Index: self.compile_index,
+            ExpressionStmt: self.compile_expression_stmt,
+        }
+        self.statements: dict[type, Callable[[Any], None]] = {
+            Function: self.compile_function,
+            Return: self.compile_return,
+            If: self.compile_if,
+            While: self.compile_while,
+            For: self.compile_for,
+            IndexAssignment: self.compile_index_assignment,
+            Assignment: self.compile_assignment,
+        }
+
+    def compile_program(self, ast: list[Expr]) -> Program:
+        for stmt in ast:
+            self.compile_stmt(stmt)
+        builder = self.builder
+        builder.emit(LOAD_CONST, builder.const(None))
+        builder.emit(RETURN_VALUE)
+        return Program(builder.build(), self.codes, self.builtins)
+
+    def compile_stmt(self, node: Expr):
+        compiler = self.statements.get(type(node), None)
+        if compiler is not None:
+            compiler(node)
+            return
+        self.compile_expr(node)
+        self.builder.emit(POP_TOP)
+
+    def compile_expr(self, node: Expr):
+        compiler = self.expressions.get(type(node), None)
+        if compiler is not None:
+            compiler(node)
+            return
+        if type(node) not in self.statements:
+            raise SyntaxError(f"can not compile {node}")
+        # statements used as a value evaluate to null
+        self.compile_stmt(node)
+        self.builder.emit(LOAD_CONST, self.builder.const(None))
+
+    def compile_block(self, body: list[Expr]):
+        for stmt in body:
+            self.compile_stmt(stmt)
+
+    def compile_branch(self, body: list[Expr]):
+        # an if body stops at its first Return, as in the other engines; at
+        # the top level the Return only drops its value, so the rest of the
+        # body must not be compiled after it
+        for stmt in body:
+            self.compile_stmt(stmt)
+            if isinstance(stmt, Return):
+                break
+
+    def compile_constant(self, node: Number | String | Boolean | Null):
+        self.builder.emit(LOAD_CONST, self.builder.const(node.value))
+
+    def compile_variable(self, node: Variable):
+        self.builder.emit(LOAD_NAME, self.builder.name_id(node.name))
+
+    def compile_list_arguments(self, node: ListArguments):
+        for arg in node:
+            self.compile_expr(arg)
+        self.builder.emit(BUILD_LIST, len(node))
+
+    def compile_function(self, node: Function):
+        # functions are registered while parsing, defining one does nothing
+        pass
+
+    def compile_function_call(self, node: FunctionCall):
+        index = self.link(node.name)
+        params = self.function_params(node.name)
+        if len(params) != len(node.args):
+            raise SyntaxError(
+                f"Function {node.name} expected {len(params)} args, got {len(node.args)}")
+        for arg in node.args:
+            self.compile_expr(arg)
+        self.builder.locate(self.builder.emit(CALL_FUNCTION, index), node)
+
+    def function_params(self, name: str) -> tuple[str, ...]:
+        return tuple(arg.name for arg in self.functions[name].args)
+
+    def link(self, name: str) -> int:
+        # each function is compiled once, the index is reserved first so a
+        # recursive call finds it while its own body is being compiled
+        if name in self.function_ids:
+            return self.function_ids[name]
+        if name not in self.functions:
+            raise NameError(f"Function {name} not found")
+        index = len(self.codes)
+        self.function_ids[name] = index
+        self.codes.append(None)
+        caller = self.builder
+        self.builder = CodeBuilder(name, self.function_params(name))
+        self.compile_block(self.functions[name].body)
+        self.builder.emit(LOAD_CONST, self.builder.const(None))
+        self.builder.emit(RETURN_VALUE)
+        self.codes[index] = self.builder.build()
+        self.builder = caller
+        return index
+
+    def compile_return(self, node: Return):
+        self.compile_expr(node.value)
+        if self.builder.name == "<main>":
+            # a top level return only evaluates its value, as in the tree walker
+            self.builder.emit(POP_TOP)
+            return
+        self.builder.emit(RETURN_VALUE)
+
+    def compile_builtin(self, node: BuiltinFunction):
+        if node.args_count is not None and len(node.args) != node.args_count:
+            raise ValueError("invalid number of arguments")
+        for arg in node.args:
+            self.compile_expr(arg)
+        self.builtins.append((node.function, len(node.args)))
+        self.builder.emit(CALL_BUILTIN, len(self.builtins) - 1)
+
+    def compile_if(self, node: If):
+        builder = self.builder
+        exits = []
+        last = len(node.conditions) - 1
+        for index, (condition, body) in enumerate(zip(node.conditions, node.body)):
+            self.compile_expr(condition)
+            skip = builder.emit(JUMP_IF_FALSE, 0)
+            self.compile_branch(body)
+            if index != last or node.else_body:
+                exits.append(builder.emit(JUMP, 0))
+            builder.patch(skip, builder.here())
+        self.compile_branch(node.else_body)
+        for at in exits:
+            builder.patch(at, builder.here())
+
+    def compile_while(self, node: While):
+        builder = self.builder
+        start = builder.here()
+        self.compile_expr(node.condition)
+        leave = builder.emit(JUMP_IF_FALSE, 0)
+        self.compile_block(node.body)
+        builder.locate(builder.emit(LOOP, start), node)
+        builder.patch(leave, builder.here())
+
+    def compile_for(self, node: For):
+        builder = self.builder
+        self.compile_expr(node.iterable)
+        # the offset keeps the iterators of nested loops apart
+        iterator = builder.name_id(f"{ITER_PREFIX}{builder.here()}")
+        builder.emit(GET_ITER, iterator)
+        start = builder.emit(FOR_ITER, iterator, builder.name_id(node.name), 0)
+        self.compile_block(node.body)
+        builder.locate(builder.emit(LOOP, start), node)
+        builder.ops[start + 3] = builder.here()
+
+    def compile_range(self, node: Range):
+        self.compile_expr(node.start)
+        self.compile_expr(node.stop)
+        self.builder.emit(BUILD_RANGE)
+
+    def compile_index(self, node: Index):
+        self.compile_expr(node.target)
+        self.compile_expr(node.index)
+        self.builder.emit(BINARY_SUBSCR)
+
+    def compile_index_assignment(self, node: IndexAssignment):
+        self.compile_expr(node.target)
+        self.compile_expr(node.index)
+        self.compile_expr(node.value)
+        if node.op == "=":
+            self.builder.emit(STORE_SUBSCR)
+            return
+        op = BINARY_OP_IDS.get(node.op[:-1], None)
+        if op is None or node.op[-1] != "=":
+            raise SyntaxError("dont know the assignment operator")
+        self.builder.emit(INPLACE_SUBSCR, op)
+
+    def compile_assignment(self, node: Assignment):
+        builder = self.builder
+        name = builder.name_id(node.name)
+        if node.op == "=":
+            self.compile_expr(node.value)
+            builder.locate(builder.emit(STORE_NAME, name), node)
+            return
+        op = BINARY_OP_IDS.get(node.op, None)
+        if op is None:
+            raise SyntaxError("dont know the assignment operator")
+        self.compile_expr(node.value)
+        builder.locate(builder.emit(INPLACE_NAME, op, name), node)
+
+    def compile_unary(self, node: UnaryOp):
+        op = UNARY_OP_IDS.get(node.op, None)
+        if op is None:
+            raise SyntaxError("dont know the unary operator")
+        self.compile_expr(node.expr)
+        self.builder.emit(UNARY_OP, op)
+
+    def compile_binary(self, node: BinOp):
+        # a long chain like a + b + c nests on its left, it is compiled in a
+        # loop from its innermost node out
+        chain = []
+        while isinstance(node.left, BinOp):
+            chain.append(node)
+            node = node.left
+        self.compile_binary_node(node, True)
+        for node in reversed(chain):
+            self.compile_binary_node(node, False)
+
+    def compile_binary_node(self, node: BinOp, with_left: bool):
+        # the left side is already on the stack unless with_left is set
+        op = BINARY_OP_IDS.get(node.op, None)
+        if op is None:
+            raise SyntaxError("dont know the operator")
+        builder = self.builder
+        if isinstance(node.right, (Number, String, Boolean, Null)):
+            constant = builder.const(node.right.value)
+            if with_left and isinstance(node.left, Variable):
+                builder.emit(BINARY_NAME_CONST, op, builder.name_id(node.left.name), constant)
+                return
+            if with_left:
+                self.compile_expr(node.left)
+            builder.emit(BINARY_CONST, op, constant)
+            return
+        if with_left:
+            self.compile_expr(node.left)
+        self.compile_expr(node.right)
+        builder.emit(BINARY_OP, op)
+
+    def compile_expression_stmt(self, node: ExpressionStmt):
+        self.compile_expr(node.expression)
+
+
+def compile_program(ast: list[Expr], functions: dict[str, Function]) -> Program:
+    return BytecodeCompiler(functions).compile_program(ast)
+
+
+def run_program(program: Program, context: dict):
+    # the dispatch loop keeps its own frame stack, a pos call never grows the
+    # python stack; names are looked up in the frame, then in the globals.
+    # opcodes are copied into locals, comparing against module globals would
+    # cost a dict lookup per test
+    (load_const, load_name, store_name, binary_op, unary_op, pop_top, jump,
+     jump_if_false, call_function, call_builtin, return_value, build_list,
+     binary_const, binary_name_const, inplace_name, loop, build_range, get_iter,
+     for_iter, binary_subscr, store_subscr, inplace_subscr) = range(len(OPCODE_NAMES))
+    done = UNSET
+    # the code arrays are compact to keep and store, indexing a list is faster
+    functions = [(code.ops.tolist(), code.consts, code.names, code.params)
+                 for code in program.functions]
+    builtins = program.builtins
+    # read once, a budget is counted at loop back-edges and calls only
+    budget = current_budget()
+    binary = BINARY_FUNCTIONS
+    unary = UNARY_FUNCTIONS
+    frames = []
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    ops, consts, names = program.main.ops.tolist(), program.main.consts, program.main.names
+    local_vars = context
+    pc = 0
+    # the code running when a limit is hit is found by its ops list
+    positions = {id(function[0]): code.positions
+                 for function, code in zip(functions, program.functions)}
+    positions[id(ops)] = program.main.positions
+    try:
+        while True:
+            op = ops[pc]
+            if op == load_name:
+                name = names[ops[pc + 1]]
+                try:
+                    push(local_vars[name])
+                except KeyError:
+                    if name not in context:
+                        raise NameError(f"Var {name} not found") from None
+                    push(context[name])
+                pc += 2
+            elif op == binary_name_const:
+                name = names[ops[pc + 2]]
+                try:
+                    value = local_vars[name]
+                except KeyError:
+                    if name not in context:
+                        raise NameError(f"Var {name} not found") from None
+                    value = context[name]
+                push(binary[ops[pc + 1]](value, consts[ops[pc + 3]]))
+                pc += 4
+            elif op == jump_if_false:
+                if pop():
+                    pc += 2
+                else:
+                    pc = ops[pc + 1]
+            elif op == inplace_name:
+                name = names[ops[pc + 2]]
+                value = local_vars[name] if name in local_vars else context[name]
+                value = binary[ops[pc + 1]](value, pop())
+                if value.__class__ is str and len(value) > LARGE_STRING:
+                    check_string(value)
+                local_vars[name] = value
+                pc += 3
+            elif op == for_iter:
+                iterator = names[ops[pc + 1]]
+                value = next(local_vars[iterator], done)
+                if value is done:
+                    del local_vars[iterator]
+                    pc = ops[pc + 3]
+                else:
+                    local_vars[names[ops[pc + 2]]] = value
+                    pc += 4
+            elif op == loop:
+                if budget is not None:
+                    budget.steps += 1
+                    if budget.steps >= budget.next_check:
+                        budget.check()
+                pc = ops[pc + 1]
+            elif op == jump:
+                pc = ops[pc + 1]
+            elif op == load_const:
+                push(consts[ops[pc + 1]])
+                pc += 2
+            elif op == binary_const:
+                stack[-1] = binary[ops[pc + 1]](stack[-1], consts[ops[pc + 2]])
+                pc += 3
+            elif op == binary_op:
+                right = pop()
+                stack[-1] = binary[ops[pc + 1]](stack[-1], right)
+                pc += 2
+            elif op == store_name:
+                value = pop()
+                if value.__class__ is str and len(value) > LARGE_STRING:
+                    check_string(value)
+                local_vars[names[ops[pc + 1]]] = value
+                pc += 2
+            elif op == pop_top:
+                pop()
+                pc += 1
+            elif op == call_function:
+                if budget is not None:
+                    budget.step()
+                frames.append((ops, consts, names, pc + 2, local_vars))
+                ops, consts, names, params = functions[ops[pc + 1]]
+                count = len(params)
+                if count == 1:
+                    local_vars = {params[0]: pop()}
+                elif count:
+                    local_vars = dict(zip(params, stack[-count:]))
+                    del stack[-count:]
+                else:
+                    local_vars = {}
+                pc = 0
+            elif op == return_value:
+                if not frames:
+                    return pop()
+                ops, consts, names, pc, local_vars = frames.pop()
+            elif op == call_builtin:
+                function, count = builtins[ops[pc + 1]]
+                if count:
+                    args = stack[-count:]
+                    del stack[-count:]
+                    push(function(*args))
+                else:
+                    push(function())
+                pc += 2
+            elif op == unary_op:
+                stack[-1] = unary[ops[pc + 1]](stack[-1])
+                pc += 2
+            elif op == binary_subscr:
+                key = pop()
+                stack[-1] = get_item(stack[-1], key)
+                pc += 1
+            elif op == store_subscr:
+                value = pop()
+                key = pop()
+                set_item(pop(), key, value)
+                pc += 1
+            elif op == inplace_subscr:
+                value = pop()
+                key = pop()
+                container = pop()
+                set_item(container, key, binary[ops[pc + 1]](get_item(container, key), value))
+                pc += 2
+            elif op == get_iter:
+                local_vars[names[ops[pc + 1]]] = iter(pop())
+                pc += 2
+            elif op == build_range:
+                stop = pop()
+                stack[-1] = NumberRange(stack[-1], stop)
+                pc += 1
+            elif op == build_list:
+                count = ops[pc + 1]
+                if count:
+                    values = stack[-count:]
+                    del stack[-count:]
+                    push(values)
+                else:
+                    push([])
+                pc += 2
+            else:
+                raise RuntimeError(f"unknown opcode {op}")
+    except ResourceLimitExceeded as error:
+        raise error.locate(*positions[id(ops)].get(pc, (0, 0))) from None
+    finally:
+        # a top level loop left by an error still holds its iterator in the
+        # globals, a session or an embedder would see it
+        for name in program.main.names:
+            if name.startswith(ITER_PREFIX):
+                context.pop(name, None)